@@ -0,0 +1,17 @@
+"""
+Carrier adapters - one async adapter per supported carrier, looked up by code.
+"""
+from app.carriers.base import CarrierAdapter, CarrierRequestError
+from app.carriers.registry import register_adapter, get_adapter, registered_carriers, carrier_circuits
+
+# Importing the adapter modules registers them
+from app.carriers import fedex, ups, usps
+
+__all__ = [
+    "CarrierAdapter",
+    "CarrierRequestError",
+    "register_adapter",
+    "get_adapter",
+    "registered_carriers",
+    "carrier_circuits"
+]
@@ -0,0 +1,245 @@
+"""
+Base class shared by every carrier adapter.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+import httpx
+from app.core import metrics
+from app.core.config import settings
+from app.core.enums import CarrierCode, ServiceLevel
+from app.core.http import carrier_request
+from app.carriers.resilience import CircuitBreaker, hedged
+
+class CarrierRequestError(Exception):
+    """
+    A carrier call failed; ``error_type`` matches the result dicts.
+
+    ``carrier_fault`` is False for errors caused by the request itself (such
+    as rejected credentials), which must not trip the circuit breaker.
+    ``status_code`` is the carrier's HTTP status, when it answered with one.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        error_type: str = "request_error",
+        carrier_fault: bool = True,
+        status_code: Optional[int] = None
+    ):
+        super().__init__(message)
+        self.error_type = error_type
+        self.carrier_fault = carrier_fault
+        self.status_code = status_code
+
+class CarrierAdapter:
+    """
+    Async interface to one carrier's API.
+
+    Subclasses describe their endpoints (``auth_request`` and friends); the
+    base class owns the HTTP call, JSON parsing, error reporting and the
+    carrier's circuit breaker, and returns results as plain dicts with
+    ``carrier`` and ``success`` keys.
+    """
+    code: CarrierCode
+    # The carrier's sandbox host; CARRIER_BASE_URL(S) replace it per instance
+    base_url: str
+    # Carrier service code -> ServiceLevel, used to compare services across carriers
+    service_levels: Dict[str, ServiceLevel] = {}
+    # Display names for services whose rate responses do not include one
+    service_names: Dict[str, str] = {}
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.CARRIER_BREAKER_FAILURES,
+            reset_timeout=settings.CARRIER_BREAKER_RESET_TIMEOUT
+        )
+        self.hedged_requests = 0
+        self.base_url = (
+            settings.CARRIER_BASE_URLS.get(self.code.value) or settings.CARRIER_BASE_URL or self.base_url
+        ).rstrip("/")
+
+    @property
+    def name(self) -> str:
+        return self.code.value
+
+    def error_result(self, error: str, error_type: str, status_code: Optional[int] = None) -> Dict[str, any]:
+        result = {"carrier": self.name, "success": False, "error": error, "error_type": error_type}
+        if status_code is not None:
+            result["status_code"] = status_code
+        return result
+
+    def status(self) -> Dict[str, any]:
+        """Circuit breaker state and counters, for API responses and /health."""
+        return {**self.breaker.snapshot(), "hedged_requests": self.hedged_requests}
+
+    async def _send(self, method: str, url: str, **kwargs) -> dict:
+        try:
+            response = await carrier_request(method, url, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            code = e.response.status_code
+            raise CarrierRequestError(str(e), "request_error", carrier_fault=code >= 500 or code == 429, status_code=code)
+        except httpx.HTTPError as e:
+            raise CarrierRequestError(str(e) or e.__class__.__name__, "request_error")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise CarrierRequestError(f"Invalid JSON response: {str(e)}", "json_error")
+
+    async def request_json(
+        self,
+        method: str,
+        url: str,
+        budget: Optional[float] = None,
+        idempotent: bool = False,
+        **kwargs
+    ) -> dict:
+        """
+        Send a request and return the decoded JSON body.
+
+        Fails fast while the carrier's circuit is open, gives up after
+        ``budget`` seconds, and for idempotent requests sends a hedged second
+        attempt when the first is slower than ``CARRIER_HEDGE_DELAY``.
+        """
+        if not self.breaker.allow():
+            metrics.carrier_request_duration.observe(0.0, self.name, "circuit_open")
+            raise CarrierRequestError(f"{self.name} circuit is open; failing fast", "circuit_open")
+        if budget is None:
+            budget = settings.CARRIER_LATENCY_BUDGET
+
+        hedge_delay = settings.CARRIER_HEDGE_DELAY
+        if idempotent and 0 < hedge_delay < budget:
+            def attempt():
+                return self._send(method, url, **kwargs)
+            call = hedged(attempt, hedge_delay, on_hedge=self._count_hedge)
+        else:
+            call = self._send(method, url, **kwargs)
+
+        start = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            data = await asyncio.wait_for(call, budget)
+            outcome = "success"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            self.breaker.record_failure()
+            raise CarrierRequestError(f"No response within {budget:g}s", "timeout")
+        except CarrierRequestError as e:
+            outcome = e.error_type
+            if e.carrier_fault:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        finally:
+            metrics.carrier_request_duration.observe(time.perf_counter() - start, self.name, outcome)
+        self.breaker.record_success()
+        return data
+
+    def _count_hedge(self):
+        self.hedged_requests += 1
+
+    # ------------------------------------------
+    # Authentication
+    # ------------------------------------------
+
+    def auth_request(self, client_id: str, client_secret: str) -> Tuple[str, dict]:
+        """Return the OAuth token URL and the keyword arguments for the POST."""
+        raise NotImplementedError
+
+    async def authenticate(self, client_id: str, client_secret: str, account_num: Optional[str] = None) -> Dict[str, any]:
+        """Request an OAuth2 client-credentials bearer token."""
+        url, kwargs = self.auth_request(client_id, client_secret)
+        try:
+            token_data = await self.request_json("POST", url, idempotent=True, **kwargs)
+        except CarrierRequestError as e:
+            return self.error_result(str(e), e.error_type, e.status_code)
+        return {
+            "carrier": self.name,
+            "success": True,
+            "access_token": token_data.get("access_token"),
+            "token_type": token_data.get("token_type", "Bearer"),
+            "expires_in": token_data.get("expires_in"),
+            "scope": token_data.get("scope"),
+            "raw_response": token_data
+        }
+
+    # ------------------------------------------
+    # Rating and tracking
+    # ------------------------------------------
+
+    def rate_requests(self, access_token: str, account_num: Optional[str], origin: dict, destination: dict, package: dict) -> List[Tuple[str, str, dict]]:
+        """
+        Return the HTTP method, URL and keyword arguments of each call needed
+        to quote every service between two addresses.
+        """
+        raise NotImplementedError
+
+    def parse_rates(self, data: dict) -> List[Dict[str, any]]:
+        """
+        Turn one rating response into quotes with ``service_code``,
+        ``service_name``, ``amount``, ``currency`` and ``transit_days`` keys.
+        """
+        raise NotImplementedError
+
+    async def rate(self, access_token: str, account_num: Optional[str], origin: dict, destination: dict, package: dict) -> Dict[str, any]:
+        """
+        Request rate quotes for a package between two addresses.
+
+        Carriers that need several calls have them sent in parallel; quotes
+        from the calls that succeed are returned even if others fail.
+        """
+        try:
+            requests = self.rate_requests(access_token, account_num, origin, destination, package)
+        except NotImplementedError:
+            return self.error_result(f"Rating is not supported for {self.name}", "unsupported")
+
+        responses = await asyncio.gather(
+            *[self.request_json(method, url, idempotent=True, **kwargs) for method, url, kwargs in requests],
+            return_exceptions=True
+        )
+        quotes, errors = [], []
+        for response in responses:
+            if isinstance(response, CarrierRequestError):
+                errors.append(response)
+            elif isinstance(response, BaseException):
+                raise response
+            else:
+                try:
+                    quotes.extend(self.parse_rates(response))
+                except (KeyError, TypeError, ValueError) as e:
+                    errors.append(CarrierRequestError(f"Unexpected rate response: {str(e)}", "json_error"))
+
+        if not quotes and errors:
+            return self.error_result(str(errors[0]), errors[0].error_type, errors[0].status_code)
+        return {"carrier": self.name, "success": True, "quotes": self.label_quotes(quotes)}
+
+    def label_quotes(self, quotes: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """Add the carrier, service level and (if missing) service name to quotes."""
+        for quote in quotes:
+            quote["carrier"] = self.name
+            quote["service_level"] = self.service_levels.get(quote["service_code"])
+            quote.setdefault("service_name", self.service_names.get(quote["service_code"], quote["service_code"]))
+        return quotes
+
+    def track_request(self, access_token: str, tracking_number: str) -> Tuple[str, str, dict]:
+        """Return the HTTP method, URL and keyword arguments for a tracking call."""
+        raise NotImplementedError
+
+    async def track(self, access_token: str, tracking_number: str) -> Dict[str, any]:
+        """Look up the tracking details for a shipment."""
+        try:
+            method, url, kwargs = self.track_request(access_token, tracking_number)
+        except NotImplementedError:
+            return self.error_result(f"Tracking is not supported for {self.name}", "unsupported")
+        try:
+            data = await self.request_json(method, url, idempotent=True, **kwargs)
+        except CarrierRequestError as e:
+            return self.error_result(str(e), e.error_type, e.status_code)
+        return {
+            "carrier": self.name,
+            "success": True,
+            "tracking_number": tracking_number,
+            "raw_response": data
+        }
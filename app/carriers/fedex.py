@@ -0,0 +1,88 @@
+"""
+FedEx API adapter.
+"""
+from typing import Dict, List, Optional, Tuple
+from app.core.enums import CarrierCode, ServiceLevel
+from app.carriers.base import CarrierAdapter
+from app.carriers.registry import register_adapter
+
+@register_adapter
+class FedExAdapter(CarrierAdapter):
+    code = CarrierCode.FEDEX
+    base_url = "https://apis-sandbox.fedex.com"
+    service_levels = {
+        "FEDEX_GROUND": ServiceLevel.GROUND,
+        "GROUND_HOME_DELIVERY": ServiceLevel.GROUND,
+        "FEDEX_EXPRESS_SAVER": ServiceLevel.EXPEDITED,
+        "FEDEX_2_DAY": ServiceLevel.EXPEDITED,
+        "FEDEX_2_DAY_AM": ServiceLevel.EXPEDITED,
+        "STANDARD_OVERNIGHT": ServiceLevel.OVERNIGHT,
+        "PRIORITY_OVERNIGHT": ServiceLevel.OVERNIGHT,
+        "FIRST_OVERNIGHT": ServiceLevel.OVERNIGHT,
+    }
+    transit_days = {
+        "ONE_DAY": 1, "TWO_DAYS": 2, "THREE_DAYS": 3, "FOUR_DAYS": 4,
+        "FIVE_DAYS": 5, "SIX_DAYS": 6, "SEVEN_DAYS": 7,
+    }
+
+    def auth_request(self, client_id: str, client_secret: str) -> Tuple[str, dict]:
+        return f"{self.base_url}/oauth/token", {
+            "headers": {"Content-Type": "application/x-www-form-urlencoded"},
+            "data": {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
+        }
+
+    def rate_requests(self, access_token: str, account_num: Optional[str], origin: dict, destination: dict, package: dict) -> List[Tuple[str, str, dict]]:
+        def address(location: dict) -> dict:
+            return {"address": {
+                "postalCode": location["zip_code"],
+                "stateOrProvinceCode": location["state"],
+                "countryCode": location["country"]
+            }}
+
+        return [("POST", f"{self.base_url}/rate/v1/rates/quotes", {
+            "headers": {"Authorization": f"Bearer {access_token}"},
+            "json": {
+                "accountNumber": {"value": account_num},
+                "requestedShipment": {
+                    "shipper": address(origin),
+                    "recipient": address(destination),
+                    "pickupType": "DROPOFF_AT_FEDEX_LOCATION",
+                    "rateRequestType": ["ACCOUNT", "LIST"],
+                    "requestedPackageLineItems": [{
+                        "weight": {"units": "LB", "value": package["weight_lb"]},
+                        "dimensions": {
+                            "length": package["length_in"],
+                            "width": package["width_in"],
+                            "height": package["height_in"],
+                            "units": "IN"
+                        }
+                    }]
+                }
+            }
+        })]
+
+    def parse_rates(self, data: dict) -> List[Dict[str, any]]:
+        quotes = []
+        for detail in data["output"]["rateReplyDetails"]:
+            charges = detail["ratedShipmentDetails"][0]
+            transit = (
+                detail.get("commit", {}).get("transitDays", {}).get("minimumTransitTime")
+                or detail.get("operationalDetail", {}).get("transitTime")
+            )
+            quotes.append({
+                "service_code": detail["serviceType"],
+                "service_name": detail.get("serviceName", detail["serviceType"]),
+                "amount": float(charges["totalNetCharge"]),
+                "currency": charges.get("currency", "USD"),
+                "transit_days": self.transit_days.get(transit)
+            })
+        return quotes
+
+    def track_request(self, access_token: str, tracking_number: str) -> Tuple[str, str, dict]:
+        return "POST", f"{self.base_url}/track/v1/trackingnumbers", {
+            "headers": {"Authorization": f"Bearer {access_token}"},
+            "json": {
+                "includeDetailedScans": False,
+                "trackingInfo": [{"trackingNumberInfo": {"trackingNumber": tracking_number}}]
+            }
+        }
@@ -0,0 +1,34 @@
+"""
+Registry of carrier adapters keyed by carrier code.
+"""
+from typing import Dict, List, Type
+from app.core import metrics
+from app.core.enums import CarrierCode
+from app.carriers.base import CarrierAdapter
+
+_adapters: Dict[CarrierCode, CarrierAdapter] = {}
+
+def register_adapter(adapter_class: Type[CarrierAdapter]) -> Type[CarrierAdapter]:
+    """Class decorator that registers one adapter instance for its carrier code."""
+    _adapters[adapter_class.code] = adapter_class()
+    return adapter_class
+
+def get_adapter(carrier_code: CarrierCode) -> CarrierAdapter:
+    """Return the adapter for a carrier, raising ``ValueError`` if unsupported."""
+    try:
+        return _adapters[CarrierCode(carrier_code)]
+    except (KeyError, ValueError):
+        raise ValueError(f"Unsupported carrier: {carrier_code}")
+
+def registered_carriers() -> List[CarrierCode]:
+    """Carrier codes that have an adapter."""
+    return list(_adapters)
+
+def carrier_circuits() -> Dict[str, Dict[str, any]]:
+    """Circuit breaker status of every registered carrier."""
+    return {code.value: adapter.status() for code, adapter in _adapters.items()}
+
+metrics.register(metrics.Gauge(
+    "carrier_circuit_open", "1 while a carrier's circuit breaker is open, failing calls fast.", ("carrier",),
+    lambda: {(code.value,): int(adapter.breaker.snapshot()["state"] == "open") for code, adapter in _adapters.items()}
+))
@@ -0,0 +1,104 @@
+"""
+UPS API adapter.
+"""
+import base64
+import uuid
+from typing import Dict, List, Optional, Tuple
+from app.core.enums import CarrierCode, ServiceLevel
+from app.carriers.base import CarrierAdapter
+from app.carriers.registry import register_adapter
+
+@register_adapter
+class UPSAdapter(CarrierAdapter):
+    code = CarrierCode.UPS
+    base_url = "https://wwwcie.ups.com"
+    service_levels = {
+        "03": ServiceLevel.GROUND,
+        "12": ServiceLevel.EXPEDITED,
+        "02": ServiceLevel.EXPEDITED,
+        "59": ServiceLevel.EXPEDITED,
+        "13": ServiceLevel.OVERNIGHT,
+        "01": ServiceLevel.OVERNIGHT,
+        "14": ServiceLevel.OVERNIGHT,
+    }
+    service_names = {
+        "03": "UPS Ground",
+        "12": "UPS 3 Day Select",
+        "02": "UPS 2nd Day Air",
+        "59": "UPS 2nd Day Air A.M.",
+        "13": "UPS Next Day Air Saver",
+        "01": "UPS Next Day Air",
+        "14": "UPS Next Day Air Early",
+    }
+
+    def auth_request(self, client_id: str, client_secret: str) -> Tuple[str, dict]:
+        credentials = f"{client_id}:{client_secret}"
+        encoded_credentials = base64.b64encode(credentials.encode()).decode()
+        return f"{self.base_url}/security/v1/oauth/token", {
+            "headers": {"Content-Type": "application/x-www-form-urlencoded", "Authorization": f"Basic {encoded_credentials}"},
+            "data": {"grant_type": "client_credentials"}
+        }
+
+    def _headers(self, access_token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {access_token}",
+            "transId": uuid.uuid4().hex,
+            "transactionSrc": "shipments-api"
+        }
+
+    def rate_requests(self, access_token: str, account_num: Optional[str], origin: dict, destination: dict, package: dict) -> List[Tuple[str, str, dict]]:
+        def address(location: dict) -> dict:
+            return {
+                "PostalCode": location["zip_code"],
+                "StateProvinceCode": location["state"],
+                "CountryCode": location["country"]
+            }
+
+        # "Shop" returns every available service in one call
+        return [("POST", f"{self.base_url}/api/rating/v2409/Shop", {
+            "headers": self._headers(access_token),
+            "json": {"RateRequest": {
+                "Request": {"RequestOption": "Shop"},
+                "Shipment": {
+                    "Shipper": {"ShipperNumber": account_num, "Address": address(origin)},
+                    "ShipFrom": {"Address": address(origin)},
+                    "ShipTo": {"Address": address(destination)},
+                    "Package": {
+                        "PackagingType": {"Code": "02"},
+                        "Dimensions": {
+                            "UnitOfMeasurement": {"Code": "IN"},
+                            "Length": str(package["length_in"]),
+                            "Width": str(package["width_in"]),
+                            "Height": str(package["height_in"])
+                        },
+                        "PackageWeight": {
+                            "UnitOfMeasurement": {"Code": "LBS"},
+                            "Weight": str(package["weight_lb"])
+                        }
+                    }
+                }
+            }}
+        })]
+
+    def parse_rates(self, data: dict) -> List[Dict[str, any]]:
+        rated = data["RateResponse"]["RatedShipment"]
+        if isinstance(rated, dict):
+            rated = [rated]  # A single service comes back unwrapped
+        quotes = []
+        for shipment in rated:
+            code = shipment["Service"]["Code"]
+            charges = shipment.get("NegotiatedRateCharges", {}).get("TotalCharge") or shipment["TotalCharges"]
+            transit = shipment.get("GuaranteedDelivery", {}).get("BusinessDaysInTransit")
+            quotes.append({
+                "service_code": code,
+                "service_name": self.service_names.get(code, f"UPS service {code}"),
+                "amount": float(charges["MonetaryValue"]),
+                "currency": charges.get("CurrencyCode", "USD"),
+                "transit_days": int(transit) if transit else None
+            })
+        return quotes
+
+    def track_request(self, access_token: str, tracking_number: str) -> Tuple[str, str, dict]:
+        return "GET", f"{self.base_url}/api/track/v1/details/{tracking_number}", {
+            "headers": self._headers(access_token)
+        }
@@ -0,0 +1,68 @@
+"""
+USPS API adapter.
+"""
+from typing import Dict, List, Optional, Tuple
+from app.core.enums import CarrierCode, ServiceLevel
+from app.carriers.base import CarrierAdapter
+from app.carriers.registry import register_adapter
+
+@register_adapter
+class USPSAdapter(CarrierAdapter):
+    code = CarrierCode.USPS
+    base_url = "https://apis-tem.usps.com"
+    service_levels = {
+        "USPS_GROUND_ADVANTAGE": ServiceLevel.GROUND,
+        "PRIORITY_MAIL": ServiceLevel.EXPEDITED,
+        "PRIORITY_MAIL_EXPRESS": ServiceLevel.OVERNIGHT,
+    }
+    service_names = {
+        "USPS_GROUND_ADVANTAGE": "USPS Ground Advantage",
+        "PRIORITY_MAIL": "Priority Mail",
+        "PRIORITY_MAIL_EXPRESS": "Priority Mail Express",
+    }
+
+    def auth_request(self, client_id: str, client_secret: str) -> Tuple[str, dict]:
+        return f"{self.base_url}/oauth2/v3/token", {
+            "headers": {"Content-Type": "application/json"},
+            "json": {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
+        }
+
+    def rate_requests(self, access_token: str, account_num: Optional[str], origin: dict, destination: dict, package: dict) -> List[Tuple[str, str, dict]]:
+        # The prices API quotes one mail class per call
+        return [
+            ("POST", f"{self.base_url}/prices/v3/base-rates/search", {
+                "headers": {"Authorization": f"Bearer {access_token}"},
+                "json": {
+                    "originZIPCode": origin["zip_code"][:5],
+                    "destinationZIPCode": destination["zip_code"][:5],
+                    "weight": package["weight_lb"],
+                    "length": package["length_in"],
+                    "width": package["width_in"],
+                    "height": package["height_in"],
+                    "mailClass": mail_class,
+                    "processingCategory": "MACHINABLE",
+                    "rateIndicator": "SP",
+                    "destinationEntryFacilityType": "NONE",
+                    "priceType": "COMMERCIAL",
+                    "accountType": "EPS" if account_num else None,
+                    "accountNumber": account_num
+                }
+            })
+            for mail_class in self.service_levels
+        ]
+
+    def parse_rates(self, data: dict) -> List[Dict[str, any]]:
+        mail_class = data["rates"][0]["mailClass"]
+        return [{
+            "service_code": mail_class,
+            "service_name": self.service_names.get(mail_class, mail_class),
+            "amount": float(data["totalBasePrice"]),
+            "currency": "USD",
+            "transit_days": None  # Not part of the prices API
+        }]
+
+    def track_request(self, access_token: str, tracking_number: str) -> Tuple[str, str, dict]:
+        return "GET", f"{self.base_url}/tracking/v3/tracking/{tracking_number}", {
+            "headers": {"Authorization": f"Bearer {access_token}"},
+            "params": {"expand": "SUMMARY"}
+        }
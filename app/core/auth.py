@@ -1,11 +1,16 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.passwords import get_crypt_context, password_hasher
 from app.models.user import User
 # Define TokenData here if app.auth_models does not exist
 from pydantic import BaseModel
@@ -19,39 +24,103 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = get_crypt_context()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """The user fields routes need, cached so authentication skips the database."""
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str]
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            is_active=user.is_active,
+            created_at=user.created_at
+        )
+
+# Token subject (username) -> AuthenticatedUser. Entries are dropped when a
+# change to the user commits, but only in the worker that committed it; other
+# workers keep serving their entry until USER_CACHE_TTL runs out.
+user_cache = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User):
+    """
+    Note a changed user (password, is_active, ...) on its session; the cache
+    entry is dropped once the change commits, so a concurrent request cannot
+    cache the old row again in between.
+    """
+    session = object_session(target)
+    if session is None:
+        user_cache.pop(target.username)
+        return
+    changed = session.info.setdefault("changed_usernames", set())
+    changed.add(target.username)
+    changed.update(inspect(target).attrs.username.history.deleted or ())
+
+@event.listens_for(Session, "after_commit")
+def _drop_committed_users(session: Session):
+    for username in session.info.pop("changed_usernames", ()):
+        user_cache.pop(username)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session):
+    session.info.pop("changed_usernames", None)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against its hash."""
+    """Verify a plain password against its hash (blocking; prefer the async version in routes)."""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password."""
+    """Hash a password (blocking; prefer the async version in routes)."""
     return pwd_context.hash(password)
 
-def get_user(db: Session, username: str) -> Optional[User]:
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain password against its hash in the password process pool."""
+    verified, _ = await password_hasher.verify_and_update(plain_password, hashed_password)
+    return verified
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the password process pool."""
+    return await password_hasher.hash(password)
+
+async def get_user(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username."""
-    return db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get user by email."""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    """
+    Authenticate user by username and password.
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Authenticate user by username and password."""
-    user = get_user(db, username)
+    A hash made with a different bcrypt cost than configured is replaced on
+    successful login.
+    """
+    user = await get_user(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -65,8 +134,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """Get current authenticated user from JWT token."""
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthenticatedUser:
+    """
+    Get current authenticated user from JWT token.
+
+    Cache misses read the user from the primary, so a lagging replica cannot
+    cache the row from before a password or ``is_active`` change again.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -81,35 +155,40 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = get_user(db, username=token_data.username)
+    user = user_cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        async with AsyncSessionLocal() as db:
+            db_user = await get_user(db, username=token_data.username)
+        if db_user is None:
+            raise credentials_exception
+        user = AuthenticatedUser.from_user(db_user)
+        user_cache.set(user.username, user)
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
     """Get current active user."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def create_user(db: Session, username: str, email: str, password: str, full_name: Optional[str] = None) -> User:
+async def create_user(db: AsyncSession, username: str, email: str, password: str, full_name: Optional[str] = None) -> User:
     """Create a new user."""
     # Check if username already exists
-    if get_user(db, username):
+    if await get_user(db, username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
     # Check if email already exists
-    if get_user_by_email(db, email):
+    if await get_user_by_email(db, email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Create new user
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     db_user = User(
         username=username,
         email=email,
@@ -117,6 +196,6 @@ def create_user(db: Session, username: str, email: str, password: str, full_name
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
@@ -1,8 +1,9 @@
-from pydantic import BaseModel, validator, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, validator, field_validator, Field, EmailStr
 from typing import Optional, List
 from enum import Enum
+from datetime import datetime
 from app.core.enums import CarrierCode
-from app.schemas import ShipmentRequest
+from app.schemas import ShipmentRequest, PackageDetails
 
 class UserCreate(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -21,13 +22,24 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+def mask_secret(secret: str) -> str:
+    """Mask a secret string, showing only the last 4 characters."""
+    if len(secret) <= 4:
+        return "*" * len(secret)
+    return "*" * (len(secret) - 4) + secret[-4:]
+
+# Response models are validated straight from ORM objects (from_attributes),
+# so routes return the objects and FastAPI validates and serializes them once
+
 class UserProfile(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     username: str
     email: str
     full_name: Optional[str] = None
     is_active: bool
-    created_at: str
+    created_at: datetime
 
 class OriginLocation(BaseModel):
     name: str = Field(..., description="Location name (e.g., 'Main Warehouse')")
@@ -36,15 +48,17 @@ class OriginLocation(BaseModel):
     address_line2: Optional[str] = None
     city: str
     state: str
-    zip_code: str
+    zip_code: str = Field(..., max_length=20)
     country: str = "US"
     phone: Optional[str] = None
     is_default: bool = False
 
 class OriginLocationResponse(OriginLocation):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     user_id: int
-    created_at: str
+    created_at: datetime
 
 class OriginLocationUpdate(BaseModel):
     name: Optional[str] = None
@@ -53,7 +67,7 @@ class OriginLocationUpdate(BaseModel):
     address_line2: Optional[str] = None
     city: Optional[str] = None
     state: Optional[str] = None
-    zip_code: Optional[str] = None
+    zip_code: Optional[str] = Field(None, max_length=20)
     country: Optional[str] = None
     phone: Optional[str] = None
     is_default: Optional[bool] = None
@@ -67,16 +81,23 @@ class UserCarrierCredentials(BaseModel):
     description: Optional[str] = None
 
 class UserCarrierCredentialsResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     user_id: int
     carrier_code: str
     client_id: str
-    client_secret_masked: str  # Only show last 4 characters
+    client_secret_masked: str = Field(validation_alias="client_secret")  # Only show last 4 characters
     account_number: str
     is_active: bool
     description: Optional[str] = None
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
+
+    @field_validator("client_secret_masked")
+    @classmethod
+    def mask_client_secret(cls, value: str) -> str:
+        return mask_secret(value)
 
 class UserCarrierCredentialsUpdate(BaseModel):
     client_id: Optional[str] = None
@@ -88,8 +109,10 @@ class UserCarrierCredentialsUpdate(BaseModel):
 class UserShipmentRequest(BaseModel):
     origin_location_id: Optional[int] = None  # If None, use default location
     destination: ShipmentRequest
+    package: PackageDetails
     carrier_preference: Optional[List[CarrierCode]] = None  # If None, use all configured carriers
-    service_type: Optional[str] = "GROUND"
+    service_type: Optional[str] = "GROUND"  # Service level or carrier service code; None for all services
+    estimate_only: bool = False  # Price from published rate cards without calling the carriers
     
 class UserShipmentResponse(BaseModel):
     id: int
@@ -97,10 +120,18 @@ class UserShipmentResponse(BaseModel):
     origin_location: OriginLocationResponse
     destination: dict
     quotes: List[dict]
+    carrier_errors: List[dict] = []  # Carriers that could not be quoted, with the reason
     selected_carrier: Optional[str] = None
     tracking_number: Optional[str] = None
     status: str
-    created_at: str
+    created_at: datetime
+
+class LaneCarrierQuotes(BaseModel):
+    carrier: str
+    currency: str
+    min_amount: float
+    avg_amount: float
+    quote_count: int
 
 class UpdatePassword(BaseModel):
     current_password: str
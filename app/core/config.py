@@ -9,18 +9,96 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./shipments.db")
+    # Derived from DATABASE_URL (e.g. sqlite -> sqlite+aiosqlite) unless set
+    ASYNC_DATABASE_URL: Optional[str] = os.getenv("ASYNC_DATABASE_URL") or None
+    # Comma-separated read replica URLs; empty means all reads go to the primary
+    DATABASE_REPLICA_URLS: list = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_SLOW_CHECKOUT_MS: float = float(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+    
+    # SQLite tuning (ignored for other databases)
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", "60"))
+    USER_CACHE_MAXSIZE: int = int(os.getenv("USER_CACHE_MAXSIZE", "10000"))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(4 * (os.cpu_count() or 2))))
     
     # CORS
     CORS_ORIGINS: list = os.getenv("CORS_ORIGINS", "*").split(",")
     
     # Debug
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+    # Count queries per request and log repeats; defaults to DEBUG
+    QUERY_STATS_ENABLED: bool = os.getenv("QUERY_STATS_ENABLED", str(DEBUG)).lower() == "true"
+    QUERY_BUDGET: int = int(os.getenv("QUERY_BUDGET", "20"))
+    
+    # Monitoring
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+    HEALTH_CHECK_CARRIERS: bool = os.getenv("HEALTH_CHECK_CARRIERS", "true").lower() == "true"
     
-    # API Rate limiting
+    # API Rate limiting: token buckets per user (per IP for anonymous requests)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
     RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+    # Separate buckets for logins (bcrypt) and requests that call the carriers
+    AUTH_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("AUTH_RATE_LIMIT_PER_MINUTE", "10"))
+    CARRIER_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("CARRIER_RATE_LIMIT_PER_MINUTE", "20"))
+    RATE_LIMIT_SHARDS: int = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    # Share buckets across workers, e.g. redis://localhost:6379/0 (needs the redis package)
+    RATE_LIMIT_REDIS_URL: Optional[str] = os.getenv("RATE_LIMIT_REDIS_URL") or None
+    
+    # Carrier integrations
+    # API host for every carrier (e.g. a local simulator), then per-carrier
+    # overrides such as "UPS=http://127.0.0.1:8091"; unset means the sandbox hosts
+    CARRIER_BASE_URL: Optional[str] = os.getenv("CARRIER_BASE_URL") or None
+    CARRIER_BASE_URLS: dict = {
+        code.strip().upper(): url.strip()
+        for code, _, url in (item.partition("=") for item in os.getenv("CARRIER_BASE_URLS", "").split(","))
+        if code.strip() and url.strip()
+    }
+    CARRIER_REQUEST_TIMEOUT: float = float(os.getenv("CARRIER_REQUEST_TIMEOUT", "30"))
+    CARRIER_FANOUT_TIMEOUT: float = float(os.getenv("CARRIER_FANOUT_TIMEOUT", "30"))
+    CARRIER_QUOTE_TIMEOUT: float = float(os.getenv("CARRIER_QUOTE_TIMEOUT", "8"))
+    # Directory of published rate cards used for estimates and as a fallback
+    RATE_CARD_DIR: Optional[str] = os.getenv("RATE_CARD_DIR") or None
+    QUOTE_CACHE_MAXSIZE: int = int(os.getenv("QUOTE_CACHE_MAXSIZE", "10000"))
+    QUOTE_CACHE_TTL: float = float(os.getenv("QUOTE_CACHE_TTL", "900"))
+    QUOTE_CACHE_STALE_TTL: float = float(os.getenv("QUOTE_CACHE_STALE_TTL", "3600"))
+    # Per-carrier overrides of QUOTE_CACHE_TTL, e.g. "FEDEX=600,USPS=3600"
+    QUOTE_CACHE_CARRIER_TTLS: dict = {
+        code.strip().upper(): float(ttl)
+        for code, _, ttl in (item.partition("=") for item in os.getenv("QUOTE_CACHE_CARRIER_TTLS", "").split(","))
+        if code.strip() and ttl.strip()
+    }
+    BULK_QUOTE_CONCURRENCY: int = int(os.getenv("BULK_QUOTE_CONCURRENCY", "16"))
+    BULK_QUOTE_BATCH_SIZE: int = int(os.getenv("BULK_QUOTE_BATCH_SIZE", "100"))
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    CARRIER_LATENCY_BUDGET: float = float(os.getenv("CARRIER_LATENCY_BUDGET", "10"))
+    CARRIER_HEDGE_DELAY: float = float(os.getenv("CARRIER_HEDGE_DELAY", "0"))
+    CARRIER_BREAKER_FAILURES: int = int(os.getenv("CARRIER_BREAKER_FAILURES", "5"))
+    CARRIER_BREAKER_RESET_TIMEOUT: float = float(os.getenv("CARRIER_BREAKER_RESET_TIMEOUT", "30"))
+    CARRIER_POOL_MAXSIZE: int = int(os.getenv("CARRIER_POOL_MAXSIZE", "20"))
+    CARRIER_POOL_TIMEOUT: float = float(os.getenv("CARRIER_POOL_TIMEOUT", "5"))
+    CARRIER_POOL_KEEPALIVE: float = float(os.getenv("CARRIER_POOL_KEEPALIVE", "60"))
+    CARRIER_TOKEN_REFRESH_MARGIN: float = float(os.getenv("CARRIER_TOKEN_REFRESH_MARGIN", "120"))
+    CARRIER_TOKEN_REFRESH_INTERVAL: float = float(os.getenv("CARRIER_TOKEN_REFRESH_INTERVAL", "15"))
+    CARRIER_TOKEN_DEFAULT_TTL: float = float(os.getenv("CARRIER_TOKEN_DEFAULT_TTL", "300"))
+    CARRIER_TOKEN_CACHE_PATH: Optional[str] = os.getenv("CARRIER_TOKEN_CACHE_PATH") or None
+    CARRIER_TOKEN_CACHE_MAXSIZE: int = int(os.getenv("CARRIER_TOKEN_CACHE_MAXSIZE", "1000"))
 
 settings = Settings()
@@ -1,35 +1,250 @@
 """
 Database configuration and session management.
 """
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from typing import Dict, Optional, Type
+from fastapi import Request
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from app.core import metrics, query_stats
+from app.core.cache import TTLCache
 from app.core.config import settings
 
 # Database URL from settings
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-# SQLite specific configuration
-connect_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+# Async drivers for the database URLs we support
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
 
-# Create engine
+def to_async_url(url: str) -> str:
+    """Return ``url`` with its driver swapped for the matching async driver."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url  # Already names a driver explicitly
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+
+class PoolStats:
+    """Checkout counts and wait times for one connection pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False):
+        if timed_out:
+            metrics.db_pool_checkout_timeouts.inc(self.name)
+        else:
+            metrics.db_pool_checkout_wait.observe(wait, self.name)
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            if wait * 1000 >= settings.DB_POOL_SLOW_CHECKOUT_MS:
+                self.slow_checkouts += 1
+
+    def snapshot(self, pool: Pool) -> Dict[str, any]:
+        data = {
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(1000 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(1000 * self.wait_max, 3),
+            "slow_checkouts": self.slow_checkouts,
+            "timeouts": self.timeouts
+        }
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            data.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "saturation": round(pool.checkedout() / capacity, 3) if capacity > 0 else None
+            })
+        return data
+
+def timed_pool_class(base: Type[QueuePool], name: str) -> Type[QueuePool]:
+    """
+    Subclass ``base`` so that every checkout records how long it waited for a
+    free connection. Only checkouts that hit ``pool_timeout`` count as
+    timeouts; failures to connect propagate without being recorded. Each
+    call returns a new class with its own ``PoolStats``, which survives
+    ``Pool.recreate()``.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = base._do_get(self)
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get, "stats": PoolStats(name)})
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+def engine_options(url: str, pool_base: Type[QueuePool], name: str) -> Dict[str, any]:
+    """
+    Keyword arguments for create_engine/create_async_engine for ``url``;
+    ``name`` labels the engine's pool in /health and /metrics.
+    """
+    options = {"echo": settings.DEBUG}  # Enable SQL logging in debug mode
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    if is_sqlite_memory(url):
+        return options  # Uses SQLAlchemy's single-connection pool; sizing does not apply
+    options.update(
+        poolclass=timed_pool_class(pool_base, name),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING
+    )
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and writers."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    finally:
+        cursor.close()
+
+def configure_engine(sync_engine: Engine, url: str, name: str):
+    """Attach per-connection setup, query metrics and query counting to an engine."""
+    if is_sqlite(url) and not is_sqlite_memory(url):
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    query_stats.track_engine(sync_engine)
+    if settings.METRICS_ENABLED:
+        metrics.instrument_engine(sync_engine, name)
+
+# Create engine (used for table creation, scripts and other blocking code)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args=connect_args,
-    echo=settings.DEBUG  # Enable SQL logging in debug mode
+    **engine_options(SQLALCHEMY_DATABASE_URL, QueuePool, "sync")
 )
+configure_engine(engine, SQLALCHEMY_DATABASE_URL, "sync")
+
+# Async engine used by the API routes
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    **engine_options(SQLALCHEMY_ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, "async")
+)
+configure_engine(async_engine.sync_engine, SQLALCHEMY_ASYNC_DATABASE_URL, "async")
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objects stay usable after commit; async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Read replicas, used by read-only routes through get_read_db
+replica_engines = []
+for i, replica_url in enumerate(settings.DATABASE_REPLICA_URLS):
+    replica_async_url = to_async_url(replica_url)
+    replica_engine = create_async_engine(
+        replica_async_url,
+        **engine_options(replica_async_url, AsyncAdaptedQueuePool, f"replica_{i}")
+    )
+    configure_engine(replica_engine.sync_engine, replica_async_url, f"replica_{i}")
+    replica_engines.append(replica_engine)
+
+ReplicaSessionLocals = [
+    async_sessionmaker(replica, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    for replica in replica_engines
+]
+_next_replica = itertools.cycle(range(len(ReplicaSessionLocals)))
+
+# Users (or anonymous IPs) that committed a write recently; their reads stay on
+# the primary so they see their own changes even if the replicas lag behind
+_recent_writers = TTLCache(maxsize=100_000, ttl=settings.READ_YOUR_WRITES_SECONDS)
+
+def client_key(request: Request) -> str:
+    """
+    Identify the caller by user, so every token and device of a user shares
+    one key, or by IP for anonymous requests and invalid tokens.
+    """
+    # Imported here: the token check lives in modules that import this one
+    from app.core.rate_limit import token_subject
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        username = token_subject(token)
+        if username:
+            return f"user:{username}"
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session: Session):
+    key = session.info.get("client_key")
+    if key:
+        _recent_writers.set(key, True)
+
 # Create Base class for SQLAlchemy models
 Base = declarative_base()
 
-def get_db():
+async def get_db(request: Request):
+    """
+    Dependency to get an async database session on the primary.
     """
-    Dependency to get database session.
+    async with AsyncSessionLocal() as db:
+        db.sync_session.info["client_key"] = client_key(request)
+        yield db
+
+def read_session_factory(request: Request) -> async_sessionmaker:
+    """
+    Session factory for read-only work on behalf of ``request``.
+
+    Sessions are spread round-robin across the read replicas. Clients that
+    wrote within the last ``READ_YOUR_WRITES_SECONDS`` are kept on the
+    primary, as are all clients when no replicas are configured.
+    """
+    if not ReplicaSessionLocals or _recent_writers.get(client_key(request)):
+        return AsyncSessionLocal
+    return ReplicaSessionLocals[next(_next_replica)]
+
+async def get_read_db(request: Request):
+    """
+    Dependency to get an async session for read-only work, on a read replica
+    when possible (see ``read_session_factory``).
+    """
+    async with read_session_factory(request)() as db:
+        yield db
+
+def get_sync_db():
+    """
+    Dependency to get a blocking database session, for sync code paths.
     """
     db = SessionLocal()
     try:
@@ -42,3 +257,33 @@ def create_tables():
     Create all database tables.
     """
     Base.metadata.create_all(bind=engine)
+
+def pool_status() -> Dict[str, Dict[str, any]]:
+    """
+    Connection pool usage and checkout wait times, per engine.
+    """
+    status = {}
+    pools = [("sync", engine.pool), ("async", async_engine.sync_engine.pool)]
+    pools += [(f"replica_{i}", replica.sync_engine.pool) for i, replica in enumerate(replica_engines)]
+    for name, pool in pools:
+        stats: Optional[PoolStats] = getattr(pool, "stats", None)
+        status[name] = stats.snapshot(pool) if stats else {"pool": pool.status()}
+    return status
+
+metrics.register(metrics.Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool.", ("pool",),
+    lambda: {(name,): pool.get("checked_out") for name, pool in pool_status().items()}
+))
+metrics.register(metrics.Gauge(
+    "db_pool_saturation", "Checked-out connections as a fraction of pool size plus overflow.", ("pool",),
+    lambda: {(name,): pool.get("saturation") for name, pool in pool_status().items()}
+))
+
+async def dispose_engines():
+    """
+    Close pooled connections on shutdown.
+    """
+    await async_engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+    engine.dispose()
@@ -9,6 +9,12 @@ class CarrierCode(str, Enum):
     UPS = "UPS" 
     USPS = "USPS"
 
+class ServiceLevel(str, Enum):
+    """Carrier-neutral delivery speed of a shipping service."""
+    GROUND = "GROUND"
+    EXPEDITED = "EXPEDITED"
+    OVERNIGHT = "OVERNIGHT"
+
 class ShipmentStatus(str, Enum):
     """Shipment status options."""
     QUOTED = "QUOTED"
@@ -1,25 +1,161 @@
 """
 Health check utilities for monitoring and diagnostics.
+
+Probes never touch the database or the carriers themselves. A background
+``HealthMonitor`` checks them every ``HEALTH_CHECK_INTERVAL`` seconds and
+the probe endpoints return its latest results alongside in-memory pool and
+circuit counters, so load balancers can poll as often as they like.
 """
+import asyncio
+import logging
+import time
 from datetime import datetime
+from typing import Dict, Optional
+import httpx
 from sqlalchemy import text
-from app.core.database import SessionLocal
+from app.core.config import settings
+from app.core.database import async_engine, replica_engines, pool_status
+from app.core.http import carrier_request
+from app.carriers import carrier_circuits, get_adapter, registered_carriers
+from app.core.utils import quote_cache, rate_cards
+
+logger = logging.getLogger(__name__)
+
+VERSION = "2.0.0"
+
+def _elapsed_ms(start: float) -> float:
+    return round(1000 * (time.perf_counter() - start), 2)
+
+async def check_engine(engine) -> Dict[str, any]:
+    """Run ``SELECT 1`` on ``engine`` within ``HEALTH_CHECK_TIMEOUT``."""
+    async def select_one():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
 
-def check_database_health() -> bool:
-    """Check if database is accessible."""
+    start = time.perf_counter()
     try:
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))
-        db.close()
-        return True
-    except Exception:
-        return False
+        await asyncio.wait_for(select_one(), settings.HEALTH_CHECK_TIMEOUT)
+        return {"ok": True, "latency_ms": _elapsed_ms(start)}
+    except Exception as e:
+        return {"ok": False, "latency_ms": _elapsed_ms(start), "error": str(e) or e.__class__.__name__}
+
+async def check_carrier(base_url: str) -> Dict[str, any]:
+    """
+    Whether a carrier's API host answers at all. Any HTTP response counts;
+    only connection errors and timeouts mean unreachable.
+    """
+    start = time.perf_counter()
+    try:
+        await carrier_request("HEAD", base_url, timeout=settings.HEALTH_CHECK_TIMEOUT)
+        return {"ok": True, "latency_ms": _elapsed_ms(start)}
+    except httpx.HTTPError as e:
+        return {"ok": False, "latency_ms": _elapsed_ms(start), "error": str(e) or e.__class__.__name__}
+
+class HealthMonitor:
+    """Refreshes a health snapshot in the background for the probe endpoints."""
+
+    def __init__(self, interval: float, check_carriers: bool = True):
+        self.interval = interval
+        self.check_carriers = check_carriers
+        self.started_at = time.monotonic()
+        self.checked_at: Optional[float] = None
+        self.snapshot: Dict[str, any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> Dict[str, any]:
+        """Run every check concurrently and store the result as the new snapshot."""
+        start = time.perf_counter()
+        engines = {"primary": async_engine}
+        engines.update({f"replica_{i}": replica for i, replica in enumerate(replica_engines)})
+        carriers = [get_adapter(code) for code in registered_carriers()] if self.check_carriers else []
+        results = await asyncio.gather(
+            *(check_engine(engine) for engine in engines.values()),
+            *(check_carrier(adapter.base_url) for adapter in carriers)
+        )
+        databases = dict(zip(engines, results))
+        database_ok = databases["primary"]["ok"]
+        degraded = not all(check["ok"] for check in results)
+        self.snapshot = {
+            "status": "unhealthy" if not database_ok else "degraded" if degraded else "healthy",
+            "timestamp": datetime.utcnow().isoformat(),
+            "database": "connected" if database_ok else "disconnected",
+            "checks": {
+                "database": databases,
+                "carriers": dict(zip((adapter.name for adapter in carriers), results[len(engines):])),
+                "duration_ms": _elapsed_ms(start)
+            }
+        }
+        self.checked_at = time.monotonic()
+        return self.snapshot
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Health check failed")
+
+    async def start(self):
+        """Take a first snapshot, then keep refreshing it on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        await self.refresh()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last snapshot, or None before the first one."""
+        return None if self.checked_at is None else time.monotonic() - self.checked_at
+
+    def liveness(self) -> Dict[str, any]:
+        """The process is up and its event loop is running."""
+        return {"status": "alive", "uptime_seconds": round(time.monotonic() - self.started_at, 1), "version": VERSION}
+
+    def readiness(self) -> Dict[str, any]:
+        """
+        Whether this instance should receive traffic: the primary database
+        answered the last check and that check is recent. Carrier problems
+        only degrade the status, since quotes can still fall back to
+        cached prices and rate cards.
+        """
+        age = self.age()
+        stale = age is None or age > 3 * self.interval
+        checks = self.snapshot.get("checks", {})
+        return {
+            "ready": not stale and self.snapshot.get("database") == "connected",
+            "status": "stale" if stale else self.snapshot.get("status"),
+            "checked_seconds_ago": None if age is None else round(age, 3),
+            "database": checks.get("database", {}),
+            "carriers": checks.get("carriers", {}),
+            "database_pool": {
+                name: {key: pool.get(key) for key in ("saturation", "checked_out", "avg_wait_ms")}
+                for name, pool in pool_status().items()
+            }
+        }
+
+health_monitor = HealthMonitor(settings.HEALTH_CHECK_INTERVAL, settings.HEALTH_CHECK_CARRIERS)
 
 def get_health_status() -> dict:
-    """Get comprehensive health status."""
+    """
+    Get comprehensive health status: database and carrier checks as of the
+    monitor's last run, plus the in-memory pool, circuit and cache counters.
+    """
+    age = health_monitor.age()
     return {
-        "status": "healthy" if check_database_health() else "unhealthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "database": "connected" if check_database_health() else "disconnected",
-        "version": "2.0.0"
+        **health_monitor.snapshot,
+        "checked_seconds_ago": None if age is None else round(age, 3),
+        "database_pool": pool_status(),
+        "carriers": carrier_circuits(),
+        "quote_cache": quote_cache.stats(),
+        "rate_cards": rate_cards.stats(),
+        "version": VERSION
     }
@@ -0,0 +1,46 @@
+"""
+Long-lived HTTP connection pools for outbound carrier calls.
+
+Each carrier host gets its own ``httpx.AsyncClient`` so connections (and the
+TLS handshake that opened them) are kept alive and reused across requests
+instead of paying DNS, TCP and TLS setup on every call.
+"""
+from typing import Dict
+from urllib.parse import urlsplit
+import httpx
+from app.core.config import settings
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.CARRIER_REQUEST_TIMEOUT,
+            pool=settings.CARRIER_POOL_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.CARRIER_POOL_MAXSIZE,
+            max_keepalive_connections=settings.CARRIER_POOL_MAXSIZE,
+            keepalive_expiry=settings.CARRIER_POOL_KEEPALIVE
+        )
+    )
+
+def get_carrier_client(url: str) -> httpx.AsyncClient:
+    """Return the pooled client for the host serving ``url``."""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _clients[host] = _create_client()
+    return client
+
+async def carrier_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request to a carrier API through that host's connection pool."""
+    return await get_carrier_client(url).request(method, url, **kwargs)
+
+async def close_carrier_clients():
+    """Close every pooled connection; called on application shutdown."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -1,9 +1,13 @@
 """
 Application initialization and startup.
 """
-from app.core.database import create_tables
+from app.core.database import create_tables, engine
+from app.core.migrations import upgrade_schema
 
 def init_app():
     """Initialize the application - create database tables etc."""
     create_tables()
     print("Database tables created successfully!")
+    created = upgrade_schema(engine)
+    if created:
+        print(f"Database schema upgraded: {', '.join(created)}")
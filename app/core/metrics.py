@@ -0,0 +1,219 @@
+"""
+Prometheus metrics, rendered in the text exposition format at ``/metrics``.
+
+A small in-process registry of counters, histograms and gauges. Recording
+is a lock, a bisect and a few additions, so it stays on in production;
+gauges are read from their owners only when ``/metrics`` is scraped. Each
+worker process keeps its own values, and Prometheus aggregates across them
+by instance.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CARRIER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.labelnames, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {repr(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+class Gauge(Metric):
+    """A value read from ``collect`` at scrape time: a mapping of label tuples to numbers."""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], collect: Callable[[], Dict[Tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            if value is not None:
+                yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+_registry: List[Metric] = []
+
+def register(metric: Metric) -> Metric:
+    _registry.append(metric)
+    return metric
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+# ------------------------------------------
+# Metrics recorded across the app
+# ------------------------------------------
+
+http_request_duration = register(Histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, by route template.",
+    ("method", "route", "status")
+))
+db_query_duration = register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by engine and statement type.",
+    ("engine", "statement"), SQL_BUCKETS
+))
+db_pool_checkout_wait = register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection.",
+    ("pool",), SQL_BUCKETS
+))
+db_pool_checkout_timeouts = register(Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection.", ("pool",)
+))
+password_hash_duration = register(Histogram(
+    "password_hash_duration_seconds", "bcrypt hash or verify time, including the wait for a worker.",
+    ("operation",), HTTP_BUCKETS
+))
+password_hash_rejections = register(Counter(
+    "password_hash_rejections_total", "Hashes refused with 503 because the hashing pool was saturated."
+))
+carrier_request_duration = register(Histogram(
+    "carrier_request_duration_seconds",
+    "Outbound carrier API call time, by carrier and outcome (success or the error_type).",
+    ("carrier", "outcome"), CARRIER_BUCKETS
+))
+
+# ------------------------------------------
+# SQLAlchemy instrumentation
+# ------------------------------------------
+
+SQL_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK"}
+
+def statement_type(statement: str) -> str:
+    head = statement.lstrip()[:10].split(None, 1)
+    verb = head[0].upper() if head else ""
+    return verb if verb in SQL_STATEMENTS else "OTHER"
+
+def instrument_engine(sync_engine: Engine, name: str):
+    """Time every statement ``sync_engine`` executes under the ``engine`` label ``name``."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts: Optional[list] = conn.info.get("query_start")
+        if starts:
+            db_query_duration.observe(time.perf_counter() - starts.pop(), name, statement_type(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        connection = exception_context.connection
+        starts = connection.info.get("query_start") if connection is not None else None
+        if starts:
+            starts.pop()
+
+# ------------------------------------------
+# HTTP instrumentation
+# ------------------------------------------
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request, from arrival to the last byte
+    of the response, labelled with the matched route's path template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                scope["method"], getattr(route, "path", "unmatched"), status_code
+            )
@@ -0,0 +1,215 @@
+"""
+Schema upgrades for existing databases.
+
+``create_all`` only creates missing tables, so indexes and column types
+changed in models later never reach tables that already exist.
+``upgrade_schema`` fills that gap and is safe to run on every startup.
+One-off data migrations are recorded in ``schema_migrations`` so they run
+only once.
+"""
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, inspect, insert, select, text
+from sqlalchemy.engine import Engine
+from app.core.database import Base
+from app.models import OriginLocation, ShipmentQuote, UserShipment
+
+logger = logging.getLogger(__name__)
+
+# Columns that hold JSON documents; stored as TEXT before they became ``JSONDocument``
+JSON_COLUMNS = {"user_shipments": ("destination_data", "quotes_data")}
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Names of data migrations that have completed; kept out of the models'
+# metadata since the application itself never reads it
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def _applied(connection, name: str) -> bool:
+    return connection.execute(
+        select(schema_migrations.c.name).where(schema_migrations.c.name == name)
+    ).first() is not None
+
+def _mark_applied(connection, name: str):
+    connection.execute(insert(schema_migrations), {"name": name, "applied_at": datetime.utcnow()})
+
+def _dedupe_carrier_credentials(connection) -> str:
+    """
+    Keep one row per (user_id, carrier_code) before enforcing uniqueness:
+    the newest active row, or the newest row when none is active. Every
+    deleted id is logged.
+    """
+    groups = connection.execute(text(
+        "SELECT user_id, carrier_code FROM carrier_credentials "
+        "GROUP BY user_id, carrier_code HAVING COUNT(*) > 1"
+    )).all()
+    if not groups:
+        return ""
+    logger.warning("Found %d users with duplicate carrier credentials", len(groups))
+    deleted = 0
+    for user_id, carrier_code in groups:
+        ids = connection.execute(text(
+            "SELECT id FROM carrier_credentials WHERE user_id = :user_id AND carrier_code = :carrier_code "
+            "ORDER BY CASE WHEN is_active THEN 1 ELSE 0 END DESC, id DESC"
+        ), {"user_id": user_id, "carrier_code": carrier_code}).scalars().all()
+        for duplicate_id in ids[1:]:
+            logger.warning(
+                "Deleting duplicate carrier_credentials row %s (user %s, %s); keeping row %s",
+                duplicate_id, user_id, carrier_code, ids[0]
+            )
+            connection.execute(text("DELETE FROM carrier_credentials WHERE id = :id"), {"id": duplicate_id})
+            deleted += 1
+    return f"{deleted} duplicate carrier_credentials rows deleted"
+
+# Data fixes that must run before a given index can be created; each returns
+# a description of the rows it changed, or "" if there was nothing to fix
+PRE_INDEX_STEPS = {
+    "uq_carrier_credentials_user_id_carrier_code": _dedupe_carrier_credentials,
+}
+
+def _widen_string_columns(connection, inspector, existing_tables) -> list:
+    """On PostgreSQL, widen ``VARCHAR`` columns that the models now allow to be longer."""
+    if connection.dialect.name != "postgresql":
+        return []  # SQLite does not enforce VARCHAR lengths
+    widened = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        lengths = {
+            column["name"]: getattr(column["type"], "length", None)
+            for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            length = getattr(column.type, "length", None)
+            if length and lengths.get(column.name) and lengths[column.name] < length:
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE VARCHAR({length})"
+                ))
+                widened.append(f"{table.name}.{column.name}")
+    return widened
+
+def _upgrade_json_columns(connection, inspector) -> list:
+    """On PostgreSQL, convert JSON text columns to ``JSONB`` in place."""
+    if connection.dialect.name != "postgresql":
+        return []  # Other databases keep JSON as text, which already reads back
+    upgraded = []
+    for table, columns in JSON_COLUMNS.items():
+        types = {column["name"]: column["type"] for column in inspector.get_columns(table)}
+        for column in columns:
+            if isinstance(types.get(column), Text):
+                connection.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"
+                ))
+                upgraded.append(f"{table}.{column}")
+    return upgraded
+
+def _quote_rows(shipment) -> Optional[List[dict]]:
+    """
+    ``shipment_quotes`` rows for one shipment, or None if its stored quotes
+    do not have the expected shape or do not fit the table's columns.
+    """
+    try:
+        rows = [
+            {
+                "shipment_id": shipment.id,
+                "user_id": shipment.user_id,
+                "origin_zip": shipment.zip_code,
+                "destination_zip": shipment.destination_data.get("zip_code", ""),
+                "carrier": quote["carrier"],
+                "service_code": quote["service_code"],
+                "service_level": quote.get("service_level"),
+                "amount": float(quote["amount"]),
+                "currency": quote.get("currency", "USD"),
+                "transit_days": quote.get("transit_days"),
+                "rank": quote.get("rank", rank),
+                "estimated": quote.get("estimated", False),
+                "created_at": shipment.created_at
+            }
+            for rank, quote in enumerate(shipment.quotes_data, start=1)
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    columns = ShipmentQuote.__table__.columns
+    for row in rows:
+        for name, value in row.items():
+            length = getattr(columns[name].type, "length", None)
+            if value is not None and length and not (isinstance(value, str) and len(value) <= length):
+                return None
+    return rows
+
+BACKFILL_MIGRATION = "backfill_shipment_quotes"
+
+def _backfill_shipment_quotes(connection) -> Tuple[int, int]:
+    """
+    Fill ``shipment_quotes`` from the quotes stored on existing shipments,
+    once. Returns the number of quotes added and the number of shipments
+    skipped because their stored quotes are malformed.
+    """
+    if _applied(connection, BACKFILL_MIGRATION):
+        return 0, 0
+    added = skipped = 0
+    # A table that already has rows was filled by the application itself
+    if not connection.execute(select(ShipmentQuote.id).limit(1)).first():
+        shipments = connection.execution_options(yield_per=BACKFILL_BATCH_SIZE).execute(
+            select(
+                UserShipment.id, UserShipment.user_id, UserShipment.created_at,
+                UserShipment.destination_data, UserShipment.quotes_data, OriginLocation.zip_code
+            )
+            .join(OriginLocation, UserShipment.origin_location_id == OriginLocation.id)
+            .where(UserShipment.quotes_data.is_not(None))
+            .order_by(UserShipment.id)
+        )
+        for batch in shipments.partitions():
+            rows = []
+            for shipment in batch:
+                shipment_rows = _quote_rows(shipment)
+                if shipment_rows is None:
+                    skipped += 1
+                else:
+                    rows += shipment_rows
+            if rows:
+                connection.execute(insert(ShipmentQuote), rows)
+                added += len(rows)
+    _mark_applied(connection, BACKFILL_MIGRATION)
+    return added, skipped
+
+def upgrade_schema(engine: Engine) -> list:
+    """
+    Bring existing tables up to the models: convert JSON columns, widen
+    string columns, create missing indexes and backfill ``shipment_quotes``
+    (once). Returns a description of each change made.
+    """
+    created = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        if "user_shipments" in existing_tables:
+            created += [f"{column} -> JSONB" for column in _upgrade_json_columns(connection, inspector)]
+        created += [f"{column} widened" for column in _widen_string_columns(connection, inspector, existing_tables)]
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in existing_indexes:
+                    continue
+                step = PRE_INDEX_STEPS.get(index.name)
+                if step:
+                    change = step(connection)
+                    if change:
+                        created.append(change)
+                index.create(bind=connection)
+                created.append(index.name)
+        schema_migrations.create(bind=connection, checkfirst=True)
+        backfilled, skipped = _backfill_shipment_quotes(connection)
+        if backfilled:
+            created.append(f"shipment_quotes backfilled with {backfilled} quotes")
+        if skipped:
+            created.append(f"{skipped} shipments with malformed quotes not backfilled")
+    return created
@@ -0,0 +1,67 @@
+"""
+Keyset pagination and field projection helpers for list endpoints.
+"""
+import base64
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Request, status
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor pointing just after the row with ``last_id``."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Return the row id encoded in ``cursor``; 400 if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(raw)["id"]
+        if not isinstance(last_id, int):
+            raise ValueError
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Split a ``fields=a,b`` query value, rejecting unknown names with 400."""
+    if not fields:
+        return None
+    allowed = list(allowed)
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return selected
+
+def projected_columns(selected: Sequence[str], column_for_field: Dict[str, str]) -> List[str]:
+    """Columns to SELECT for the requested fields; ``id`` is always included for the cursor."""
+    columns = ["id"]
+    for name in selected:
+        column = column_for_field.get(name, name)
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+def paginate(rows: Sequence, limit: Optional[int]) -> Tuple[Sequence, Optional[str]]:
+    """
+    Trim rows fetched with ``limit + 1`` back to ``limit`` and return the
+    cursor for the next page, or None if this was the last page.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
+
+def pagination_headers(request: Request, next_cursor: Optional[str]) -> Dict[str, str]:
+    """``X-Next-Cursor`` and RFC 8288 ``Link`` headers for the next page."""
+    if not next_cursor:
+        return {}
+    next_url = request.url.include_query_params(after=next_cursor)
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
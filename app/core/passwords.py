@@ -0,0 +1,122 @@
+"""
+Password hashing in a dedicated process pool.
+
+bcrypt is deliberately slow and holds the GIL for much of its work, so it is
+run in separate processes instead of on the shared threadpool. The number of
+hashes queued at once is bounded; when the pool is saturated callers get an
+immediate 503 instead of waiting behind a login storm.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.core import metrics
+from app.core.config import settings
+
+_contexts: Dict[int, CryptContext] = {}
+
+def get_crypt_context(rounds: int = settings.BCRYPT_ROUNDS) -> CryptContext:
+    """
+    CryptContext that hashes with ``rounds`` and flags hashes made with any
+    other cost as needing an update.
+    """
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds
+        )
+    return context
+
+# These run inside the worker processes
+
+def _hash(password: str, rounds: int) -> str:
+    return get_crypt_context(rounds).hash(password)
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return get_crypt_context(rounds).verify_and_update(password, hashed_password)
+
+OPERATIONS = {_hash: "hash", _verify_and_update: "verify"}
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt hashing and verification."""
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking a process that runs an event loop and threads is unsafe
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                metrics.password_hash_rejections.inc()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service is busy, please retry shortly",
+                    headers={"Retry-After": "1"}
+                )
+            self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args, self.rounds)
+        finally:
+            metrics.password_hash_duration.observe(time.perf_counter() - start, OPERATIONS[func])
+            with self._lock:
+                self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured bcrypt rounds."""
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password. If it matches but the stored hash uses a different
+        cost than configured, also return a replacement hash.
+        """
+        return await self._run(_verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS
+)
+
+metrics.register(metrics.Gauge(
+    "password_hash_pending", "Hashes running or queued in the hashing pool.", (),
+    lambda: {(): password_hasher.pending}
+))
@@ -0,0 +1,138 @@
+"""
+Per-request SQL query counting and N+1 detection.
+
+Every statement run on a tracked engine is counted against the
+``QueryStats`` of the current context, if there is one. With
+``QUERY_STATS_ENABLED`` the middleware gives each request its own stats,
+logs requests that repeat a statement or go over ``QUERY_BUDGET``, and in
+``DEBUG`` mode reports the totals in ``X-Query-*`` response headers.
+
+``assert_max_queries`` turns the same counts into a check for tests; it
+works whether or not ``QUERY_STATS_ENABLED`` is set::
+
+    with assert_max_queries(2):
+        client.post("/user/locations", json=location, headers=auth)
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class QueryStats:
+    """Statements run by one request (or one ``count_queries`` block)."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self) -> List[tuple]:
+        """Statements run more than once, most repeated first: likely N+1 loops."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n > 1]
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries in {1000 * self.duration:.1f} ms{f' for {self.label}' if self.label else ''}"]
+        lines += [f"  {n}x {' '.join(statement.split())[:200]}" for statement, n in self.statements.most_common()]
+        return "\n".join(lines)
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Requests finished while an assert_max_queries block is open, so tests
+# can check routes served on the test client's own event loop thread
+_captures: List[List[QueryStats]] = []
+_captures_lock = threading.Lock()
+
+def track_engine(sync_engine: Engine):
+    """Count statements run on ``sync_engine`` against the current ``QueryStats``."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info["query_stats_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        start = conn.info.pop("query_stats_start", None)
+        if stats is not None and start is not None:
+            stats.record(statement, time.perf_counter() - start)
+
+@contextmanager
+def count_queries(label: str = "") -> Iterator[QueryStats]:
+    """Count the statements run in this context while the block is open."""
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def assert_max_queries(limit: int, allow_repeats: bool = True) -> Iterator[List[QueryStats]]:
+    """
+    Fail with ``AssertionError`` if any request finished inside the block, or
+    the block's own direct database calls, ran more than ``limit`` queries,
+    or (with ``allow_repeats=False``) ran any statement twice.
+    """
+    captured: List[QueryStats] = []
+    with _captures_lock:
+        _captures.append(captured)
+    try:
+        with count_queries("direct calls") as direct:
+            yield captured
+    finally:
+        with _captures_lock:
+            _captures.remove(captured)
+    for stats in captured + ([direct] if direct.count else []):
+        if stats.count > limit:
+            raise AssertionError(f"Query budget of {limit} exceeded:\n{stats.report()}")
+        if not allow_repeats and stats.repeated():
+            raise AssertionError(f"Repeated statements:\n{stats.report()}")
+
+def _finish(stats: QueryStats):
+    with _captures_lock:
+        for captured in _captures:
+            captured.append(stats)
+    if stats.count > settings.QUERY_BUDGET or stats.repeated():
+        logger.warning("Query budget check: %s", stats.report())
+
+class QueryStatsMiddleware:
+    """ASGI middleware giving each HTTP request its own ``QueryStats``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (settings.QUERY_STATS_ENABLED or _captures):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.DEBUG:
+                # Streaming responses may run more queries after this point
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-count", str(stats.count).encode()),
+                    (b"x-query-time-ms", f"{1000 * stats.duration:.1f}".encode()),
+                    (b"x-query-repeated", str(len(stats.repeated())).encode())
+                ]
+            await send(message)
+
+        with count_queries(f"{scope['method']} {scope['path']}") as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                _finish(stats)
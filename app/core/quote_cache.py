@@ -0,0 +1,117 @@
+"""
+Lane-keyed cache of carrier rate quotes with stale-while-revalidate.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+from app.core.cache import TTLCache
+
+Fetch = Callable[[], Awaitable[Dict[str, any]]]
+
+class QuoteCache:
+    """
+    Bounded LRU cache of one carrier's normalized quotes per lane.
+
+    Entries are fresh for the carrier's TTL and are then kept for a further
+    ``stale_ttl`` seconds. A stale entry is returned straight away while a
+    background task asks the carrier again; if the carrier errors or its
+    circuit is open, the stale entry keeps being served until it runs out.
+    Concurrent misses for the same lane share a single carrier call, and
+    failed results are never cached.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 900, stale_ttl: float = 3600, carrier_ttls: Optional[Dict[str, float]] = None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.carrier_ttls = carrier_ttls or {}
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._background: Set[asyncio.Future] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.revalidation_failures = 0
+
+    def ttl_for(self, carrier: str) -> float:
+        return self.carrier_ttls.get(carrier, self.ttl)
+
+    async def get_quotes(self, key: Hashable, carrier: str, fetch: Fetch) -> Dict[str, any]:
+        """
+        Return the rate result for ``key``, calling ``fetch`` only on a miss.
+
+        Results carry ``cached`` and ``stale`` flags; the quote dicts are
+        copies, so callers may annotate them freely.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            result, fresh_until = entry
+            if time.monotonic() < fresh_until:
+                self.hits += 1
+                return self._copy(result, cached=True, stale=False)
+            self.stale_hits += 1
+            self._revalidate(key, carrier, fetch)
+            return self._copy(result, cached=True, stale=True)
+
+        self.misses += 1
+        # Shielded so a caller that gives up does not cancel the shared call;
+        # its result still fills the cache for the next request
+        result = await asyncio.shield(self._flight(key, carrier, fetch))
+        return self._copy(result, cached=False, stale=False)
+
+    def _flight(self, key: Hashable, carrier: str, fetch: Fetch) -> asyncio.Future:
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = asyncio.ensure_future(self._load(key, carrier, fetch))
+            flight.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # Mark the error as retrieved even if every waiter has given up
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return flight
+
+    async def _load(self, key: Hashable, carrier: str, fetch: Fetch) -> Dict[str, any]:
+        result = await fetch()
+        if result.get("success"):
+            ttl = self.ttl_for(carrier)
+            self._entries.set(key, (result, time.monotonic() + ttl), ttl=ttl + self.stale_ttl)
+        return result
+
+    def _revalidate(self, key: Hashable, carrier: str, fetch: Fetch):
+        if key in self._inflight:
+            return
+        self.revalidations += 1
+        flight = self._flight(key, carrier, fetch)
+        self._background.add(flight)
+        flight.add_done_callback(self._revalidated)
+
+    def _revalidated(self, flight: asyncio.Future):
+        self._background.discard(flight)
+        if flight.cancelled() or flight.exception() is not None or not flight.result().get("success"):
+            self.revalidation_failures += 1
+
+    @staticmethod
+    def _copy(result: Dict[str, any], cached: bool, stale: bool) -> Dict[str, any]:
+        copy = {**result, "cached": cached, "stale": stale}
+        if "quotes" in copy:
+            copy["quotes"] = [dict(quote) for quote in copy["quotes"]]
+        return copy
+
+    def clear(self):
+        self._entries.clear()
+
+    async def stop(self):
+        """Cancel background revalidations, e.g. on shutdown."""
+        flights = list(self._background)
+        for flight in flights:
+            flight.cancel()
+        if flights:
+            await asyncio.gather(*flights, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "revalidation_failures": self.revalidation_failures
+        }
@@ -0,0 +1,172 @@
+"""
+Offline rate-card pricing.
+
+Published rate cards and zone charts are loaded into NumPy arrays so that
+any number of package/lane pairs can be priced in one vectorized lookup,
+without calling the carrier. Used for fast estimates and as a fallback when
+a carrier cannot be reached.
+
+Cards are read from ``RATE_CARD_DIR``, one directory per carrier::
+
+    RATE_CARD_DIR/
+        UPS/
+            zones.csv   # origin_prefix,dest_prefix,zone (3-digit ZIP prefixes)
+            03.csv      # weight_lb,2,3,4,... price per whole pound and zone
+            02.csv      # one file per service code
+
+Weights are billed in whole pounds after applying dimensional weight.
+Lanes without a zone and weights beyond a card's last row are unpriced.
+"""
+import csv
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cubic inches per pound of dimensional weight
+DIM_DIVISORS = {"FEDEX": 139, "UPS": 139, "USPS": 166}
+ZIP_PREFIXES = 1000
+
+def zip_prefixes(zip_codes: Sequence[str]) -> np.ndarray:
+    """First three digits of each ZIP code as integers; -1 where not numeric."""
+    heads = np.char.strip(np.asarray(zip_codes, dtype=str)).astype("U3")
+    valid = (np.char.str_len(heads) == 3) & np.char.isdigit(heads)
+    prefixes = np.full(len(heads), -1, dtype=np.int16)
+    prefixes[valid] = heads[valid].astype(np.int16)
+    return prefixes
+
+@dataclass
+class RateCard:
+    """One carrier's zone chart and per-service price tables."""
+    carrier: str
+    zones: np.ndarray  # [origin_prefix, dest_prefix] -> zone, 0 if not served
+    prices: Dict[str, np.ndarray]  # service code -> [billable_lb, zone] -> price, NaN if none
+    dim_divisor: float
+
+    @classmethod
+    def load(cls, carrier: str, directory: str) -> "RateCard":
+        zones = np.zeros((ZIP_PREFIXES, ZIP_PREFIXES), dtype=np.int16)
+        with open(os.path.join(directory, "zones.csv"), newline="") as f:
+            rows = [row for row in csv.reader(f) if row and row[0].strip().isdigit()]
+        if rows:
+            chart = np.array(rows, dtype=np.int16)
+            zones[chart[:, 0], chart[:, 1]] = chart[:, 2]
+
+        prices = {}
+        for name in sorted(os.listdir(directory)):
+            service_code, ext = os.path.splitext(name)
+            if ext != ".csv" or service_code == "zones":
+                continue
+            with open(os.path.join(directory, name), newline="") as f:
+                header, *rows = [row for row in csv.reader(f) if row]
+            columns = [int(zone) for zone in header[1:]]
+            table = np.array(rows, dtype=np.float64)
+            weights = table[:, 0].astype(np.int64)
+            card = np.full((weights.max() + 1, max(columns) + 1), np.nan)
+            card[weights[:, None], np.array(columns)[None, :]] = table[:, 1:]
+            prices[service_code] = card
+        return cls(carrier, zones, prices, DIM_DIVISORS.get(carrier, 139))
+
+    def zone(self, origin_prefixes: np.ndarray, dest_prefixes: np.ndarray) -> np.ndarray:
+        served = (origin_prefixes >= 0) & (dest_prefixes >= 0)
+        zones = np.zeros(len(origin_prefixes), dtype=np.int16)
+        zones[served] = self.zones[origin_prefixes[served], dest_prefixes[served]]
+        return zones
+
+    def billable_weight(self, weights: np.ndarray, lengths: np.ndarray, widths: np.ndarray, heights: np.ndarray) -> np.ndarray:
+        dim_weight = lengths * widths * heights / self.dim_divisor
+        return np.ceil(np.maximum(weights, dim_weight)).astype(np.int64)
+
+    def price(
+        self,
+        origin_prefixes: np.ndarray,
+        dest_prefixes: np.ndarray,
+        weights: np.ndarray,
+        lengths: np.ndarray,
+        widths: np.ndarray,
+        heights: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """
+        Price every package/lane pair with every service.
+
+        All arguments are equal-length arrays. Returns one array of prices
+        per service code, NaN where the pair cannot be priced.
+        """
+        zones = self.zone(origin_prefixes, dest_prefixes)
+        billable = self.billable_weight(weights, lengths, widths, heights)
+        results = {}
+        for service_code, card in self.prices.items():
+            valid = (zones > 0) & (zones < card.shape[1]) & (billable < card.shape[0])
+            amounts = np.full(len(zones), np.nan)
+            amounts[valid] = card[billable[valid], zones[valid]]
+            results[service_code] = amounts
+        return results
+
+class RateCardEngine:
+    """Rate cards of every carrier found in ``RATE_CARD_DIR``."""
+
+    def __init__(self):
+        self.cards: Dict[str, RateCard] = {}
+
+    def load(self, directory: Optional[str]):
+        """Load all carrier cards under ``directory``; a missing directory loads none."""
+        self.cards = {}
+        if not directory or not os.path.isdir(directory):
+            return
+        for carrier in sorted(os.listdir(directory)):
+            path = os.path.join(directory, carrier)
+            if not os.path.isfile(os.path.join(path, "zones.csv")):
+                continue
+            try:
+                self.cards[carrier.upper()] = RateCard.load(carrier.upper(), path)
+            except (OSError, ValueError, IndexError) as e:
+                logger.warning("Skipping rate card for %s: %s", carrier, e)
+
+    def has(self, carrier: str) -> bool:
+        return carrier in self.cards
+
+    def price_batch(self, carrier: str, origins: Sequence[str], destinations: Sequence[str], packages: Sequence[dict]) -> Dict[str, np.ndarray]:
+        """
+        Price many shipments with one carrier's card.
+
+        ``origins`` and ``destinations`` are ZIP codes and ``packages`` are
+        ``PackageDetails`` dicts, all the same length.
+        """
+        dims = np.array(
+            [(p["weight_lb"], p["length_in"], p["width_in"], p["height_in"]) for p in packages],
+            dtype=np.float64
+        ).reshape(-1, 4)
+        return self.cards[carrier].price(
+            zip_prefixes(origins), zip_prefixes(destinations),
+            dims[:, 0], dims[:, 1], dims[:, 2], dims[:, 3]
+        )
+
+    def estimate(self, carrier: str, origin: dict, destination: dict, package: dict) -> Dict[str, any]:
+        """
+        Price one shipment, returning a rate result shaped like
+        ``CarrierAdapter.rate`` with each quote flagged ``estimated``.
+        """
+        if carrier not in self.cards:
+            return {"carrier": carrier, "success": False, "error": f"No rate card for {carrier}", "error_type": "unsupported"}
+        prices = self.price_batch(carrier, [origin["zip_code"]], [destination["zip_code"]], [package])
+        quotes: List[dict] = [
+            {
+                "service_code": service_code,
+                "amount": round(float(amounts[0]), 2),
+                "currency": "USD",
+                "transit_days": None,
+                "estimated": True
+            }
+            for service_code, amounts in prices.items()
+            if not np.isnan(amounts[0])
+        ]
+        if not quotes:
+            return {"carrier": carrier, "success": False, "error": "Lane or weight not covered by the rate card", "error_type": "unsupported"}
+        return {"carrier": carrier, "success": True, "quotes": quotes}
+
+    def stats(self) -> Dict[str, List[str]]:
+        """Service codes loaded per carrier."""
+        return {carrier: sorted(card.prices) for carrier, card in self.cards.items()}
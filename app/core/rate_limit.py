@@ -0,0 +1,285 @@
+"""
+Per-client request rate limiting with token buckets.
+
+Each client has one bucket per rate class. A bucket holds up to the class's
+per-minute limit and refills continuously, so clients can burst up to the
+limit and then sustain it. Logins (bcrypt) and requests that call the
+carriers have their own smaller classes, so they cannot crowd out ordinary
+API use, or each other; registering and changing a password also hash
+with bcrypt and share the login class. Clients are identified by user when they send a
+valid bearer token and by IP otherwise.
+
+Buckets are kept in memory, split into shards by key so concurrent
+requests rarely wait on the same lock. Each worker process then enforces
+the limits on its own. Set ``RATE_LIMIT_REDIS_URL`` (with the optional
+``redis`` package installed) to share buckets across workers; if Redis is
+unreachable, requests are let through rather than failed.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from jose import JWTError, jwt
+from app.core.auth import ALGORITHM, SECRET_KEY
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Optional: without it buckets are per process
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class RateLimit(NamedTuple):
+    name: str
+    per_minute: int
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return self.per_minute / 60
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    # Seconds until the bucket is full again, and until the next request fits
+    reset_after: float
+    retry_after: float
+
+    @classmethod
+    def from_tokens(cls, allowed: bool, limit: RateLimit, tokens: float) -> "Decision":
+        return cls(
+            allowed=allowed,
+            limit=limit,
+            remaining=int(tokens),
+            reset_after=(limit.per_minute - tokens) / limit.rate,
+            retry_after=0.0 if allowed else (1 - tokens) / limit.rate
+        )
+
+LIMITS: Dict[str, RateLimit] = {
+    "default": RateLimit("default", settings.RATE_LIMIT_PER_MINUTE),
+    "auth": RateLimit("auth", settings.AUTH_RATE_LIMIT_PER_MINUTE),
+    "carriers": RateLimit("carriers", settings.CARRIER_RATE_LIMIT_PER_MINUTE),
+}
+
+# Routes that hash a password with bcrypt
+AUTH_PATHS = {"/auth/token", "/auth/register", "/auth/password"}
+# Routes outside /carriers/ that also call the carrier APIs
+CARRIER_PATHS = {"/shipments/quote", "/shipments/quote/bulk", "/user/carriers/test-tokens"}
+EXEMPT_PATHS = {"/metrics", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"}
+
+def rate_class(method: str, path: str) -> Optional[str]:
+    """The bucket class a request draws from, or None if it is not limited."""
+    if method == "OPTIONS" or path in EXEMPT_PATHS or path.startswith("/health"):
+        return None
+    if path in AUTH_PATHS:
+        return "auth"
+    if path.startswith("/carriers/") or path in CARRIER_PATHS:
+        return "carriers"
+    return "default"
+
+# Bearer token -> username, so each token's signature is checked once. Tokens
+# that fail the check are remembered separately, so a flood of made-up tokens
+# cannot evict the valid ones.
+_token_subjects = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL)
+_invalid_tokens = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL)
+
+def token_subject(token: str) -> Optional[str]:
+    """The username of a valid bearer token, or None."""
+    username = _token_subjects.get(token)
+    if username is not None or _invalid_tokens.get(token):
+        return username
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        claims = {}
+    username = claims.get("sub")
+    if not username:
+        _invalid_tokens.set(token, True)
+        return None
+    # Never identify a client by a token after it expires
+    ttl = _token_subjects.ttl
+    if isinstance(claims.get("exp"), (int, float)):
+        ttl = min(ttl, claims["exp"] - time.time())
+    if ttl > 0:
+        _token_subjects.set(token, username, ttl=ttl)
+    return username
+
+def client_id(scope) -> str:
+    """
+    ``user:<username>`` for a request with a valid bearer token, else
+    ``ip:<address>``. Invalid tokens count against the IP; the request
+    itself is rejected later by authentication.
+    """
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                username = token_subject(token)
+                if username:
+                    return f"user:{username}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+# ------------------------------------------
+# Bucket stores
+# ------------------------------------------
+
+class MemoryBucketStore:
+    """
+    Token buckets in this process, sharded by key. Each shard evicts its
+    least recently used buckets beyond its share of ``max_keys``; an evicted
+    bucket starts full again.
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100_000):
+        self._shards: List[Tuple[threading.Lock, "OrderedDict[str, list]"]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(max(1, shards))
+        ]
+        self.max_keys_per_shard = max(1, max_keys // len(self._shards))
+
+    async def take(self, key: str, limit: RateLimit) -> Decision:
+        key = f"{limit.name}:{key}"
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [float(limit.per_minute), now]
+                if len(buckets) > self.max_keys_per_shard:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+            tokens = min(limit.per_minute, bucket[0] + (now - bucket[1]) * limit.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            bucket[0], bucket[1] = tokens, now
+        return Decision.from_tokens(allowed, limit, tokens)
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for _, buckets in self._shards)
+
+# Refill and take one token atomically, on Redis's clock so workers agree.
+# Returns whether the request is allowed and the tokens left (as a string,
+# since Redis truncates Lua numbers to integers).
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+class RedisBucketStore:
+    """Token buckets shared by every worker through Redis."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: RateLimit) -> Decision:
+        allowed, tokens = await self._take(
+            keys=[f"{self.prefix}{limit.name}:{key}"], args=[limit.per_minute, limit.rate]
+        )
+        return Decision.from_tokens(bool(allowed), limit, float(tokens))
+
+    async def close(self):
+        await self.client.aclose()
+
+# Errors from a shared store that mean "unavailable" rather than a bug
+STORE_ERRORS = (OSError, asyncio.TimeoutError) + ((redis.RedisError,) if redis is not None else ())
+
+def create_bucket_store():
+    if settings.RATE_LIMIT_REDIS_URL:
+        if redis is not None:
+            return RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+        logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; rate limits are per worker")
+    return MemoryBucketStore(settings.RATE_LIMIT_SHARDS, settings.RATE_LIMIT_MAX_KEYS)
+
+bucket_store = create_bucket_store()
+
+async def close_bucket_store():
+    """Close the shared store's connections; called on application shutdown."""
+    if isinstance(bucket_store, RedisBucketStore):
+        await bucket_store.close()
+
+# ------------------------------------------
+# Middleware
+# ------------------------------------------
+
+def rate_limit_headers(decision: Decision) -> List[Tuple[bytes, bytes]]:
+    """``RateLimit-*`` headers (IETF draft), plus ``Retry-After`` when refused."""
+    limit = decision.limit
+    headers = [
+        (b"ratelimit-limit", str(limit.per_minute).encode()),
+        (b"ratelimit-remaining", str(decision.remaining).encode()),
+        (b"ratelimit-reset", str(int(decision.reset_after + 0.999)).encode()),
+        (b"ratelimit-policy", f'{limit.per_minute};w=60;name="{limit.name}"'.encode()),
+    ]
+    if not decision.allowed:
+        headers.append((b"retry-after", str(max(1, int(decision.retry_after + 0.999))).encode()))
+    return headers
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 once a client's bucket for the route is empty."""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or bucket_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = rate_class(scope["method"], scope["path"])
+        limit = LIMITS.get(name)
+        if limit is None or limit.per_minute <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            decision = await self.store.take(client_id(scope), limit)
+        except STORE_ERRORS as e:
+            # A shared store that is down must not take the API with it
+            logger.warning("Rate limit store unavailable, allowing request: %s", e)
+            await self.app(scope, receive, send)
+            return
+
+        headers = rate_limit_headers(decision)
+        if not decision.allowed:
+            body = b'{"detail":"Rate limit exceeded; retry later"}'
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
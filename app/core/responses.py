@@ -0,0 +1,132 @@
+"""
+Response rendering.
+
+Routes with a ``response_model`` return ORM objects; FastAPI validates them
+once and pydantic writes the JSON bytes directly. Responses built by hand
+(field projections, health) use ``FastJSONResponse``. Clients that send
+``Accept: application/msgpack`` get MessagePack instead of JSON when the
+optional ``msgpack`` package is installed.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Callable, Dict
+from uuid import UUID
+import orjson
+from fastapi import Request
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # Optional: without it every client gets JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+JSON_MEDIA_RANGES = ("application/json", "application/*", "*/*")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response serialized with orjson (datetimes become ISO 8601 strings)."""
+
+    def render(self, content) -> bytes:
+        # Kept so NegotiatedRoute can pack the same content as MessagePack
+        self.content = content
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def _msgpack_default(value):
+    """Encode the types orjson handles natively the same way for MessagePack."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__} to MessagePack")
+
+class MsgPackResponse(Response):
+    """MessagePack response; content must be JSON-compatible data."""
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default)
+
+def accepted_media_types(accept: str) -> Dict[str, float]:
+    """Media ranges of an Accept header with their quality values."""
+    accepted = {}
+    for item in accept.split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = max(quality, accepted.get(media_type.lower(), 0.0))
+    return accepted
+
+def wants_msgpack(request: Request) -> bool:
+    """
+    True if MessagePack is available and the client's Accept header names it
+    with a quality above zero and at least that of JSON. Wildcards alone
+    never select MessagePack.
+    """
+    if msgpack is None:
+        return False
+    accepted = accepted_media_types(request.headers.get("accept", ""))
+    msgpack_quality = max((accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    if msgpack_quality <= 0:
+        return False
+    # The most specific range that matches JSON decides its quality
+    json_quality = next((accepted[media_range] for media_range in JSON_MEDIA_RANGES if media_range in accepted), 0.0)
+    return msgpack_quality >= json_quality
+
+class NegotiatedRoute(APIRoute):
+    """
+    Route that answers with MessagePack for clients that ask for it. The
+    validated response content is packed directly, without rendering JSON
+    first. Streaming responses and errors are left as they are.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if msgpack is None or not isinstance(self.response_class, DefaultPlaceholder):
+            return handler
+        msgpack_handler = self._handler_for(MsgPackResponse)
+
+        async def negotiated_handler(request: Request) -> Response:
+            if not wants_msgpack(request):
+                response = await handler(request)
+            else:
+                response = await msgpack_handler(request)
+                if isinstance(response, FastJSONResponse):
+                    response = self._repack(response)
+            if response.media_type in ("application/json", MsgPackResponse.media_type):
+                response.headers.add_vary_header("Accept")
+            return response
+
+        return negotiated_handler
+
+    def _handler_for(self, response_class) -> Callable:
+        """The route's handler, rendering its content with ``response_class``."""
+        default = self.response_class
+        self.response_class = response_class
+        try:
+            return super().get_route_handler()
+        finally:
+            self.response_class = default
+
+    @staticmethod
+    def _repack(response: FastJSONResponse) -> Response:
+        """A hand-built JSON response of the route, as MessagePack."""
+        packed = MsgPackResponse(response.content, status_code=response.status_code, background=response.background)
+        for name, value in response.headers.items():
+            if name not in ("content-length", "content-type"):
+                packed.headers.append(name, value)
+        return packed
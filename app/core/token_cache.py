@@ -0,0 +1,295 @@
+"""
+In-process cache for carrier OAuth bearer tokens.
+
+Tokens are keyed by carrier, client_id and a fingerprint of the client secret,
+so a changed (or wrong) secret never reuses a token issued for another one.
+A background task refreshes tokens shortly before they expire, and only one
+caller at a time may fetch a token for a given key. At most ``max_entries``
+tokens are kept; the least recently used one is dropped beyond that.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+
+# Tokens this close to expiry are never handed out
+_EXPIRY_SKEW_SECONDS = 30
+
+CacheKey = Tuple[str, str, str]
+
+@dataclass
+class CachedToken:
+    """A carrier token together with the data needed to refresh it."""
+    carrier: str
+    client_id: str
+    fingerprint: str
+    access_token: str
+    token_type: str
+    scope: Optional[str]
+    expires_at: float  # Unix timestamp, so entries survive a restart
+    raw_response: dict = field(default_factory=dict)
+    issued_at: float = 0.0
+    last_used: float = 0.0
+    # Kept in memory only; never written to disk
+    client_secret: Optional[str] = field(default=None, repr=False)
+    account_num: Optional[str] = field(default=None, repr=False)
+
+    def remaining(self, now: Optional[float] = None) -> float:
+        return self.expires_at - (now or time.time())
+
+    def to_result(self) -> Dict[str, any]:
+        """Return the token in the same shape as ``generate_bearer_token``."""
+        return {
+            "carrier": self.carrier,
+            "success": True,
+            "access_token": self.access_token,
+            "token_type": self.token_type,
+            "expires_in": int(self.remaining()),
+            "scope": self.scope,
+            "raw_response": self.raw_response,
+            "cached": True
+        }
+
+def secret_fingerprint(client_secret: str) -> str:
+    """Keyed hash of a client secret, safe to keep in memory and on disk."""
+    return hmac.new(
+        settings.SECRET_KEY.encode(), client_secret.encode(), hashlib.sha256
+    ).hexdigest()[:32]
+
+class CarrierTokenCache:
+    """Expiry-aware cache of carrier bearer tokens with proactive refresh."""
+
+    def __init__(
+        self,
+        fetch: Callable[..., Awaitable[Dict[str, any]]],
+        refresh_margin: float = 120,
+        refresh_interval: float = 15,
+        default_ttl: float = 300,
+        path: Optional[str] = None,
+        max_entries: int = 1000
+    ):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.refresh_interval = refresh_interval
+        self.default_ttl = default_ttl
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[CacheKey, CachedToken]" = OrderedDict()
+        self._key_locks: Dict[CacheKey, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Set when the entries changed since they were last written to ``path``
+        self._dirty = False
+
+    def _key_lock(self, key: CacheKey) -> asyncio.Lock:
+        lock = self._key_locks.get(key)
+        if lock is None:
+            lock = self._key_locks[key] = asyncio.Lock()
+        return lock
+
+    def _usable(self, entry: Optional[CachedToken], now: float) -> bool:
+        return entry is not None and entry.remaining(now) > _EXPIRY_SKEW_SECONDS
+
+    async def get_token(
+        self,
+        carrier_code,
+        client_id: str,
+        client_secret: str,
+        account_num: str = None,
+        force_refresh: bool = False
+    ) -> Dict[str, any]:
+        """
+        Return a bearer token for the given credentials, fetching one if needed.
+
+        Concurrent callers for the same key wait for a single fetch instead of
+        each requesting their own token. Failed fetches are never cached.
+        With ``force_refresh`` a new token is always requested from the
+        carrier, e.g. to check that the credentials still work.
+        """
+        carrier = getattr(carrier_code, "value", carrier_code)
+        key = (carrier, client_id, secret_fingerprint(client_secret))
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if not force_refresh and self._usable(entry, now):
+            self._touch(key, entry, client_secret, account_num, now)
+            return entry.to_result()
+
+        lock = self._key_lock(key)
+        async with lock:
+            # Another caller may have fetched the token while we were waiting
+            entry = self._entries.get(key)
+            if not force_refresh and self._usable(entry, time.time()):
+                self._touch(key, entry, client_secret, account_num, time.time())
+                return entry.to_result()
+
+            try:
+                result = await self._fetch(carrier_code, client_id, client_secret, account_num)
+                if result.get("success") and result.get("access_token"):
+                    self._store(key, result, client_secret, account_num)
+            finally:
+                # Nothing cached for these credentials, so don't keep their lock
+                if key not in self._entries and self._key_locks.get(key) is lock:
+                    del self._key_locks[key]
+            return {**result, "cached": False}
+
+    def _touch(self, key: CacheKey, entry: CachedToken, client_secret: str, account_num: Optional[str], now: float):
+        entry.last_used = now
+        self._entries.move_to_end(key)
+        # Entries loaded from disk have no secret until a caller supplies it again
+        if entry.client_secret is None:
+            entry.client_secret = client_secret
+            entry.account_num = account_num
+
+    def _store(self, key: CacheKey, result: Dict[str, any], client_secret: str, account_num: Optional[str]):
+        try:
+            ttl = float(result.get("expires_in") or self.default_ttl)
+        except (TypeError, ValueError):
+            ttl = self.default_ttl
+        now = time.time()
+        self._entries[key] = CachedToken(
+            carrier=key[0],
+            client_id=key[1],
+            fingerprint=key[2],
+            access_token=result["access_token"],
+            token_type=result.get("token_type", "Bearer"),
+            scope=result.get("scope"),
+            expires_at=now + ttl,
+            raw_response=result.get("raw_response") or {},
+            issued_at=now,
+            last_used=now,
+            client_secret=client_secret,
+            account_num=account_num
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._key_locks.pop(evicted, None)
+        self._dirty = True
+
+    def invalidate(self, carrier_code, client_id: str):
+        """Drop every cached token for a carrier account."""
+        carrier = getattr(carrier_code, "value", carrier_code)
+        for key in [k for k in self._entries if k[0] == carrier and k[1] == client_id]:
+            del self._entries[key]
+            self._key_locks.pop(key, None)
+            self._dirty = True
+
+    async def refresh_due(self):
+        """
+        Refresh tokens that are close to expiry and drop expired ones.
+
+        Only tokens that were used since they were issued are refreshed, so
+        credentials nobody calls with any more simply age out.
+        """
+        now = time.time()
+        for key, entry in list(self._entries.items()):
+            remaining = entry.remaining(now)
+            if remaining <= 0:
+                self._entries.pop(key, None)
+                self._key_locks.pop(key, None)
+                self._dirty = True
+                continue
+            if remaining > self.refresh_margin or entry.client_secret is None:
+                continue
+            if entry.last_used <= entry.issued_at:
+                continue
+
+            lock = self._key_lock(key)
+            if lock.locked():
+                continue  # A request is already fetching this token
+            async with lock:
+                try:
+                    result = await self._fetch(entry.carrier, entry.client_id, entry.client_secret, entry.account_num)
+                except Exception:
+                    # Keep serving the current token; the next pass will retry
+                    continue
+                if result.get("success") and result.get("access_token"):
+                    self._store(key, result, entry.client_secret, entry.account_num)
+
+    async def flush(self):
+        """Write the cache to ``path`` if it changed, off the event loop."""
+        if self._dirty:
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh_due()
+            await self.flush()
+
+    def start(self):
+        """Start the background refresh task on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background refresh task and persist the cache."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.save()
+
+    def save(self):
+        """Write unexpired tokens to ``path`` (secrets are never persisted)."""
+        self._write(self._snapshot())
+
+    def _snapshot(self) -> list:
+        self._dirty = False
+        if not self.path:
+            return []
+        now = time.time()
+        entries = []
+        for entry in self._entries.values():
+            if entry.remaining(now) > _EXPIRY_SKEW_SECONDS:
+                data = asdict(entry)
+                data.pop("client_secret")
+                data.pop("account_num")
+                entries.append(data)
+        return entries
+
+    def _write(self, entries: list):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Persistence is best effort; the in-memory cache keeps working
+            pass
+
+    def load(self):
+        """Load tokens persisted by a previous process, skipping expired ones."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for data in entries:
+            try:
+                entry = CachedToken(**data)
+            except TypeError:
+                continue
+            if entry.remaining(now) > _EXPIRY_SKEW_SECONDS:
+                self._entries[(entry.carrier, entry.client_id, entry.fingerprint)] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries)}
@@ -1,121 +1,131 @@
 """
 Utility functions for carrier integrations and token generation.
 """
-import requests
-import json
-import base64
-from typing import Dict, Optional
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
 from app.core.enums import CarrierCode
+from app.core.token_cache import CarrierTokenCache
+from app.core.quote_cache import QuoteCache
+from app.core.rate_cards import RateCardEngine
+from app.carriers import get_adapter, carrier_circuits
 
-def generate_bearer_token(carrier_code: CarrierCode, client_id: str, client_secret: str, account_num: str = None) -> Dict[str, any]:
+async def generate_bearer_token(carrier_code: CarrierCode, client_id: str, client_secret: str, account_num: str = None) -> Dict[str, any]:
     """
     Generate bearer token for specified carrier.
     """
-    if carrier_code == CarrierCode.FEDEX:
-        return generate_fedex_token(client_id, client_secret)
-    elif carrier_code == CarrierCode.UPS:
-        return generate_ups_token(client_id, client_secret)
-    elif carrier_code == CarrierCode.USPS:
-        return generate_usps_token(client_id, client_secret)
-    else:
-        raise ValueError(f"Unsupported carrier: {carrier_code}")
+    adapter = get_adapter(carrier_code)
+    return await adapter.authenticate(client_id, client_secret, account_num)
 
-def generate_fedex_token(client_id: str, client_secret: str) -> Dict[str, any]:
-    """
-    Generate FedEx OAuth2 bearer token.
-    """
-    url = "https://apis-sandbox.fedex.com/oauth/token"
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    data = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
-    try:
-        response = requests.post(url, headers=headers, data=data, timeout=30)
-        response.raise_for_status()
-        token_data = response.json()
-        return {
-            "carrier": "FEDEX",
-            "success": True,
-            "access_token": token_data.get("access_token"),
-            "token_type": token_data.get("token_type", "Bearer"),
-            "expires_in": token_data.get("expires_in"),
-            "scope": token_data.get("scope"),
-            "raw_response": token_data
-        }
-    except requests.exceptions.RequestException as e:
-        return {"carrier": "FEDEX", "success": False, "error": str(e), "error_type": "request_error"}
-    except json.JSONDecodeError as e:
-        return {"carrier": "FEDEX", "success": False, "error": f"Invalid JSON response: {str(e)}", "error_type": "json_error"}
+# Bearer tokens are reused until shortly before they expire
+carrier_token_cache = CarrierTokenCache(
+    fetch=generate_bearer_token,
+    refresh_margin=settings.CARRIER_TOKEN_REFRESH_MARGIN,
+    refresh_interval=settings.CARRIER_TOKEN_REFRESH_INTERVAL,
+    default_ttl=settings.CARRIER_TOKEN_DEFAULT_TTL,
+    path=settings.CARRIER_TOKEN_CACHE_PATH,
+    max_entries=settings.CARRIER_TOKEN_CACHE_MAXSIZE
+)
 
-def generate_ups_token(client_id: str, client_secret: str) -> Dict[str, any]:
-    """
-    Generate UPS OAuth2 bearer token.
-    """
-    url = "https://wwwcie.ups.com/security/v1/oauth/token"
-    credentials = f"{client_id}:{client_secret}"
-    encoded_credentials = base64.b64encode(credentials.encode()).decode()
-    headers = {"Content-Type": "application/x-www-form-urlencoded", "Authorization": f"Basic {encoded_credentials}"}
-    data = {"grant_type": "client_credentials"}
-    try:
-        response = requests.post(url, headers=headers, data=data, timeout=30)
-        response.raise_for_status()
-        token_data = response.json()
-        return {
-            "carrier": "UPS",
-            "success": True,
-            "access_token": token_data.get("access_token"),
-            "token_type": token_data.get("token_type", "Bearer"),
-            "expires_in": token_data.get("expires_in"),
-            "scope": token_data.get("scope"),
-            "raw_response": token_data
-        }
-    except requests.exceptions.RequestException as e:
-        return {"carrier": "UPS", "success": False, "error": str(e), "error_type": "request_error"}
-    except json.JSONDecodeError as e:
-        return {"carrier": "UPS", "success": False, "error": f"Invalid JSON response: {str(e)}", "error_type": "json_error"}
+# Repeat quotes for the same lane are served without calling the carrier
+quote_cache = QuoteCache(
+    maxsize=settings.QUOTE_CACHE_MAXSIZE,
+    ttl=settings.QUOTE_CACHE_TTL,
+    stale_ttl=settings.QUOTE_CACHE_STALE_TTL,
+    carrier_ttls=settings.QUOTE_CACHE_CARRIER_TTLS
+)
+
+# Published rate cards, loaded from RATE_CARD_DIR on startup
+rate_cards = RateCardEngine()
 
-def generate_usps_token(client_id: str, client_secret: str) -> Dict[str, any]:
+async def get_bearer_token(
+    carrier_code: CarrierCode,
+    client_id: str,
+    client_secret: str,
+    account_num: str = None,
+    force_refresh: bool = False
+) -> Dict[str, any]:
     """
-    Generate USPS OAuth2 bearer token.
+    Get a bearer token for specified carrier, reusing a cached one while it is valid
+    unless ``force_refresh`` is set.
     """
-    url = "https://apis-tem.usps.com/oauth2/v3/token"
-    headers = {"Content-Type": "application/json"}
-    data = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        token_data = response.json()
-        return {
-            "carrier": "USPS",
-            "success": True,
-            "access_token": token_data.get("access_token"),
-            "token_type": token_data.get("token_type", "Bearer"),
-            "expires_in": token_data.get("expires_in"),
-            "scope": token_data.get("scope"),
-            "raw_response": token_data
-        }
-    except requests.exceptions.RequestException as e:
-        return {"carrier": "USPS", "success": False, "error": str(e), "error_type": "request_error"}
-    except json.JSONDecodeError as e:
-        return {"carrier": "USPS", "success": False, "error": f"Invalid JSON response: {str(e)}", "error_type": "json_error"}
+    return await carrier_token_cache.get_token(
+        carrier_code, client_id, client_secret, account_num, force_refresh=force_refresh
+    )
 
-def generate_tokens_for_carriers(carriers_data) -> Dict[str, any]:
+async def generate_tokens_concurrently(
+    jobs: List[Tuple[str, str, str, Optional[str]]],
+    timeout: Optional[float] = None,
+    force_refresh: bool = False
+) -> Dict[str, any]:
     """
-    Generate bearer tokens for multiple carriers.
+    Generate bearer tokens for several carriers in parallel.
+
+    Each job is a ``(carrier_code, client_id, client_secret, account_num)`` tuple.
+    The whole batch shares one deadline, so the total latency tracks the slowest
+    carrier rather than the sum of all of them. Carriers that have not answered
+    by the deadline are reported as failed with ``error_type`` ``timeout``.
+    The circuit breaker status of each carrier called is returned under
+    ``circuits``. With ``force_refresh`` cached tokens are ignored, so the
+    credentials are really checked against each carrier.
     """
-    results = {"tokens": [], "successful": 0, "failed": 0, "summary": {}}
-    for carrier in carriers_data.carriers:
-        token_result = generate_bearer_token(
-            carrier.code,
-            carrier.client_id, 
-            carrier.client_secret,
-            carrier.account_num
+    if timeout is None:
+        timeout = settings.CARRIER_FANOUT_TIMEOUT
+
+    results = {"tokens": [], "successful": 0, "failed": 0, "summary": {}, "circuits": {}}
+    tasks = []
+    for code, client_id, client_secret, account_num in jobs:
+        try:
+            carrier_code = CarrierCode(code)
+        except ValueError:
+            tasks.append((code, None))
+            continue
+        task = asyncio.ensure_future(
+            get_bearer_token(carrier_code, client_id, client_secret, account_num, force_refresh)
         )
+        tasks.append((carrier_code.value, task))
+
+    pending_tasks = [task for _, task in tasks if task is not None]
+    if pending_tasks:
+        await asyncio.wait(pending_tasks, timeout=timeout)
+
+    for code, task in tasks:
+        if task is None:
+            # Invalid carrier code
+            results["failed"] += 1
+            results["summary"][code] = {"success": False, "error": "Invalid carrier code"}
+            continue
+
+        if task.done():
+            token_result = task.result()
+        else:
+            task.cancel()
+            token_result = {
+                "carrier": code,
+                "success": False,
+                "error": f"No response within {timeout:g}s",
+                "error_type": "timeout"
+            }
+
         results["tokens"].append(token_result)
         if token_result["success"]:
             results["successful"] += 1
         else:
             results["failed"] += 1
-        results["summary"][carrier.code.value] = {
+        results["summary"][code] = {
             "success": token_result["success"],
             "has_token": bool(token_result.get("access_token"))
         }
+
+    circuits = carrier_circuits()
+    results["circuits"] = {code: circuits[code] for code in results["summary"] if code in circuits}
     return results
+
+async def generate_tokens_for_carriers(carriers_data) -> Dict[str, any]:
+    """
+    Generate bearer tokens for multiple carriers, bypassing the token cache.
+    """
+    return await generate_tokens_concurrently([
+        (carrier.code.value, carrier.client_id, carrier.client_secret, carrier.account_num)
+        for carrier in carriers_data.carriers
+    ], force_refresh=True)
@@ -1,20 +1,31 @@
-from fastapi import FastAPI, Depends, Request, HTTPException, status
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request, Response, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Optional
 from app.core.auth import (
-    get_current_active_user, authenticate_user, create_access_token,
-    create_user, get_password_hash, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES
+    get_current_active_user, authenticate_user, create_access_token, get_user,
+    create_user, get_password_hash_async, verify_password_async, ACCESS_TOKEN_EXPIRE_MINUTES,
+    AuthenticatedUser
+)
+from app.core.passwords import password_hasher
+from app.core.pagination import (
+    MAX_PAGE_SIZE, decode_cursor, parse_fields, projected_columns, paginate,
+    pagination_headers
 )
 from app.core.auth_models import (
     UserCreate, UserLogin, Token, UserProfile, OriginLocation, OriginLocationResponse,
     OriginLocationUpdate, UserCarrierCredentials, UserCarrierCredentialsResponse,
-    UserCarrierCredentialsUpdate, UpdatePassword
+    UserCarrierCredentialsUpdate, UpdatePassword, UserShipmentRequest, UserShipmentResponse,
+    LaneCarrierQuotes
 )
-from app.core.database import SessionLocal, get_db, create_tables
-from app.core.enums import CarrierCode
+from app.core.config import settings
+from app.core.database import get_db, get_read_db, dispose_engines, client_key, read_session_factory
+from app.core.enums import CarrierCode, ServiceLevel, ShipmentStatus
 from app.schemas import CarriersSubmission
 from app.models.user import User
 from app.models.shipment import Shipment
@@ -24,20 +35,51 @@ from app.services.user_service import (
     get_user_carrier_credential, create_carrier_credentials, update_carrier_credentials,
     delete_carrier_credentials, get_user_active_carriers, mask_secret
 )
-from app.core.utils import generate_tokens_for_carriers, generate_bearer_token
-from app.core.health import get_health_status
+from app.services.quote_service import create_shipment_quote, get_lane_quote_summary
+from app.services import export_service
+from app.services.bulk_quote_service import (
+    MEDIA_TYPES, UploadStreamingResponse, load_bulk_quote_context, read_upload, stream_bulk_quotes
+)
+from app.core.utils import (
+    generate_tokens_for_carriers, generate_tokens_concurrently, get_bearer_token,
+    carrier_token_cache, quote_cache, rate_cards
+)
+from app.core.http import close_carrier_clients
+from app.carriers import get_adapter
+from app.core.health import get_health_status, health_monitor
 from app.core.init import init_app
+from app.core import metrics, query_stats, rate_limit
+from app.core.responses import FastJSONResponse, NegotiatedRoute
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the application on startup and release resources on shutdown."""
+    init_app()
+    carrier_token_cache.load()
+    rate_cards.load(settings.RATE_CARD_DIR)
+    carrier_token_cache.start()
+    await health_monitor.start()
+    yield
+    await health_monitor.stop()
+    await carrier_token_cache.stop()
+    await quote_cache.stop()
+    await close_carrier_clients()
+    await rate_limit.close_bucket_store()
+    password_hasher.shutdown()
+    await dispose_engines()
 
 app = FastAPI(
     title="Shipments API", 
     description="API for managing shipments with user authentication",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
+# Lets machine clients ask for MessagePack with an Accept header
+app.router.route_class = NegotiatedRoute
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the application on startup."""
-    init_app()
+# Inside CORS (middleware added later wraps it), so 429 responses carry CORS headers
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(rate_limit.RateLimitMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -61,6 +103,13 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Per-request query counts; passes requests straight through unless enabled
+app.add_middleware(query_stats.QueryStatsMiddleware)
+
+# Outermost, so request timings include the other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Database dependency is now imported from core.database
 
 @app.get("/")
@@ -78,6 +127,9 @@ def read_root(request: Request):
         "endpoints": {
             "docs": f"{base_url}/docs",
             "health": f"{base_url}/health",
+            "liveness": f"{base_url}/health/live",
+            "readiness": f"{base_url}/health/ready",
+            "metrics": f"{base_url}/metrics",
             "auth": {
                 "register": f"{base_url}/auth/register",
                 "login": f"{base_url}/auth/token",
@@ -97,32 +149,44 @@ def read_root(request: Request):
     }
 
 @app.get("/health")
-def health_check():
-    return get_health_status()
+async def health_check():
+    """Full status as of the last background check; never queries the database."""
+    return FastJSONResponse(get_health_status())
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics for this worker process."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/health/live")
+async def liveness_probe():
+    """Liveness: the process is up and serving requests."""
+    return FastJSONResponse(health_monitor.liveness())
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """Readiness: 200 if the database answered the last background check, else 503."""
+    readiness = health_monitor.readiness()
+    return FastJSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
 
 # ==========================================
 # AUTHENTICATION ENDPOINTS
 # ==========================================
 
 @app.post("/auth/register", response_model=UserProfile)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
     try:
-        user = create_user(
+        user = await create_user(
             db=db,
             username=user_data.username,
             email=user_data.email,
             password=user_data.password,
             full_name=user_data.full_name
         )
-        return UserProfile(
-            id=user.id,
-            username=user.username,
-            email=user.email,
-            full_name=user.full_name,
-            is_active=user.is_active,
-            created_at=user.created_at.isoformat()
-        )
+        return user
     except HTTPException:
         raise
     except Exception as e:
@@ -132,9 +196,9 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
 @app.post("/auth/token", response_model=Token)
-def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """Login user and return access token."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -148,32 +212,27 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = D
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/auth/profile", response_model=UserProfile)
-def get_user_profile(current_user: User = Depends(get_current_active_user)):
+async def get_user_profile(current_user: AuthenticatedUser = Depends(get_current_active_user)):
     """Get current user profile."""
-    return UserProfile(
-        id=current_user.id,
-        username=current_user.username,
-        email=current_user.email,
-        full_name=current_user.full_name,
-        is_active=current_user.is_active,
-        created_at=current_user.created_at.isoformat()
-    )
+    return current_user
 
 @app.put("/auth/password")
-def update_password(
+async def update_password(
     password_data: UpdatePassword,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user password."""
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    user = await get_user(db, current_user.username)
+    if not user or not await verify_password_async(password_data.current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    # Committing the change also evicts the user from the authentication cache
+    user.hashed_password = await get_password_hash_async(password_data.new_password)
+    await db.commit()
     
     return {"message": "Password updated successfully"}
 
@@ -182,94 +241,73 @@ def update_password(
 # ==========================================
 
 @app.get("/user/locations", response_model=List[OriginLocationResponse])
-def get_user_locations(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+async def get_user_locations(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for all locations"),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all origin locations for the current user."""
-    locations = get_user_origin_locations(db, current_user.id)
-    return [
-        OriginLocationResponse(
-            id=loc.id,
-            user_id=loc.user_id,
-            name=loc.name,
-            company_name=loc.company_name,
-            address_line1=loc.address_line1,
-            address_line2=loc.address_line2,
-            city=loc.city,
-            state=loc.state,
-            zip_code=loc.zip_code,
-            country=loc.country,
-            phone=loc.phone,
-            is_default=loc.is_default,
-            created_at=loc.created_at.isoformat()
+    """
+    Get origin locations for the current user.
+
+    Pages are ordered by id; when more remain, the next page's cursor is in
+    the ``X-Next-Cursor`` and ``Link`` headers.
+    """
+    selected = parse_fields(fields, OriginLocationResponse.model_fields)
+    locations = await get_user_origin_locations(
+        db, current_user.id,
+        limit=limit + 1 if limit else None,
+        after_id=decode_cursor(after),
+        columns=projected_columns(selected, {}) if selected else None
+    )
+    locations, next_cursor = paginate(locations, limit)
+    headers = pagination_headers(request, next_cursor)
+    if selected:
+        return FastJSONResponse(
+            [{name: getattr(loc, name) for name in selected} for loc in locations],
+            headers=headers
         )
-        for loc in locations
-    ]
+    response.headers.update(headers)
+    return locations
 
 @app.post("/user/locations", response_model=OriginLocationResponse)
-def create_user_location(
+async def create_user_location(
     location: OriginLocation,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new origin location for the current user."""
-    db_location = create_origin_location(db, current_user.id, location)
-    return OriginLocationResponse(
-        id=db_location.id,
-        user_id=db_location.user_id,
-        name=db_location.name,
-        company_name=db_location.company_name,
-        address_line1=db_location.address_line1,
-        address_line2=db_location.address_line2,
-        city=db_location.city,
-        state=db_location.state,
-        zip_code=db_location.zip_code,
-        country=db_location.country,
-        phone=db_location.phone,
-        is_default=db_location.is_default,
-        created_at=db_location.created_at.isoformat()
-    )
+    db_location = await create_origin_location(db, current_user.id, location)
+    return db_location
 
 @app.put("/user/locations/{location_id}", response_model=OriginLocationResponse)
-def update_user_location(
+async def update_user_location(
     location_id: int,
     location_update: OriginLocationUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update an origin location for the current user."""
-    db_location = update_origin_location(db, current_user.id, location_id, location_update)
+    db_location = await update_origin_location(db, current_user.id, location_id, location_update)
     if not db_location:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Location not found"
         )
     
-    return OriginLocationResponse(
-        id=db_location.id,
-        user_id=db_location.user_id,
-        name=db_location.name,
-        company_name=db_location.company_name,
-        address_line1=db_location.address_line1,
-        address_line2=db_location.address_line2,
-        city=db_location.city,
-        state=db_location.state,
-        zip_code=db_location.zip_code,
-        country=db_location.country,
-        phone=db_location.phone,
-        is_default=db_location.is_default,
-        created_at=db_location.created_at.isoformat()
-    )
+    return db_location
 
 @app.delete("/user/locations/{location_id}")
-def delete_user_location(
+async def delete_user_location(
     location_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete an origin location for the current user."""
-    success = delete_origin_location(db, current_user.id, location_id)
+    success = await delete_origin_location(db, current_user.id, location_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -282,86 +320,83 @@ def delete_user_location(
 # USER CARRIER CREDENTIALS
 # ==========================================
 
+# Response fields that are computed from a differently named column
+CARRIER_FIELD_COLUMNS = {"client_secret_masked": "client_secret"}
+
 @app.get("/user/carriers", response_model=List[UserCarrierCredentialsResponse])
-def get_user_carriers(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+async def get_user_carriers(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for all carriers"),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all carrier credentials for the current user."""
-    credentials = get_user_carrier_credentials(db, current_user.id)
-    return [
-        UserCarrierCredentialsResponse(
-            id=cred.id,
-            user_id=cred.user_id,
-            carrier_code=cred.carrier_code,
-            client_id=cred.client_id,
-            client_secret_masked=mask_secret(cred.client_secret),
-            account_number=cred.account_number,
-            is_active=cred.is_active,
-            description=cred.description,
-            created_at=cred.created_at.isoformat(),
-            updated_at=cred.updated_at.isoformat()
+    """
+    Get carrier credentials for the current user.
+
+    Pages are ordered by id; when more remain, the next page's cursor is in
+    the ``X-Next-Cursor`` and ``Link`` headers.
+    """
+    selected = parse_fields(fields, UserCarrierCredentialsResponse.model_fields)
+    credentials = await get_user_carrier_credentials(
+        db, current_user.id,
+        limit=limit + 1 if limit else None,
+        after_id=decode_cursor(after),
+        columns=projected_columns(selected, CARRIER_FIELD_COLUMNS) if selected else None
+    )
+    credentials, next_cursor = paginate(credentials, limit)
+    headers = pagination_headers(request, next_cursor)
+    if selected:
+        return FastJSONResponse(
+            [
+                {
+                    name: mask_secret(cred.client_secret) if name == "client_secret_masked" else getattr(cred, name)
+                    for name in selected
+                }
+                for cred in credentials
+            ],
+            headers=headers
         )
-        for cred in credentials
-    ]
+    response.headers.update(headers)
+    return credentials
 
 @app.post("/user/carriers", response_model=UserCarrierCredentialsResponse)
-def create_user_carrier(
+async def create_user_carrier(
     credentials: UserCarrierCredentials,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create or update carrier credentials for the current user."""
-    db_credentials = create_carrier_credentials(db, current_user.id, credentials)
-    return UserCarrierCredentialsResponse(
-        id=db_credentials.id,
-        user_id=db_credentials.user_id,
-        carrier_code=db_credentials.carrier_code,
-        client_id=db_credentials.client_id,
-        client_secret_masked=mask_secret(db_credentials.client_secret),
-        account_number=db_credentials.account_number,
-        is_active=db_credentials.is_active,
-        description=db_credentials.description,
-        created_at=db_credentials.created_at.isoformat(),
-        updated_at=db_credentials.updated_at.isoformat()
-    )
+    db_credentials = await create_carrier_credentials(db, current_user.id, credentials)
+    return db_credentials
 
 @app.put("/user/carriers/{carrier_code}", response_model=UserCarrierCredentialsResponse)
-def update_user_carrier(
+async def update_user_carrier(
     carrier_code: str,
     credentials_update: UserCarrierCredentialsUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update carrier credentials for the current user."""
-    db_credentials = update_carrier_credentials(db, current_user.id, carrier_code, credentials_update)
+    db_credentials = await update_carrier_credentials(db, current_user.id, carrier_code, credentials_update)
     if not db_credentials:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Carrier credentials not found"
         )
     
-    return UserCarrierCredentialsResponse(
-        id=db_credentials.id,
-        user_id=db_credentials.user_id,
-        carrier_code=db_credentials.carrier_code,
-        client_id=db_credentials.client_id,
-        client_secret_masked=mask_secret(db_credentials.client_secret),
-        account_number=db_credentials.account_number,
-        is_active=db_credentials.is_active,
-        description=db_credentials.description,
-        created_at=db_credentials.created_at.isoformat(),
-        updated_at=db_credentials.updated_at.isoformat()
-    )
+    return db_credentials
 
 @app.delete("/user/carriers/{carrier_code}")
-def delete_user_carrier(
+async def delete_user_carrier(
     carrier_code: str,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete carrier credentials for the current user."""
-    success = delete_carrier_credentials(db, current_user.id, carrier_code)
+    success = await delete_carrier_credentials(db, current_user.id, carrier_code)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -371,12 +406,12 @@ def delete_user_carrier(
     return {"message": "Carrier credentials deleted successfully"}
 
 @app.post("/user/carriers/test-tokens")
-def test_user_carrier_tokens(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+async def test_user_carrier_tokens(
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Test bearer token generation for all user's carriers."""
-    credentials = get_user_carrier_credentials(db, current_user.id)
+    credentials = await get_user_carrier_credentials(db, current_user.id)
     active_credentials = [c for c in credentials if c.is_active]
     
     if not active_credentials:
@@ -385,56 +420,126 @@ def test_user_carrier_tokens(
             detail="No active carrier credentials found"
         )
     
-    results = {
-        "tokens": [],
-        "successful": 0,
-        "failed": 0,
-        "summary": {}
-    }
-    
-    for cred in active_credentials:
-        try:
-            carrier_code = CarrierCode(cred.carrier_code)
-            token_result = generate_bearer_token(
-                carrier_code,
-                cred.client_id,
-                cred.client_secret,
-                cred.account_number
-            )
-            
-            results["tokens"].append(token_result)
-            
-            if token_result["success"]:
-                results["successful"] += 1
-            else:
-                results["failed"] += 1
-            
-            results["summary"][cred.carrier_code] = {
-                "success": token_result["success"],
-                "has_token": bool(token_result.get("access_token"))
-            }
-        except ValueError:
-            # Invalid carrier code
-            results["failed"] += 1
-            results["summary"][cred.carrier_code] = {
-                "success": False,
-                "error": "Invalid carrier code"
-            }
+    results = await generate_tokens_concurrently([
+        (cred.carrier_code, cred.client_id, cred.client_secret, cred.account_number)
+        for cred in active_credentials
+    ], force_refresh=True)
     
     return {
         "message": f"Token generation completed: {results['successful']} successful, {results['failed']} failed",
         "results": results
     }
 
+# ==========================================
+# SHIPMENTS
+# ==========================================
+
+@app.post("/shipments/quote", response_model=UserShipmentResponse)
+async def quote_shipment(
+    shipment_request: UserShipmentRequest,
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Rate-shop a shipment across the current user's active carriers.
+
+    All carriers are queried in parallel under one deadline; quotes are
+    ranked by price, then transit time. Carriers that failed or did not
+    answer in time are listed in ``carrier_errors``.
+    """
+    result = await create_shipment_quote(db, current_user.id, shipment_request)
+    shipment = result.shipment
+    return {
+        "id": shipment.id,
+        "user_id": shipment.user_id,
+        "origin_location": result.origin_location,
+        "destination": shipment.destination_data,
+        "quotes": result.quotes,
+        "carrier_errors": result.carrier_errors,
+        "selected_carrier": shipment.selected_carrier,
+        "tracking_number": shipment.tracking_number,
+        "status": shipment.status,
+        "created_at": shipment.created_at
+    }
+
+@app.post("/shipments/quote/bulk")
+async def bulk_quote_shipments(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Result format; defaults to the upload's format"),
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Quote many shipments from one NDJSON or CSV upload.
+
+    Send ``Content-Type: application/x-ndjson`` with one quote request per
+    line, or ``text/csv`` with a header row of destination and package
+    columns. Results stream back, one per row, as each row finishes.
+    """
+    input_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    output_format = format or input_format
+    origins, default_origin_id, credentials = await load_bulk_quote_context(db, current_user.id)
+    upload_read = asyncio.Event()
+    return UploadStreamingResponse(
+        stream_bulk_quotes(
+            read_upload(request, upload_read), current_user.id, origins, default_origin_id, credentials,
+            input_format, output_format, session_info={"client_key": client_key(request)}
+        ),
+        upload_read=upload_read,
+        media_type=MEDIA_TYPES[output_format]
+    )
+
+@app.get("/shipments/export")
+async def export_shipments(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = Query(None, description="Only shipments created at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only shipments created before this time"),
+    status: Optional[List[ShipmentStatus]] = Query(None, description="Only shipments with these statuses"),
+    current_user: AuthenticatedUser = Depends(get_current_active_user)
+):
+    """
+    Stream the current user's shipment history as NDJSON or CSV.
+
+    NDJSON lines carry the full destination and quotes; CSV rows carry the
+    destination address and the best-ranked quote.
+    """
+    return StreamingResponse(
+        export_service.stream_shipments_export(
+            read_session_factory(request), current_user.id, format, start, end,
+            [s.value for s in status] if status else None
+        ),
+        media_type=export_service.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="shipments.{format}"'}
+    )
+
+@app.get("/shipments/lanes/quotes", response_model=List[LaneCarrierQuotes])
+async def get_lane_quotes(
+    origin_zip: str = Query(..., max_length=10),
+    destination_zip: str = Query(..., max_length=10),
+    start: Optional[datetime] = Query(None, description="Only quotes created at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only quotes created before this time"),
+    service_level: Optional[ServiceLevel] = Query(None),
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Compare carriers on one lane: the lowest and average price each quoted
+    the current user, cheapest carrier first.
+    """
+    return await get_lane_quote_summary(
+        db, current_user.id, origin_zip, destination_zip, start, end,
+        service_level.value if service_level else None
+    )
 
 @app.post("/carriers/tokens")
-def generate_carrier_tokens(carriers_data: CarriersSubmission):
+async def generate_carrier_tokens(carriers_data: CarriersSubmission):
     """
     Generate bearer tokens for configured carriers.
     This will test the authentication credentials by requesting tokens from each carrier's API.
     """
     try:
-        token_results = generate_tokens_for_carriers(carriers_data)
+        token_results = await generate_tokens_for_carriers(carriers_data)
         
         return {
             "message": f"Token generation completed: {token_results['successful']} successful, {token_results['failed']} failed",
@@ -445,13 +550,13 @@ def generate_carrier_tokens(carriers_data: CarriersSubmission):
         raise HTTPException(status_code=400, detail=f"Token generation failed: {str(e)}")
 
 @app.post("/carriers/test-token")
-def test_single_carrier_token(carrier_code: CarrierCode, client_id: str, client_secret: str, account_num: str = None):
+async def test_single_carrier_token(carrier_code: CarrierCode, client_id: str, client_secret: str, account_num: str = None):
     """
     Test bearer token generation for a single carrier.
     Useful for testing individual carrier credentials.
     """
     try:
-        token_result = generate_bearer_token(carrier_code, client_id, client_secret, account_num)
+        token_result = await get_bearer_token(carrier_code, client_id, client_secret, account_num, force_refresh=True)
         
         if token_result["success"]:
             # Don't expose the full token in response for security
@@ -461,6 +566,8 @@ def test_single_carrier_token(carrier_code: CarrierCode, client_id: str, client_
                 "token_type": token_result.get("token_type"),
                 "expires_in": token_result.get("expires_in"),
                 "scope": token_result.get("scope"),
+                "cached": token_result.get("cached", False),
+                "circuit": get_adapter(carrier_code).status(),
                 "token_preview": token_result.get("access_token", "")[:20] + "..." if token_result.get("access_token") else None
             }
         else:
@@ -468,7 +575,8 @@ def test_single_carrier_token(carrier_code: CarrierCode, client_id: str, client_
                 "carrier": token_result["carrier"],
                 "success": False,
                 "error": token_result.get("error"),
-                "error_type": token_result.get("error_type")
+                "error_type": token_result.get("error_type"),
+                "circuit": get_adapter(carrier_code).status()
             }
             
         return {
@@ -2,12 +2,13 @@
 Models package - SQLAlchemy ORM models.
 """
 from app.models.user import User, OriginLocation, CarrierCredentials
-from app.models.shipment import UserShipment, Shipment
+from app.models.shipment import UserShipment, ShipmentQuote, Shipment
 
 __all__ = [
     "User", 
     "OriginLocation", 
     "CarrierCredentials", 
     "UserShipment", 
+    "ShipmentQuote",
     "Shipment"
 ]
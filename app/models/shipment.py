@@ -2,22 +2,27 @@
 Shipment-related SQLAlchemy models.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Numeric, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from app.core.enums import ShipmentStatus
+from app.models.types import JSONDocument
 
 class UserShipment(Base):
     """
     Represents a shipment associated with a user, including origin, destination, quotes, and status.
     """
     __tablename__ = "user_shipments"
+    __table_args__ = (
+        Index("ix_user_shipments_user_id_id", "user_id", "id"),
+        Index("ix_user_shipments_user_id_created_at", "user_id", "created_at"),
+    )
 
     id: int = Column(Integer, primary_key=True, index=True)
     user_id: int = Column(Integer, ForeignKey("users.id"), nullable=False)
     origin_location_id: int = Column(Integer, ForeignKey("origin_locations.id"), nullable=False)
-    destination_data: str = Column(Text, nullable=False)  # JSON string of destination info
-    quotes_data: str | None = Column(Text, nullable=True)  # JSON string of quotes
+    destination_data: dict = Column(JSONDocument, nullable=False)  # Destination address
+    quotes_data: list | None = Column(JSONDocument, nullable=True)  # Ranked quotes as returned to the client
     selected_carrier: str | None = Column(String(10), nullable=True)
     tracking_number: str | None = Column(String(100), nullable=True)
     status: str = Column(String(50), default=ShipmentStatus.QUOTED.value)  # Use enum for status
@@ -27,6 +32,36 @@ class UserShipment(Base):
     # Relationships
     user = relationship("User", back_populates="shipments")
     origin_location = relationship("OriginLocation", back_populates="shipments")
+    quotes = relationship("ShipmentQuote", back_populates="shipment", cascade="all, delete-orphan")
+
+class ShipmentQuote(Base):
+    """
+    One carrier quote of a ``UserShipment``, normalized so quotes can be
+    filtered and aggregated in SQL. The lane's ZIP codes and the user are
+    copied from the shipment so lane queries need no join.
+    """
+    __tablename__ = "shipment_quotes"
+    __table_args__ = (
+        Index("ix_shipment_quotes_user_id_lane_created_at", "user_id", "origin_zip", "destination_zip", "created_at"),
+        Index("ix_shipment_quotes_user_id_carrier_created_at", "user_id", "carrier", "created_at"),
+    )
+
+    id: int = Column(Integer, primary_key=True)
+    shipment_id: int = Column(Integer, ForeignKey("user_shipments.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id: int = Column(Integer, ForeignKey("users.id"), nullable=False)
+    origin_zip: str = Column(String(20), nullable=False)
+    destination_zip: str = Column(String(20), nullable=False)
+    carrier: str = Column(String(10), nullable=False)
+    service_code: str = Column(String(50), nullable=False)
+    service_level: str | None = Column(String(20), nullable=True)
+    amount: float = Column(Numeric(10, 2, asdecimal=False), nullable=False)
+    currency: str = Column(String(3), nullable=False)
+    transit_days: int | None = Column(Integer, nullable=True)
+    rank: int = Column(Integer, nullable=False)
+    estimated: bool = Column(Boolean, default=False)
+    created_at: datetime = Column(DateTime, default=datetime.utcnow)
+
+    shipment = relationship("UserShipment", back_populates="quotes")
 
 class Shipment(Base):
     """
@@ -0,0 +1,34 @@
+"""
+Custom column types.
+"""
+import json
+from sqlalchemy import Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+
+class JSONDocument(TypeDecorator):
+    """
+    A JSON value stored natively where the database supports it.
+
+    PostgreSQL gets ``JSONB``, which can be indexed and queried with its JSON
+    operators. Elsewhere the value is kept as JSON text without whitespace,
+    which SQLite's JSON functions still understand; rows written as
+    ``json.dumps`` strings by earlier versions read back unchanged.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json.dumps(value, separators=(",", ":"))
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json.loads(value)
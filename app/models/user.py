@@ -2,7 +2,7 @@
 User-related SQLAlchemy models.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -23,6 +23,10 @@ class User(Base):
 
 class OriginLocation(Base):
     __tablename__ = "origin_locations"
+    __table_args__ = (
+        Index("ix_origin_locations_user_id_id", "user_id", "id"),
+        Index("ix_origin_locations_user_id_is_default", "user_id", "is_default"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String(100), nullable=False)
@@ -43,6 +47,11 @@ class OriginLocation(Base):
 
 class CarrierCredentials(Base):
     __tablename__ = "carrier_credentials"
+    __table_args__ = (
+        # A unique index rather than a constraint so it can be added to existing tables
+        Index("uq_carrier_credentials_user_id_carrier_code", "user_id", "carrier_code", unique=True),
+        Index("ix_carrier_credentials_user_id_is_active", "user_id", "is_active"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     carrier_code = Column(String(10), nullable=False)  # FEDEX, UPS, USPS
@@ -49,9 +49,16 @@ class ShipmentRequest(BaseModel):
     address_line2: Optional[str] = Field(None, alias="add2")
     city: str
     state: str
-    zip_code: str = Field(..., alias="zip")
+    zip_code: str = Field(..., alias="zip", max_length=20)
     country: str = "US"
     phone: str
 
     class Config:
         populate_by_name = True  # Updated for Pydantic v2
+
+class PackageDetails(BaseModel):
+    """Weight and dimensions of the package being quoted."""
+    weight_lb: float = Field(..., gt=0, le=150, description="Package weight in pounds")
+    length_in: float = Field(..., gt=0, le=108, description="Length in inches")
+    width_in: float = Field(..., gt=0, le=108, description="Width in inches")
+    height_in: float = Field(..., gt=0, le=108, description="Height in inches")
@@ -0,0 +1,357 @@
+"""
+Bulk rate shopping over streamed NDJSON or CSV uploads.
+
+Rows are read from the request body as it arrives, validated in batches
+and quoted with bounded concurrency; each result is streamed back as soon
+as its row finishes, so memory use does not grow with the size of the
+upload. Results may therefore come back out of order; every result carries
+the 1-based ``row`` number and the row's ``reference``, if it had one.
+"""
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth_models import UserShipmentRequest
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.schemas import PackageDetails
+from app.services.quote_service import (
+    NO_DEFAULT_ORIGIN, address_data, carrier_jobs, price_shipment, quoted_shipment
+)
+from app.services.user_service import get_user_origin_locations, get_user_active_carrier_credentials
+
+logger = logging.getLogger(__name__)
+
+# Longest line accepted in an upload
+MAX_LINE_CHARS = 64 * 1024
+
+PACKAGE_FIELDS = set(PackageDetails.model_fields)
+REQUEST_FIELDS = {"origin_location_id", "service_type", "estimate_only"}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+CSV_COLUMNS = [
+    "row", "reference", "success", "shipment_id", "carrier", "service_code", "service_name",
+    "amount", "currency", "transit_days", "estimated", "quote_count", "error"
+]
+
+class BulkInputError(ValueError):
+    """The upload itself cannot be read (as opposed to one bad row)."""
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for handlers that keep reading the request body while
+    the response streams.
+
+    Depending on the server's ASGI version, the stock class watches for
+    client disconnects by reading ``receive()`` itself, which would swallow
+    the rest of the upload. Here the handler's own body reads surface a
+    disconnect while the upload is arriving; once ``upload_read`` is set the
+    response listens for one itself, and stops the stream (closing the body
+    iterator, which cancels its work) if the client goes away.
+    """
+
+    def __init__(self, content, upload_read: Optional[asyncio.Event] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.upload_read = upload_read
+
+    async def _wait_for_disconnect(self, receive):
+        if self.upload_read is None:
+            await asyncio.Event().wait()  # Never: the body is read elsewhere
+        await self.upload_read.wait()
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def __call__(self, scope, receive, send):
+        streaming = asyncio.ensure_future(self.stream_response(send))
+        watcher = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({streaming, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            streaming.cancel()
+            await asyncio.gather(streaming, watcher, return_exceptions=True)
+            await self.body_iterator.aclose()
+        if streaming.cancelled():
+            return  # The client disconnected
+        try:
+            streaming.result()
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+async def read_upload(request: Request, upload_read: asyncio.Event) -> AsyncIterator[bytes]:
+    """The request body as it arrives; sets ``upload_read`` once it has all been read."""
+    async for chunk in request.stream():
+        yield chunk
+    upload_read.set()
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a UTF-8 byte stream and yield it line by line."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        if len(buffer) > MAX_LINE_CHARS:
+            raise BulkInputError(f"Line longer than {MAX_LINE_CHARS} characters")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[object]:
+    """One JSON value per non-blank line; unparsable lines yield the exception."""
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+async def iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, str]]:
+    """
+    Rows of a CSV with a header line, as dicts. Quoted fields may span lines.
+    """
+    header = None
+    pending = ""
+    async for line in lines:
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            if len(pending) > MAX_LINE_CHARS:
+                raise BulkInputError("Unterminated quoted CSV field")
+            continue  # Inside a quoted field that continues on the next line
+        record = next(csv.reader([pending]))
+        pending = ""
+        if header is None:
+            header = [name.strip() for name in record]
+            continue
+        if any(value.strip() for value in record):
+            yield dict(zip(header, record))
+
+def csv_row_to_request(record: Dict[str, str]) -> dict:
+    """
+    Nest a flat CSV row into the shape of ``UserShipmentRequest``.
+
+    Package columns (``weight_lb`` ...) go under ``package``, request options
+    stay at the top level, ``carrier_preference`` is ``|``-separated and
+    every other column is part of the destination. ``service_type`` ``ALL``
+    quotes every service.
+    """
+    data = {"destination": {}, "package": {}}
+    for key, value in record.items():
+        value = value.strip() if value else value
+        if not value or not key:
+            continue
+        if key in PACKAGE_FIELDS:
+            data["package"][key] = value
+        elif key == "carrier_preference":
+            data[key] = [code.strip() for code in value.split("|") if code.strip()]
+        elif key == "service_type" and value.upper() == "ALL":
+            data[key] = None
+        elif key in REQUEST_FIELDS or key == "reference":
+            data[key] = value
+        else:
+            data["destination"][key] = value
+    return data
+
+def error_result(row: int, reference: Optional[str], status_code: int, error) -> dict:
+    return {"row": row, "reference": reference, "success": False, "status_code": status_code, "error": error}
+
+def format_ndjson(result: dict) -> str:
+    return json.dumps(result, separators=(",", ":")) + "\n"
+
+def format_csv(result: dict) -> str:
+    best = result["quotes"][0] if result.get("quotes") else {}
+    error = result.get("error")
+    values = {
+        "row": result["row"],
+        "reference": result.get("reference"),
+        "success": result["success"],
+        "shipment_id": result.get("shipment_id"),
+        "quote_count": len(result.get("quotes", [])),
+        "error": error if error is None or isinstance(error, str) else json.dumps(error),
+        **{key: best.get(key) for key in ("carrier", "service_code", "service_name", "amount", "currency", "transit_days", "estimated")}
+    }
+    out = io.StringIO()
+    csv.writer(out).writerow(["" if values[column] is None else values[column] for column in CSV_COLUMNS])
+    return out.getvalue()
+
+def csv_header() -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(CSV_COLUMNS)
+    return out.getvalue()
+
+async def load_bulk_quote_context(db: AsyncSession, user_id: int) -> Tuple[Dict[int, object], Optional[int], list]:
+    """
+    Load a user's origin locations and active carrier credentials once for a
+    whole upload, detached from ``db`` so its connection can be released.
+    Returns the locations by id, the default location's id and the
+    credentials; 400 if the user has no active carrier.
+    """
+    locations = await get_user_origin_locations(db, user_id)
+    credentials = await get_user_active_carrier_credentials(db, user_id)
+    carrier_jobs(credentials)
+    db.expunge_all()
+    await db.rollback()
+    default_origin_id = next((location.id for location in locations if location.is_default), None)
+    return {location.id: location for location in locations}, default_origin_id, credentials
+
+async def stream_bulk_quotes(
+    chunks: AsyncIterator[bytes],
+    user_id: int,
+    origins: Dict[int, object],
+    default_origin_id: Optional[int],
+    credentials: list,
+    input_format: str,
+    output_format: str,
+    session_info: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """
+    Quote every row of an upload and yield one formatted result per row.
+
+    ``origins`` maps the user's origin location ids to detached
+    ``OriginLocation`` objects and ``credentials`` holds their active
+    carrier credentials, both loaded before the response starts. At most
+    ``BULK_QUOTE_CONCURRENCY`` rows are quoted at once; reading the upload
+    pauses until a slot frees up. Quoted shipments are saved in batches of
+    up to ``BULK_QUOTE_BATCH_SIZE`` before their results are sent.
+    """
+    batch_size = settings.BULK_QUOTE_BATCH_SIZE
+    slots = asyncio.Semaphore(settings.BULK_QUOTE_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue(maxsize=2 * batch_size)
+    tasks = set()
+
+    async def quote_row(row: int, reference: Optional[str], shipment_request: UserShipmentRequest):
+        try:
+            origin_id = shipment_request.origin_location_id or default_origin_id
+            origin = origins.get(origin_id)
+            if origin is None:
+                raise HTTPException(
+                    status_code=404 if shipment_request.origin_location_id else 400,
+                    detail="Origin location not found" if shipment_request.origin_location_id else NO_DEFAULT_ORIGIN
+                )
+            jobs = carrier_jobs(credentials, shipment_request.carrier_preference)
+            quotes, errors = await price_shipment(jobs, address_data(origin), shipment_request)
+            result = {
+                "row": row, "reference": reference, "success": True,
+                "shipment": quoted_shipment(user_id, origin.id, origin.zip_code, shipment_request, quotes),
+                "quotes": quotes, "carrier_errors": errors
+            }
+        except HTTPException as e:
+            result = error_result(row, reference, e.status_code, e.detail)
+        except Exception:
+            logger.exception("Bulk quote failed for row %d", row)
+            result = error_result(row, reference, 500, "Quote failed")
+        try:
+            await results.put(result)
+        finally:
+            # Released only once the result is queued, so finished rows
+            # waiting to be sent also count against the concurrency limit
+            slots.release()
+
+    async def submit(batch: List[tuple]):
+        """Validate a batch of parsed rows and start quoting the valid ones."""
+        for row, data in batch:
+            reference = data.pop("reference", None) if isinstance(data, dict) else None
+            if isinstance(data, Exception):
+                await results.put(error_result(row, None, 400, f"Invalid JSON: {data}"))
+                continue
+            try:
+                shipment_request = UserShipmentRequest.model_validate(data)
+            except ValidationError as e:
+                await results.put(error_result(row, reference, 422, json.loads(e.json(include_url=False))))
+                continue
+            await slots.acquire()
+            task = asyncio.ensure_future(quote_row(row, reference, shipment_request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def produce():
+        """
+        Read the upload and start quoting its rows; finishes once every
+        started row has queued its result. If reading fails (the client
+        disconnected, say), in-flight rows are cancelled and the error is
+        left on the task for the consumer.
+        """
+        batch, row = [], 0
+        try:
+            lines = iter_lines(chunks)
+            if input_format == "csv":
+                rows = (csv_row_to_request(record) async for record in iter_csv_rows(lines))
+            else:
+                rows = iter_ndjson_rows(lines)
+            async for data in rows:
+                row += 1
+                batch.append((row, data))
+                if len(batch) >= batch_size:
+                    await submit(batch)
+                    batch = []
+            await submit(batch)
+        except (BulkInputError, UnicodeDecodeError) as e:
+            # Rows read before the unreadable part are still quoted
+            await submit(batch)
+            await results.put(error_result(0, None, 400, f"Unreadable upload: {e}"))
+        except BaseException:
+            for task in list(tasks):
+                task.cancel()
+            raise
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def next_batch() -> list:
+        """
+        Whatever results are ready, up to one batch, waiting for at least
+        one; empty once the producer has finished and everything is sent.
+        """
+        batch = []
+        if results.empty():
+            if producer.done():
+                return batch
+            getter = asyncio.ensure_future(results.get())
+            await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                batch.append(getter.result())
+            else:
+                getter.cancel()
+        while len(batch) < batch_size and not results.empty():
+            batch.append(results.get_nowait())
+        return batch
+
+    format_result = format_csv if output_format == "csv" else format_ndjson
+    producer = asyncio.ensure_future(produce())
+    try:
+        if output_format == "csv":
+            yield csv_header()
+        async with AsyncSessionLocal() as db:
+            db.sync_session.info.update(session_info or {})
+            while batch := await next_batch():
+                # Save everything that is ready in one commit
+                shipments = [result.pop("shipment") for result in batch if "shipment" in result]
+                if shipments:
+                    db.add_all(shipments)
+                    await db.commit()
+                    for result, shipment in zip((r for r in batch if r["success"]), shipments):
+                        result["shipment_id"] = shipment.id
+                yield "".join(format_result(result) for result in batch)
+        error = producer.exception()
+        if isinstance(error, ClientDisconnect):
+            return
+        if error is not None:
+            logger.error("Reading bulk quote upload failed", exc_info=error)
+            yield format_result(error_result(0, None, 500, "Upload failed; rows after the last result were not quoted"))
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
@@ -0,0 +1,116 @@
+"""
+Streaming export of a user's shipment history.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from sqlalchemy import Text, cast, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.core.config import settings
+from app.models import UserShipment
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Plain columns only: rows stay out of the ORM identity map, so memory does
+# not grow with the number of shipments exported
+EXPORT_COLUMNS = (
+    UserShipment.id,
+    UserShipment.status,
+    UserShipment.origin_location_id,
+    UserShipment.selected_carrier,
+    UserShipment.tracking_number,
+    UserShipment.created_at,
+    UserShipment.updated_at,
+    # Read back as JSON text (JSONB on PostgreSQL), so NDJSON can splice it in
+    cast(UserShipment.destination_data, Text).label("destination_data"),
+    cast(UserShipment.quotes_data, Text).label("quotes_data"),
+)
+
+CSV_COLUMNS = [
+    "id", "status", "origin_location_id", "selected_carrier", "tracking_number",
+    "created_at", "updated_at", "destination_name", "destination_city",
+    "destination_state", "destination_zip_code", "destination_country",
+    "quote_count", "best_carrier", "best_service_code", "best_amount", "best_currency"
+]
+
+def export_query(user_id: int, start: Optional[datetime], end: Optional[datetime], statuses: Optional[List[str]]):
+    """Shipments of ``user_id`` created in ``[start, end)`` with one of ``statuses``, by id."""
+    query = select(*EXPORT_COLUMNS).where(UserShipment.user_id == user_id)
+    if start is not None:
+        query = query.where(UserShipment.created_at >= start)
+    if end is not None:
+        query = query.where(UserShipment.created_at < end)
+    if statuses:
+        query = query.where(UserShipment.status.in_(statuses))
+    return query.order_by(UserShipment.id)
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def format_ndjson(row) -> str:
+    """
+    One JSON line per shipment. The stored destination and quotes JSON is
+    spliced in as-is instead of being parsed and serialized again.
+    """
+    head = json.dumps({
+        "id": row.id,
+        "status": row.status,
+        "origin_location_id": row.origin_location_id,
+        "selected_carrier": row.selected_carrier,
+        "tracking_number": row.tracking_number,
+        "created_at": _isoformat(row.created_at),
+        "updated_at": _isoformat(row.updated_at)
+    }, separators=(",", ":"))
+    return f'{head[:-1]},"destination":{row.destination_data or "null"},"quotes":{row.quotes_data or "[]"}}}\n'
+
+def csv_values(row) -> list:
+    """One CSV record per shipment: the destination's address and the best-ranked quote."""
+    destination = json.loads(row.destination_data) if row.destination_data else {}
+    quotes = json.loads(row.quotes_data) if row.quotes_data else []
+    best = quotes[0] if quotes else {}
+    return [
+        row.id, row.status, row.origin_location_id, row.selected_carrier, row.tracking_number,
+        _isoformat(row.created_at), _isoformat(row.updated_at),
+        destination.get("name"), destination.get("city"), destination.get("state"),
+        destination.get("zip_code"), destination.get("country"),
+        len(quotes), best.get("carrier"), best.get("service_code"), best.get("amount"), best.get("currency")
+    ]
+
+async def stream_shipments_export(
+    session_factory: async_sessionmaker,
+    user_id: int,
+    output_format: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    statuses: Optional[List[str]] = None
+) -> AsyncIterator[str]:
+    """
+    Yield a user's shipments as NDJSON or CSV, ``EXPORT_BATCH_SIZE`` rows per chunk.
+
+    Rows are read through a server-side cursor, so only one batch is held in
+    memory however many shipments match. The session is opened here rather
+    than taken from a request dependency, because it must stay open for as
+    long as the response is streaming.
+    """
+    batch_size = settings.EXPORT_BATCH_SIZE
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if output_format == "csv":
+        writer.writerow(CSV_COLUMNS)
+        yield out.getvalue()
+
+    query = export_query(user_id, start, end, statuses).execution_options(yield_per=batch_size)
+    async with session_factory() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            if output_format == "csv":
+                out.seek(0)
+                out.truncate()
+                writer.writerows(
+                    ["" if value is None else value for value in csv_values(row)] for row in rows
+                )
+                yield out.getvalue()
+            else:
+                yield "".join(format_ndjson(row) for row in rows)
@@ -0,0 +1,340 @@
+"""
+Multi-carrier rate shopping.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.carriers import get_adapter
+from app.core.auth_models import UserShipmentRequest
+from app.core.config import settings
+from app.core.enums import CarrierCode, ShipmentStatus
+from app.core.token_cache import secret_fingerprint
+from app.core.utils import carrier_token_cache, quote_cache, rate_cards
+from app.models import OriginLocation, ShipmentQuote, UserShipment
+from app.services.user_service import (
+    get_user_origin_location, get_user_default_origin_location, get_user_active_carrier_credentials
+)
+
+NO_DEFAULT_ORIGIN = "No default origin location; add a location or pass origin_location_id"
+
+# Address fields sent to the carriers
+ADDRESS_FIELDS = (
+    "name", "company_name", "address_line1", "address_line2",
+    "city", "state", "zip_code", "country", "phone"
+)
+
+@dataclass
+class QuotedShipment:
+    """A persisted quote request and the carriers that could not be quoted."""
+    shipment: UserShipment
+    origin_location: OriginLocation
+    quotes: List[dict]
+    carrier_errors: List[dict]
+
+async def quote_carrier(
+    carrier_code: CarrierCode,
+    client_id: str,
+    client_secret: str,
+    account_num: Optional[str],
+    origin: dict,
+    destination: dict,
+    package: dict
+) -> Dict[str, any]:
+    """Get a bearer token for one carrier (cached) and request its rates."""
+    token = await carrier_token_cache.get_token(carrier_code, client_id, client_secret, account_num)
+    if not token["success"]:
+        return {
+            "carrier": carrier_code.value,
+            "success": False,
+            "error": token.get("error"),
+            "error_type": token.get("error_type")
+        }
+    result = await get_adapter(carrier_code).rate(token["access_token"], account_num, origin, destination, package)
+    if not result["success"] and result.get("status_code") in (401, 403):
+        # The carrier rejected the token (e.g. revoked early); fetch a new one next time
+        carrier_token_cache.invalidate(carrier_code, client_id)
+    return result
+
+def lane_key(
+    carrier_code: CarrierCode,
+    client_id: str,
+    client_secret: str,
+    account_num: Optional[str],
+    origin: dict,
+    destination: dict,
+    package: dict
+) -> tuple:
+    """
+    Quote cache key: the carrier account plus the lane (origin and
+    destination postal codes and the package profile).
+
+    Quotes are cached before ``service_type`` filtering, so one entry serves
+    every service type. The secret's fingerprint is part of the key so that
+    negotiated rates are only served to callers holding the same credentials.
+    """
+    return (
+        carrier_code.value, client_id, secret_fingerprint(client_secret), account_num,
+        origin["country"], origin["zip_code"].strip().upper(),
+        destination["country"], destination["zip_code"].strip().upper(),
+        tuple(sorted(package.items()))
+    )
+
+def estimate_carrier(carrier_code: CarrierCode, origin: dict, destination: dict, package: dict) -> Dict[str, any]:
+    """Price a shipment from the carrier's published rate card."""
+    result = rate_cards.estimate(carrier_code.value, origin, destination, package)
+    if result["success"]:
+        get_adapter(carrier_code).label_quotes(result["quotes"])
+    return result
+
+async def quote_carriers(
+    jobs: List[Tuple[CarrierCode, str, str, Optional[str]]],
+    origin: dict,
+    destination: dict,
+    package: dict,
+    timeout: Optional[float] = None,
+    estimate_only: bool = False
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Request rates from several carriers in parallel.
+
+    Each job is a ``(carrier_code, client_id, client_secret, account_num)``
+    tuple. Carriers with cached quotes for the lane are answered from
+    ``quote_cache``. All carriers share one deadline; those that have not
+    answered by then are reported with ``error_type`` ``timeout``. Carriers
+    that fail are priced from their rate card when one is loaded; such quotes
+    are flagged ``estimated`` and the failure is still reported. With
+    ``estimate_only`` no carrier is called at all. Returns the quotes and the
+    per-carrier errors.
+    """
+    if timeout is None:
+        timeout = settings.CARRIER_QUOTE_TIMEOUT
+
+    if estimate_only:
+        quotes, errors = [], []
+        for code, *_ in jobs:
+            result = estimate_carrier(code, origin, destination, package)
+            if result["success"]:
+                quotes.extend(result["quotes"])
+            else:
+                errors.append({key: result.get(key) for key in ("carrier", "error", "error_type")})
+        return quotes, errors
+
+    tasks = []
+    for code, client_id, client_secret, account_num in jobs:
+        def fetch(code=code, client_id=client_id, client_secret=client_secret, account_num=account_num):
+            return quote_carrier(code, client_id, client_secret, account_num, origin, destination, package)
+        key = lane_key(code, client_id, client_secret, account_num, origin, destination, package)
+        tasks.append((code, asyncio.ensure_future(quote_cache.get_quotes(key, code.value, fetch))))
+    if tasks:
+        await asyncio.wait([task for _, task in tasks], timeout=timeout)
+
+    quotes, errors = [], []
+    for code, task in tasks:
+        if task.done():
+            result = task.result()
+        else:
+            task.cancel()
+            result = {
+                "carrier": code.value,
+                "success": False,
+                "error": f"No response within {timeout:g}s",
+                "error_type": "timeout"
+            }
+        if result["success"]:
+            for quote in result["quotes"]:
+                quote["cached"] = result.get("cached", False)
+                quote["stale"] = result.get("stale", False)
+                quote["estimated"] = False
+            quotes.extend(result["quotes"])
+            continue
+        errors.append({key: result.get(key) for key in ("carrier", "error", "error_type")})
+        if rate_cards.has(code.value):
+            estimate = estimate_carrier(code, origin, destination, package)
+            if estimate["success"]:
+                quotes.extend(estimate["quotes"])
+    return quotes, errors
+
+def matches_service(quote: dict, service_type: Optional[str]) -> bool:
+    """True if ``service_type`` (a service level or carrier service code) selects the quote."""
+    if not service_type:
+        return True
+    return service_type.upper() in (quote.get("service_level"), quote["service_code"])
+
+def rank_quotes(quotes: List[dict]) -> List[dict]:
+    """
+    Sort quotes by price, then transit time, and number them by ``rank``.
+
+    The cheapest quote is flagged ``cheapest`` and the quickest one with a
+    known transit time ``fastest``; quotes without a transit time sort after
+    equally priced ones that have it.
+    """
+    ranked = sorted(quotes, key=lambda q: (
+        q["amount"],
+        q["transit_days"] if q["transit_days"] is not None else float("inf")
+    ))
+    timed = [q for q in ranked if q["transit_days"] is not None]
+    fastest = min(timed, key=lambda q: (q["transit_days"], q["amount"])) if timed else None
+    for rank, quote in enumerate(ranked, start=1):
+        quote["rank"] = rank
+        quote["cheapest"] = rank == 1
+        quote["fastest"] = quote is fastest
+    return ranked
+
+def address_data(location) -> dict:
+    return {field: getattr(location, field) for field in ADDRESS_FIELDS}
+
+def carrier_jobs(credentials, carrier_preference: Optional[List[CarrierCode]] = None) -> List[Tuple[CarrierCode, str, str, Optional[str]]]:
+    """
+    ``quote_carriers`` jobs for the given credentials, limited to
+    ``carrier_preference`` when set; 400 if none are left.
+    """
+    jobs = []
+    for cred in credentials:
+        try:
+            code = CarrierCode(cred.carrier_code)
+        except ValueError:
+            continue
+        if carrier_preference and code not in carrier_preference:
+            continue
+        jobs.append((code, cred.client_id, cred.client_secret, cred.account_number))
+    if not jobs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No active carrier credentials found"
+        )
+    return jobs
+
+async def price_shipment(jobs: list, origin: dict, shipment_request: UserShipmentRequest) -> Tuple[List[dict], List[dict]]:
+    """
+    Quote a shipment and return its ranked quotes and the carrier errors.
+
+    Raises 502 if no carrier returned a quote and 422 if none offers the
+    requested service type.
+    """
+    quotes, errors = await quote_carriers(
+        jobs, origin, shipment_request.destination.dict(), shipment_request.package.dict(),
+        estimate_only=shipment_request.estimate_only
+    )
+    if not quotes:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail={"message": "No carrier returned a quote", "carrier_errors": errors}
+        )
+    quotes = [q for q in quotes if matches_service(q, shipment_request.service_type)]
+    if not quotes:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"No carrier offers service type {shipment_request.service_type}"
+        )
+    return rank_quotes(quotes), errors
+
+def quoted_shipment(
+    user_id: int,
+    origin_location_id: int,
+    origin_zip: str,
+    shipment_request: UserShipmentRequest,
+    quotes: List[dict]
+) -> UserShipment:
+    """A new, unsaved ``QUOTED`` shipment with one ``ShipmentQuote`` row per quote."""
+    destination = shipment_request.destination.model_dump()
+    return UserShipment(
+        user_id=user_id,
+        origin_location_id=origin_location_id,
+        destination_data=destination,
+        quotes_data=quotes,
+        status=ShipmentStatus.QUOTED.value,
+        quotes=[
+            ShipmentQuote(
+                user_id=user_id,
+                origin_zip=origin_zip,
+                destination_zip=destination["zip_code"],
+                carrier=quote["carrier"],
+                service_code=quote["service_code"],
+                service_level=getattr(quote.get("service_level"), "value", quote.get("service_level")),
+                amount=quote["amount"],
+                currency=quote["currency"],
+                transit_days=quote["transit_days"],
+                rank=quote["rank"],
+                estimated=quote.get("estimated", False)
+            )
+            for quote in quotes
+        ]
+    )
+
+async def create_shipment_quote(db: AsyncSession, user_id: int, shipment_request: UserShipmentRequest) -> QuotedShipment:
+    """
+    Quote a shipment with every active carrier of the user and save it as a
+    ``QUOTED`` shipment.
+    """
+    if shipment_request.origin_location_id is None:
+        origin_location = await get_user_default_origin_location(db, user_id)
+        if not origin_location:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=NO_DEFAULT_ORIGIN
+            )
+    else:
+        origin_location = await get_user_origin_location(db, user_id, shipment_request.origin_location_id)
+        if not origin_location:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Origin location not found"
+            )
+
+    jobs = carrier_jobs(
+        await get_user_active_carrier_credentials(db, user_id), shipment_request.carrier_preference
+    )
+
+    # Give the connection back to the pool while the carriers are called
+    db.expunge(origin_location)
+    await db.rollback()
+
+    quotes, errors = await price_shipment(jobs, address_data(origin_location), shipment_request)
+    shipment = quoted_shipment(user_id, origin_location.id, origin_location.zip_code, shipment_request, quotes)
+    db.add(shipment)
+    await db.commit()
+    await db.refresh(shipment)
+    return QuotedShipment(shipment, origin_location, quotes, errors)
+
+async def get_lane_quote_summary(
+    db: AsyncSession,
+    user_id: int,
+    origin_zip: str,
+    destination_zip: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    service_level: Optional[str] = None
+) -> List[dict]:
+    """
+    Lowest and average quoted price per carrier on one lane, cheapest
+    carrier first, over the user's quotes created in ``[start, end)``.
+    Answered from the ``shipment_quotes`` lane index without reading
+    the shipments themselves.
+    """
+    query = select(
+        ShipmentQuote.carrier,
+        ShipmentQuote.currency,
+        func.min(ShipmentQuote.amount).label("min_amount"),
+        func.avg(ShipmentQuote.amount).label("avg_amount"),
+        func.count().label("quote_count")
+    ).where(
+        ShipmentQuote.user_id == user_id,
+        ShipmentQuote.origin_zip == origin_zip,
+        ShipmentQuote.destination_zip == destination_zip
+    )
+    if start is not None:
+        query = query.where(ShipmentQuote.created_at >= start)
+    if end is not None:
+        query = query.where(ShipmentQuote.created_at < end)
+    if service_level:
+        query = query.where(ShipmentQuote.service_level == service_level)
+    query = query.group_by(ShipmentQuote.carrier, ShipmentQuote.currency).order_by(func.min(ShipmentQuote.amount))
+    result = await db.execute(query)
+    return [
+        {**row._mapping, "min_amount": float(row.min_amount), "avg_amount": round(float(row.avg_amount), 2)}
+        for row in result
+    ]
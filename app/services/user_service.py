@@ -1,40 +1,83 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from typing import List, Optional, Sequence
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from fastapi import HTTPException, status
 from app.models import User, OriginLocation, CarrierCredentials, UserShipment
 from app.core.auth_models import (
     OriginLocation as OriginLocationSchema,
     OriginLocationUpdate,
     UserCarrierCredentials,
-    UserCarrierCredentialsUpdate
+    UserCarrierCredentialsUpdate,
+    mask_secret
 )
 from app.core.enums import CarrierCode
 import json
 from datetime import datetime
 
-def get_user_origin_locations(db: Session, user_id: int) -> List[OriginLocation]:
-    """Get all origin locations for a user."""
-    return db.query(OriginLocation).filter(OriginLocation.user_id == user_id).all()
+def _keyset_query(model, user_id: int, limit: Optional[int], after_id: Optional[int], columns: Optional[Sequence[str]]):
+    """
+    SELECT a user's rows ordered by id, starting after ``after_id``.
 
-def get_user_origin_location(db: Session, user_id: int, location_id: int) -> Optional[OriginLocation]:
+    With ``columns`` only those columns are selected and rows come back as
+    named tuples instead of ORM objects.
+    """
+    if columns:
+        query = select(*[getattr(model, name) for name in columns])
+    else:
+        query = select(model)
+    query = query.where(model.user_id == user_id).order_by(model.id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+async def get_user_origin_locations(
+    db: AsyncSession,
+    user_id: int,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    columns: Optional[Sequence[str]] = None
+) -> List[OriginLocation]:
+    """Get origin locations for a user, optionally one page and/or a subset of columns."""
+    result = await db.execute(_keyset_query(OriginLocation, user_id, limit, after_id, columns))
+    return result.all() if columns else result.scalars().all()
+
+async def get_user_origin_location(db: AsyncSession, user_id: int, location_id: int) -> Optional[OriginLocation]:
     """Get a specific origin location for a user."""
-    return db.query(OriginLocation).filter(
+    result = await db.execute(select(OriginLocation).where(
         and_(OriginLocation.user_id == user_id, OriginLocation.id == location_id)
-    ).first()
+    ))
+    return result.scalars().first()
 
-def create_origin_location(db: Session, user_id: int, location: OriginLocationSchema) -> OriginLocation:
-    """Create a new origin location for a user."""
-    # If this is set as default, unset all other defaults for this user
+async def get_user_default_origin_location(db: AsyncSession, user_id: int) -> Optional[OriginLocation]:
+    """Get a user's default origin location."""
+    result = await db.execute(select(OriginLocation).where(
+        and_(OriginLocation.user_id == user_id, OriginLocation.is_default == True)
+    ))
+    return result.scalars().first()
+
+async def create_origin_location(db: AsyncSession, user_id: int, location: OriginLocationSchema) -> OriginLocation:
+    """
+    Create a new origin location for a user.
+
+    Two statements: an INSERT plus either the UPDATE that clears the old
+    default or, for a non-default location, a check for an existing one
+    (a user's first location always becomes the default).
+    """
     if location.is_default:
-        db.query(OriginLocation).filter(OriginLocation.user_id == user_id).update(
-            {"is_default": False}
+        await db.execute(
+            update(OriginLocation)
+            .where(OriginLocation.user_id == user_id, OriginLocation.is_default.is_(True))
+            .values(is_default=False)
         )
-    
-    # If this is the first location, make it default
-    existing_count = db.query(OriginLocation).filter(OriginLocation.user_id == user_id).count()
-    if existing_count == 0:
-        location.is_default = True
+    else:
+        has_location = await db.scalar(
+            select(OriginLocation.id).where(OriginLocation.user_id == user_id).limit(1)
+        )
+        if has_location is None:
+            location.is_default = True
     
     db_location = OriginLocation(
         user_id=user_id,
@@ -50,18 +93,19 @@ def create_origin_location(db: Session, user_id: int, location: OriginLocationSc
         is_default=location.is_default
     )
     db.add(db_location)
-    db.commit()
-    db.refresh(db_location)
+    # Every column is set client-side and the id comes back with the INSERT,
+    # so no refresh is needed (sessions do not expire objects on commit)
+    await db.commit()
     return db_location
 
-def update_origin_location(
-    db: Session, 
+async def update_origin_location(
+    db: AsyncSession, 
     user_id: int, 
     location_id: int, 
     location_update: OriginLocationUpdate
 ) -> Optional[OriginLocation]:
     """Update an origin location for a user."""
-    db_location = get_user_origin_location(db, user_id, location_id)
+    db_location = await get_user_origin_location(db, user_id, location_id)
     if not db_location:
         return None
     
@@ -69,64 +113,115 @@ def update_origin_location(
     
     # If setting as default, unset all other defaults
     if update_data.get("is_default", False):
-        db.query(OriginLocation).filter(
-            and_(OriginLocation.user_id == user_id, OriginLocation.id != location_id)
-        ).update({"is_default": False})
+        await db.execute(
+            update(OriginLocation).where(
+                and_(OriginLocation.user_id == user_id, OriginLocation.id != location_id)
+            ).values(is_default=False)
+        )
     
     for field, value in update_data.items():
         setattr(db_location, field, value)
     
     db_location.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_location)
+    await db.commit()
+    await db.refresh(db_location)
     return db_location
 
-def delete_origin_location(db: Session, user_id: int, location_id: int) -> bool:
-    """Delete an origin location for a user."""
-    db_location = get_user_origin_location(db, user_id, location_id)
+async def delete_origin_location(db: AsyncSession, user_id: int, location_id: int) -> bool:
+    """
+    Delete an origin location for a user, in one transaction. If it was the
+    default, the user's oldest remaining location becomes the default.
+    """
+    db_location = await get_user_origin_location(db, user_id, location_id)
     if not db_location:
         return False
     
-    was_default = db_location.is_default
-    db.delete(db_location)
-    db.commit()
-    
-    # If we deleted the default location, set another one as default
-    if was_default:
-        remaining_location = db.query(OriginLocation).filter(
-            OriginLocation.user_id == user_id
-        ).first()
-        if remaining_location:
-            remaining_location.is_default = True
-            db.commit()
-    
+    # A bulk DELETE, so the ORM does not load the location's shipments first;
+    # locations that shipments still reference are kept
+    result = await db.execute(
+        delete(OriginLocation).where(
+            OriginLocation.id == location_id,
+            OriginLocation.user_id == user_id,
+            ~select(UserShipment.id).where(UserShipment.origin_location_id == location_id).exists()
+        )
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Location has shipments and cannot be deleted"
+        )
+    if db_location.is_default:
+        oldest = (
+            select(func.min(OriginLocation.id))
+            .where(OriginLocation.user_id == user_id)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(OriginLocation).where(OriginLocation.id == oldest).values(is_default=True)
+        )
+    await db.commit()
     return True
 
-def get_user_carrier_credentials(db: Session, user_id: int) -> List[CarrierCredentials]:
-    """Get all carrier credentials for a user."""
-    return db.query(CarrierCredentials).filter(CarrierCredentials.user_id == user_id).all()
+async def get_user_carrier_credentials(
+    db: AsyncSession,
+    user_id: int,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    columns: Optional[Sequence[str]] = None
+) -> List[CarrierCredentials]:
+    """Get carrier credentials for a user, optionally one page and/or a subset of columns."""
+    result = await db.execute(_keyset_query(CarrierCredentials, user_id, limit, after_id, columns))
+    return result.all() if columns else result.scalars().all()
 
-def get_user_carrier_credential(
-    db: Session, 
+async def get_user_carrier_credential(
+    db: AsyncSession, 
     user_id: int, 
     carrier_code: str
 ) -> Optional[CarrierCredentials]:
     """Get carrier credentials for a specific carrier."""
-    return db.query(CarrierCredentials).filter(
+    result = await db.execute(select(CarrierCredentials).where(
         and_(
             CarrierCredentials.user_id == user_id,
             CarrierCredentials.carrier_code == carrier_code
         )
-    ).first()
+    ))
+    return result.scalars().first()
 
-def create_carrier_credentials(
-    db: Session, 
+async def create_carrier_credentials(
+    db: AsyncSession, 
     user_id: int, 
     credentials: UserCarrierCredentials
 ) -> CarrierCredentials:
     """Create or update carrier credentials for a user."""
+    upsert = _UPSERT_INSERTS.get(db.bind.dialect.name)
+    if upsert is not None:
+        # Single INSERT ... ON CONFLICT on (user_id, carrier_code)
+        now = datetime.utcnow()
+        values = {
+            "client_id": credentials.client_id,
+            "client_secret": credentials.client_secret,  # Should be encrypted in production
+            "account_number": credentials.account_number,
+            "is_active": credentials.is_active,
+            "description": credentials.description,
+        }
+        stmt = upsert(CarrierCredentials).values(
+            user_id=user_id,
+            carrier_code=credentials.carrier_code.value,
+            created_at=now,
+            updated_at=now,
+            **values
+        ).on_conflict_do_update(
+            index_elements=[CarrierCredentials.user_id, CarrierCredentials.carrier_code],
+            set_={**values, "updated_at": now}
+        ).returning(CarrierCredentials)
+        result = await db.execute(stmt, execution_options={"populate_existing": True})
+        db_credentials = result.scalars().one()
+        await db.commit()
+        return db_credentials
+
     # Check if credentials already exist for this carrier
-    existing = get_user_carrier_credential(db, user_id, credentials.carrier_code.value)
+    existing = await get_user_carrier_credential(db, user_id, credentials.carrier_code.value)
     
     if existing:
         # Update existing credentials
@@ -136,8 +231,8 @@ def create_carrier_credentials(
         existing.is_active = credentials.is_active
         existing.description = credentials.description
         existing.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing)
+        await db.commit()
+        await db.refresh(existing)
         return existing
     else:
         # Create new credentials
@@ -151,18 +246,18 @@ def create_carrier_credentials(
             description=credentials.description
         )
         db.add(db_credentials)
-        db.commit()
-        db.refresh(db_credentials)
+        await db.commit()
+        await db.refresh(db_credentials)
         return db_credentials
 
-def update_carrier_credentials(
-    db: Session,
+async def update_carrier_credentials(
+    db: AsyncSession,
     user_id: int,
     carrier_code: str,
     credentials_update: UserCarrierCredentialsUpdate
 ) -> Optional[CarrierCredentials]:
     """Update carrier credentials for a user."""
-    db_credentials = get_user_carrier_credential(db, user_id, carrier_code)
+    db_credentials = await get_user_carrier_credential(db, user_id, carrier_code)
     if not db_credentials:
         return None
     
@@ -172,28 +267,33 @@ def update_carrier_credentials(
         setattr(db_credentials, field, value)
     
     db_credentials.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_credentials)
+    await db.commit()
+    await db.refresh(db_credentials)
     return db_credentials
 
-def delete_carrier_credentials(db: Session, user_id: int, carrier_code: str) -> bool:
+async def delete_carrier_credentials(db: AsyncSession, user_id: int, carrier_code: str) -> bool:
     """Delete carrier credentials for a user."""
-    db_credentials = get_user_carrier_credential(db, user_id, carrier_code)
+    db_credentials = await get_user_carrier_credential(db, user_id, carrier_code)
     if not db_credentials:
         return False
     
-    db.delete(db_credentials)
-    db.commit()
+    await db.delete(db_credentials)
+    await db.commit()
     return True
 
-def get_user_active_carriers(db: Session, user_id: int) -> List[CarrierCode]:
-    """Get list of carriers with active credentials for a user."""
-    credentials = db.query(CarrierCredentials).filter(
+async def get_user_active_carrier_credentials(db: AsyncSession, user_id: int) -> List[CarrierCredentials]:
+    """Get a user's active carrier credentials."""
+    result = await db.execute(select(CarrierCredentials).where(
         and_(
             CarrierCredentials.user_id == user_id,
             CarrierCredentials.is_active == True
         )
-    ).all()
+    ))
+    return result.scalars().all()
+
+async def get_user_active_carriers(db: AsyncSession, user_id: int) -> List[CarrierCode]:
+    """Get list of carriers with active credentials for a user."""
+    credentials = await get_user_active_carrier_credentials(db, user_id)
     
     carrier_codes = []
     for cred in credentials:
@@ -205,8 +305,8 @@ def get_user_active_carriers(db: Session, user_id: int) -> List[CarrierCode]:
     
     return carrier_codes
 
-def mask_secret(secret: str) -> str:
-    """Mask a secret string, showing only the last 4 characters."""
-    if len(secret) <= 4:
-        return "*" * len(secret)
-    return "*" * (len(secret) - 4) + secret[-4:]
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
@@ -0,0 +1,390 @@
+"""
+Local FedEx, UPS and USPS API simulator with latency and fault injection.
+
+Serves the OAuth token and rating endpoints the carrier adapters call, at
+the same paths as the real hosts, so the token and quote paths can be
+load-tested without a network:
+
+    python benchmarks/carrier_simulator.py --port 8090 --latency lognormal:120,0.5 --error-rate 0.02
+    CARRIER_BASE_URL=http://127.0.0.1:8090 uvicorn app.main:app
+
+Each response first waits for a latency drawn from the carrier's profile,
+then may fail with an error status, return malformed JSON, or drip its
+body out a few bytes at a time. Latency specs are in milliseconds:
+``fixed:MS``, ``uniform:LOW,HIGH``, ``normal:MEAN,STDDEV``,
+``lognormal:MEDIAN,SIGMA``, ``exponential:MEAN`` or ``pareto:MIN,ALPHA``.
+The command-line flags set the default profile; ``--profiles FILE`` takes
+per-carrier overrides as JSON, e.g. ``{"UPS": {"error_rate": 0.2}}``.
+
+While running, ``GET /_simulator`` returns the profiles and per-endpoint
+outcome counts, ``PUT /_simulator/profiles/{carrier or default}`` changes
+a profile, and ``POST /_simulator/reset`` clears the counts.
+
+All carriers share one host here, so the API keeps a single connection
+pool for them; run one simulator per carrier (``CARRIER_BASE_URLS``) to
+keep their pools apart as in production.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import Callable, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+CARRIERS = ("FEDEX", "UPS", "USPS")
+
+def latency_sampler(spec: str) -> Callable[[random.Random], float]:
+    """Parse a latency spec (milliseconds) into a function returning seconds."""
+    kind, _, params = spec.partition(":")
+    try:
+        args = [float(value) for value in params.split(",")] if params else []
+        if kind == "fixed":
+            (ms,) = args or [0.0]
+            sample = lambda rng: ms
+        elif kind == "uniform":
+            low, high = args
+            sample = lambda rng: rng.uniform(low, high)
+        elif kind == "normal":
+            mean, stddev = args
+            sample = lambda rng: rng.gauss(mean, stddev)
+        elif kind == "lognormal":
+            median, sigma = args
+            sample = lambda rng: rng.lognormvariate(math.log(median), sigma)
+        elif kind == "exponential":
+            (mean,) = args
+            sample = lambda rng: rng.expovariate(1 / mean)
+        elif kind == "pareto":
+            minimum, alpha = args
+            sample = lambda rng: minimum * rng.paretovariate(alpha)
+        else:
+            raise ValueError(f"unknown distribution {kind!r}")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid latency spec {spec!r}: {e}")
+    return lambda rng: max(0.0, sample(rng)) / 1000
+
+@dataclass
+class FaultProfile:
+    """How one carrier's simulated endpoints behave."""
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    error_statuses: List[int] = field(default_factory=lambda: [500, 502, 503, 429])
+    malformed_rate: float = 0.0
+    slow_drip_rate: float = 0.0
+    drip_bytes: int = 16
+    drip_interval: float = 0.25
+
+    def __post_init__(self):
+        self.sample_latency = latency_sampler(self.latency)
+        for name in ("error_rate", "malformed_rate", "slow_drip_rate"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} must be between 0 and 1")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def updated(self, changes: dict) -> "FaultProfile":
+        unknown = set(changes) - {f.name for f in fields(self)}
+        if unknown:
+            raise ValueError(f"Unknown profile settings: {', '.join(sorted(unknown))}")
+        return replace(self, **changes)
+
+# ------------------------------------------
+# Carrier response bodies
+# ------------------------------------------
+
+def _zone(origin_zip: str, destination_zip: str) -> int:
+    """A stable stand-in for the carriers' zone charts: 2-8 by ZIP prefix distance."""
+    try:
+        distance = abs(int(str(origin_zip)[:3]) - int(str(destination_zip)[:3]))
+    except ValueError:
+        distance = 0
+    return min(8, 2 + distance // 150)
+
+def _price(base: float, per_lb: float, zone: int, weight) -> float:
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        weight = 1.0
+    return round(base + per_lb * max(weight, 1.0) + 1.35 * zone, 2)
+
+def token_body(carrier: str, client_id: str) -> dict:
+    token = f"sim-{carrier.lower()}-{uuid.uuid4().hex}"
+    if carrier == "UPS":
+        # UPS sends expires_in as a string
+        return {"token_type": "Bearer", "client_id": client_id, "access_token": token,
+                "expires_in": "14399", "status": "approved"}
+    return {"access_token": token, "token_type": "bearer", "expires_in": 3599, "scope": "CXS"}
+
+FEDEX_SERVICES = [
+    ("FEDEX_GROUND", "FedEx Ground", 9.0, 0.55, "FOUR_DAYS"),
+    ("FEDEX_EXPRESS_SAVER", "FedEx Express Saver", 18.0, 0.95, "THREE_DAYS"),
+    ("FEDEX_2_DAY", "FedEx 2Day", 24.0, 1.10, "TWO_DAYS"),
+    ("STANDARD_OVERNIGHT", "FedEx Standard Overnight", 38.0, 1.60, "ONE_DAY"),
+    ("PRIORITY_OVERNIGHT", "FedEx Priority Overnight", 46.0, 1.75, "ONE_DAY"),
+]
+UPS_SERVICES = [("03", 8.5, 0.50, "4"), ("12", 16.0, 0.85, "3"), ("02", 22.0, 1.05, "2"), ("01", 44.0, 1.70, "1")]
+USPS_SERVICES = {"USPS_GROUND_ADVANTAGE": (6.5, 0.45), "PRIORITY_MAIL": (10.0, 0.70), "PRIORITY_MAIL_EXPRESS": (30.0, 1.40)}
+
+def fedex_rates(body: dict) -> dict:
+    shipment = body.get("requestedShipment", {})
+    zone = _zone(
+        shipment.get("shipper", {}).get("address", {}).get("postalCode", "0"),
+        shipment.get("recipient", {}).get("address", {}).get("postalCode", "0")
+    )
+    weight = (shipment.get("requestedPackageLineItems") or [{}])[0].get("weight", {}).get("value")
+    return {"transactionId": uuid.uuid4().hex, "output": {"rateReplyDetails": [
+        {
+            "serviceType": code,
+            "serviceName": name,
+            "ratedShipmentDetails": [{"totalNetCharge": _price(base, per_lb, zone, weight), "currency": "USD"}],
+            "commit": {"transitDays": {"minimumTransitTime": transit}}
+        }
+        for code, name, base, per_lb, transit in FEDEX_SERVICES
+    ]}}
+
+def ups_rates(body: dict) -> dict:
+    shipment = body.get("RateRequest", {}).get("Shipment", {})
+    zone = _zone(
+        shipment.get("ShipFrom", {}).get("Address", {}).get("PostalCode", "0"),
+        shipment.get("ShipTo", {}).get("Address", {}).get("PostalCode", "0")
+    )
+    weight = shipment.get("Package", {}).get("PackageWeight", {}).get("Weight")
+    return {"RateResponse": {
+        "Response": {"ResponseStatus": {"Code": "1", "Description": "Success"}},
+        "RatedShipment": [
+            {
+                "Service": {"Code": code},
+                "TotalCharges": {"CurrencyCode": "USD", "MonetaryValue": f"{_price(base, per_lb, zone, weight):.2f}"},
+                "GuaranteedDelivery": {"BusinessDaysInTransit": transit}
+            }
+            for code, base, per_lb, transit in UPS_SERVICES
+        ]
+    }}
+
+def usps_rates(body: dict) -> Optional[dict]:
+    mail_class = body.get("mailClass")
+    if mail_class not in USPS_SERVICES:
+        return None
+    base, per_lb = USPS_SERVICES[mail_class]
+    price = _price(base, per_lb, _zone(body.get("originZIPCode", "0"), body.get("destinationZIPCode", "0")), body.get("weight"))
+    return {"totalBasePrice": price, "rates": [{"mailClass": mail_class, "price": price, "description": mail_class}]}
+
+def error_body(carrier: str, status_code: int, message: str) -> dict:
+    if carrier == "FEDEX":
+        return {"transactionId": uuid.uuid4().hex, "errors": [{"code": f"SIMULATED.{status_code}", "message": message}]}
+    if carrier == "UPS":
+        return {"response": {"errors": [{"code": str(status_code), "message": message}]}}
+    return {"error": {"code": str(status_code), "message": message}}
+
+# ------------------------------------------
+# Simulator app
+# ------------------------------------------
+
+class Simulator:
+    """Carrier endpoints plus the fault injection and counters around them."""
+
+    def __init__(self, profiles: Dict[str, FaultProfile], seed: Optional[int] = None):
+        self.profiles = profiles
+        self.rng = random.Random(seed)
+        self.stats: Counter = Counter()
+
+    def profile(self, carrier: str) -> FaultProfile:
+        return self.profiles.get(carrier) or self.profiles["default"]
+
+    async def respond(self, carrier: str, endpoint: str, build: Callable[[], tuple]) -> Response:
+        """Wait out the profile's latency, then answer with ``build()`` or an injected fault."""
+        profile = self.profile(carrier)
+        await asyncio.sleep(profile.sample_latency(self.rng))
+        roll = self.rng.random()
+        if roll < profile.error_rate:
+            status_code = self.rng.choice(profile.error_statuses)
+            self.stats[(carrier, endpoint, str(status_code))] += 1
+            headers = {"Retry-After": "1"} if status_code in (429, 503) else None
+            return JSONResponse(error_body(carrier, status_code, "Simulated failure"), status_code, headers)
+
+        status_code, payload = build()
+        content = json.dumps(payload).encode()
+        roll -= profile.error_rate
+        if status_code < 400 and roll < profile.malformed_rate:
+            self.stats[(carrier, endpoint, "malformed")] += 1
+            return Response(content[:max(1, len(content) // 2)], status_code, media_type="application/json")
+        roll -= profile.malformed_rate
+        if roll < profile.slow_drip_rate:
+            self.stats[(carrier, endpoint, "slow_drip")] += 1
+            return StreamingResponse(
+                self._drip(content, profile), status_code,
+                headers={"Content-Length": str(len(content))}, media_type="application/json"
+            )
+        self.stats[(carrier, endpoint, str(status_code))] += 1
+        return Response(content, status_code, media_type="application/json")
+
+    @staticmethod
+    async def _drip(content: bytes, profile: FaultProfile):
+        for offset in range(0, len(content), profile.drip_bytes):
+            yield content[offset:offset + profile.drip_bytes]
+            await asyncio.sleep(profile.drip_interval)
+
+    @staticmethod
+    def _bearer(request: Request) -> bool:
+        return request.headers.get("authorization", "").startswith("Bearer ")
+
+    # OAuth client-credentials endpoints
+
+    async def fedex_token(self, request: Request) -> Response:
+        form = await request.form()
+
+        def build():
+            if form.get("grant_type") != "client_credentials" or not form.get("client_id") or not form.get("client_secret"):
+                return 401, error_body("FEDEX", 401, "Invalid client credentials")
+            return 200, token_body("FEDEX", form["client_id"])
+        return await self.respond("FEDEX", "token", build)
+
+    async def ups_token(self, request: Request) -> Response:
+        form = await request.form()
+        authorization = request.headers.get("authorization", "")
+
+        def build():
+            try:
+                client_id, _, client_secret = base64.b64decode(authorization.removeprefix("Basic ")).decode().partition(":")
+            except ValueError:
+                client_id = client_secret = ""
+            if form.get("grant_type") != "client_credentials" or not client_id or not client_secret:
+                return 401, error_body("UPS", 401, "Invalid Authentication Information")
+            return 200, token_body("UPS", client_id)
+        return await self.respond("UPS", "token", build)
+
+    async def usps_token(self, request: Request) -> Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+
+        def build():
+            if body.get("grant_type") != "client_credentials" or not body.get("client_id") or not body.get("client_secret"):
+                return 401, error_body("USPS", 401, "invalid_client")
+            return 200, token_body("USPS", body["client_id"])
+        return await self.respond("USPS", "token", build)
+
+    # Rating endpoints
+
+    async def _rate(self, request: Request, carrier: str, rates: Callable[[dict], Optional[dict]]) -> Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+
+        def build():
+            if not self._bearer(request):
+                return 401, error_body(carrier, 401, "Missing or invalid bearer token")
+            payload = rates(body) if isinstance(body, dict) else None
+            if payload is None:
+                return 400, error_body(carrier, 400, "Invalid rate request")
+            return 200, payload
+        return await self.respond(carrier, "rate", build)
+
+    async def fedex_rate(self, request: Request) -> Response:
+        return await self._rate(request, "FEDEX", fedex_rates)
+
+    async def ups_rate(self, request: Request) -> Response:
+        return await self._rate(request, "UPS", ups_rates)
+
+    async def usps_rate(self, request: Request) -> Response:
+        return await self._rate(request, "USPS", usps_rates)
+
+    # Control endpoints
+
+    async def root(self, request: Request) -> Response:
+        # The API's health monitor sends HEAD / to each carrier host
+        return JSONResponse({"simulator": "carriers", "carriers": list(CARRIERS)})
+
+    async def status(self, request: Request) -> Response:
+        counts: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for (carrier, endpoint, outcome), count in sorted(self.stats.items()):
+            counts.setdefault(carrier, {}).setdefault(endpoint, {})[outcome] = count
+        return JSONResponse({
+            "profiles": {name: profile.to_dict() for name, profile in self.profiles.items()},
+            "requests": counts
+        })
+
+    async def update_profile(self, request: Request) -> Response:
+        name = request.path_params["name"]
+        name = name if name == "default" else name.upper()
+        if name != "default" and name not in CARRIERS:
+            return JSONResponse({"detail": f"Unknown carrier: {name}"}, 404)
+        try:
+            self.profiles[name] = self.profile(name).updated(await request.json())
+        except (TypeError, ValueError) as e:
+            return JSONResponse({"detail": str(e)}, 400)
+        return JSONResponse(self.profiles[name].to_dict())
+
+    async def reset(self, request: Request) -> Response:
+        self.stats.clear()
+        return Response(status_code=204)
+
+    def routes(self) -> List[Route]:
+        return [
+            Route("/", self.root, methods=["GET", "HEAD"]),
+            Route("/oauth/token", self.fedex_token, methods=["POST"]),
+            Route("/rate/v1/rates/quotes", self.fedex_rate, methods=["POST"]),
+            Route("/security/v1/oauth/token", self.ups_token, methods=["POST"]),
+            Route("/api/rating/{version}/{option}", self.ups_rate, methods=["POST"]),
+            Route("/oauth2/v3/token", self.usps_token, methods=["POST"]),
+            Route("/prices/v3/base-rates/search", self.usps_rate, methods=["POST"]),
+            Route("/_simulator", self.status, methods=["GET"]),
+            Route("/_simulator/profiles/{name}", self.update_profile, methods=["PUT"]),
+            Route("/_simulator/reset", self.reset, methods=["POST"]),
+        ]
+
+def create_app(profiles: Optional[Dict[str, FaultProfile]] = None, seed: Optional[int] = None) -> Starlette:
+    """The simulator as an ASGI app; ``profiles`` maps carrier codes (and "default") to behaviour."""
+    profiles = dict(profiles or {})
+    profiles.setdefault("default", FaultProfile())
+    return Starlette(routes=Simulator(profiles, seed).routes())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="fixed:0", help="latency distribution in ms, e.g. lognormal:120,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses that fail")
+    parser.add_argument("--error-statuses", default="500,502,503,429", help="statuses failures are drawn from")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of responses with truncated JSON")
+    parser.add_argument("--slow-drip-rate", type=float, default=0.0, help="fraction of responses sent a few bytes at a time")
+    parser.add_argument("--drip-bytes", type=int, default=16, help="bytes per slow-drip chunk")
+    parser.add_argument("--drip-interval", type=float, default=0.25, help="seconds between slow-drip chunks")
+    parser.add_argument("--profiles", help="JSON file of per-carrier overrides of these settings")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable fault sequences")
+    args = parser.parse_args()
+
+    try:
+        default = FaultProfile(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            error_statuses=[int(status) for status in args.error_statuses.split(",") if status.strip()],
+            malformed_rate=args.malformed_rate,
+            slow_drip_rate=args.slow_drip_rate,
+            drip_bytes=args.drip_bytes,
+            drip_interval=args.drip_interval
+        )
+        profiles = {"default": default}
+        if args.profiles:
+            with open(args.profiles) as f:
+                for carrier, changes in json.load(f).items():
+                    profiles[carrier.upper()] = default.updated(changes)
+    except (TypeError, ValueError) as e:
+        parser.error(str(e))
+
+    uvicorn.run(create_app(profiles, args.seed), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
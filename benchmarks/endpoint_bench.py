@@ -0,0 +1,320 @@
+"""
+API endpoint throughput and latency.
+
+Seeds a database through the models in app/models with a reproducible data
+set (each user has one default origin location and one UPS credential),
+then drives the real app, either in process over an ASGI transport or over
+HTTP against a local uvicorn, and reports requests per second and p50/p99
+latency per endpoint. Results are written as JSON and can be compared with
+an earlier run.
+
+    python benchmarks/endpoint_bench.py [--users 1k|100k|1m] [--server inprocess|uvicorn]
+        [--duration S] [--concurrency N] [--output FILE] [--baseline FILE]
+
+Data sets are kept in --data-dir (one SQLite file per size) and reused, so
+only the first run at a size pays for seeding; pass --database-url to
+benchmark another database. In process, the load generator shares the
+app's event loop, so numbers include client overhead; use --server uvicorn
+to measure the app on its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_SETS = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+ENDPOINTS = ["/auth/token", "/auth/profile", "/user/locations", "/user/carriers", "/health"]
+PASSWORD = "benchmark-password"
+SEED_BATCH_SIZE = 10_000
+# Metrics that are better when lower; everything else (throughput) is better higher
+LOWER_IS_BETTER = ("p50_ms", "p99_ms")
+
+def configure_environment(args) -> str:
+    """Point the app at the benchmark database; must run before importing ``app``."""
+    database_url = args.database_url
+    if database_url is None:
+        os.makedirs(args.data_dir, exist_ok=True)
+        database_url = f"sqlite:///{os.path.join(os.path.abspath(args.data_dir), f'endpoints_{args.users}.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    # Probes must not depend on reaching the real carrier APIs, and the
+    # load generator would otherwise spend most of its time being throttled
+    os.environ.setdefault("HEALTH_CHECK_CARRIERS", "false")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    return database_url
+
+def username(index: int) -> str:
+    return f"bench{index:07d}"
+
+def seed(count: int):
+    """Create the tables and insert ``count`` users with their location and credential."""
+    from sqlalchemy import func, insert, select
+    from app.core.auth import get_password_hash
+    from app.core.database import SessionLocal
+    from app.core.init import init_app
+    from app.models import CarrierCredentials, OriginLocation, User
+
+    init_app()
+    with SessionLocal() as session:
+        existing = session.scalar(select(func.count()).select_from(User))
+        if existing == count:
+            print(f"reusing data set: {count:,} users")
+            return
+        if existing:
+            sys.exit(f"database already has {existing:,} users; use an empty database for a {count:,} user data set")
+
+    # bcrypt is the point of /auth/token but would make seeding take days,
+    # so every user shares one hash
+    hashed_password = get_password_hash(PASSWORD)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with SessionLocal() as session:
+        for offset in range(0, count, SEED_BATCH_SIZE):
+            indexes = range(offset, min(offset + SEED_BATCH_SIZE, count))
+            user_ids = session.scalars(
+                insert(User).returning(User.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "username": username(i),
+                        "email": f"{username(i)}@example.com",
+                        "full_name": f"Benchmark User {i}",
+                        "hashed_password": hashed_password
+                    }
+                    for i in indexes
+                ]
+            ).all()
+            session.execute(insert(OriginLocation), [
+                {
+                    "user_id": user_id,
+                    "name": "Warehouse",
+                    "address_line1": f"{rng.randint(1, 9999)} Main St",
+                    "city": "Austin",
+                    "state": "TX",
+                    "zip_code": f"{rng.randint(501, 99950):05d}",
+                    "is_default": True
+                }
+                for user_id in user_ids
+            ])
+            session.execute(insert(CarrierCredentials), [
+                {
+                    "user_id": user_id,
+                    "carrier_code": "UPS",
+                    "client_id": f"client-{user_id}",
+                    "client_secret": f"secret-{user_id:012d}",
+                    "account_number": f"{rng.randint(0, 999999):06d}"
+                }
+                for user_id in user_ids
+            ])
+            session.commit()
+            done = indexes.stop
+            print(f"\rseeded {done:,}/{count:,} users", end="", flush=True)
+    print(f"\nseeded in {time.perf_counter() - start:.0f} s")
+
+def request_factory(endpoint: str, tokens: list, rng: random.Random):
+    """Return a function building (method, path, kwargs) for the next request to ``endpoint``."""
+    if endpoint == "/auth/token":
+        users = [name for name, _ in tokens]
+        return lambda: ("POST", endpoint, {"data": {"username": rng.choice(users), "password": PASSWORD}})
+    if endpoint == "/health":
+        return lambda: ("GET", endpoint, {})
+    headers = [{"Authorization": f"Bearer {token}"} for _, token in tokens]
+    return lambda: ("GET", endpoint, {"headers": rng.choice(headers)})
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def run_endpoint(client: httpx.AsyncClient, next_request, duration: float, warmup: float, concurrency: int) -> dict:
+    """Keep ``concurrency`` requests in flight for ``warmup`` + ``duration`` seconds."""
+    latencies = []
+    statuses = {}
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    stop_at = measure_from + duration
+
+    async def worker():
+        while loop.time() < stop_at:
+            method, path, kwargs = next_request()
+            start = time.perf_counter()
+            try:
+                status = (await client.request(method, path, **kwargs)).status_code
+            except httpx.HTTPError as e:
+                status = e.__class__.__name__
+            if loop.time() >= measure_from:
+                statuses[status] = statuses.get(status, 0) + 1
+                if isinstance(status, int) and status < 400:
+                    latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    # Throughput and latency cover successful responses only; rejections
+    # (e.g. 503 from a saturated password hasher) are fast and counted apart
+    latencies.sort()
+    total = sum(statuses.values())
+    return {
+        "requests": total,
+        "errors": total - len(latencies),
+        "statuses": {str(status): n for status, n in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(1000 * percentile(latencies, 0.50), 3),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 3),
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "max_ms": round(1000 * latencies[-1], 3) if latencies else 0.0
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_uvicorn(workers: int) -> tuple:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=os.environ.copy()
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"uvicorn exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health/live", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit("uvicorn did not start within 60 s")
+
+async def benchmark(args, count: int) -> dict:
+    from datetime import timedelta
+    from app.core.auth import create_access_token
+    from app.core.config import settings
+
+    rng = random.Random(1)
+    # Sign tokens directly so the authenticated endpoints don't depend on /auth/token
+    sample = rng.sample(range(count), min(args.sample_users, count))
+    tokens = [
+        (username(i), create_access_token({"sub": username(i)}, timedelta(hours=1)))
+        for i in sample
+    ]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async def run_all(client: httpx.AsyncClient) -> dict:
+        results = {}
+        for endpoint in args.endpoints:
+            results[endpoint] = await run_endpoint(
+                client, request_factory(endpoint, tokens, rng), args.duration, args.warmup, args.concurrency
+            )
+            print(format_row(endpoint, results[endpoint]))
+        return results
+
+    print(f"{'endpoint':<18} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    if args.server == "uvicorn":
+        process, base_url = start_uvicorn(args.workers)
+        try:
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+                results = await run_all(client)
+        finally:
+            process.terminate()
+            process.wait()
+    else:
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+                results = await run_all(client)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "users": count,
+            "server": args.server,
+            "workers": args.workers if args.server == "uvicorn" else 1,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "database": settings.DATABASE_URL.split(":", 1)[0],
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+
+def format_row(endpoint: str, result: dict) -> str:
+    return (
+        f"{endpoint:<18} {result['throughput_rps']:>10,.1f} {result['p50_ms']:>9.2f} "
+        f"{result['p99_ms']:>9.2f} {result['errors']:>8}"
+    )
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Print each endpoint's change from ``baseline`` and return the regressions beyond ``tolerance``."""
+    regressions = []
+    for key in ("users", "server", "workers", "concurrency", "database", "bcrypt_rounds"):
+        if baseline.get("meta", {}).get(key) != current["meta"][key]:
+            print(f"note: baseline {key} is {baseline.get('meta', {}).get(key)!r}, this run {current['meta'][key]!r}")
+    print(f"\n{'vs baseline':<18} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for endpoint, result in current["results"].items():
+        before = baseline.get("results", {}).get(endpoint)
+        if not before:
+            print(f"{endpoint:<18} {'(new)':>10}")
+            continue
+        changes = []
+        for metric in ("throughput_rps", "p50_ms", "p99_ms"):
+            change = (result[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.append(f"{endpoint} {metric}: {before[metric]} -> {result[metric]}")
+            changes.append(f"{change:+.1%}{'!' if worse else ''}")
+        print(f"{endpoint:<18} {changes[0]:>10} {changes[1]:>9} {changes[2]:>9}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", choices=DATA_SETS, default="1k", help="data set size")
+    parser.add_argument("--server", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests kept in flight")
+    parser.add_argument("--sample-users", type=int, default=1000, help="distinct users the requests are spread over")
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "benchmarks", "data"), help="where SQLite data sets are kept")
+    parser.add_argument("--database-url", help="benchmark this database instead of a SQLite data set")
+    parser.add_argument("--output", help="results file (default: endpoints_<users>_<server>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression before failing")
+    args = parser.parse_args()
+
+    count = DATA_SETS[args.users]
+    database_url = configure_environment(args)
+    print(f"database: {database_url}")
+    seed(count)
+
+    results = asyncio.run(benchmark(args, count))
+    output = args.output or f"endpoints_{args.users}_{args.server}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
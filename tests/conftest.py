@@ -0,0 +1,43 @@
+"""
+Shared test setup: a throwaway SQLite database, configured before ``app``
+is imported, and an authenticated client for the full API.
+"""
+import os
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="shipments-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_data_dir, 'test.db')}"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["HEALTH_CHECK_CARRIERS"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["CARRIER_TOKEN_CACHE_PATH"] = ""
+
+import asyncio  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.core.database import async_engine  # noqa: E402
+from app.core.init import init_app  # noqa: E402
+
+init_app()
+
+def run(coro):
+    """Run ``coro`` on a fresh event loop, releasing pooled async connections after."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    user = {"username": "tester", "email": "tester@example.com", "password": "correct-horse", "full_name": "Test User"}
+    assert client.post("/auth/register", json=user).status_code == 200
+    response = client.post("/auth/token", data={"username": user["username"], "password": user["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
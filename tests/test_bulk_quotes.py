@@ -0,0 +1,145 @@
+"""
+The bulk quote producer/consumer protocol: every row gets exactly one
+result, bad rows are reported in place, and a failing or abandoned upload
+ends the stream instead of hanging it.
+"""
+import asyncio
+import json
+import pytest
+from starlette.requests import ClientDisconnect
+from app.models import OriginLocation
+from app.services import bulk_quote_service
+from app.services.bulk_quote_service import UploadStreamingResponse, stream_bulk_quotes
+from tests.conftest import run
+
+DESTINATION = {"name": "Bob", "add1": "2 Elm", "city": "Denver", "state": "CO", "zip": "80202", "phone": "555"}
+PACKAGE = {"weight_lb": 5, "length_in": 10, "width_in": 8, "height_in": 4}
+ORIGIN = OriginLocation(
+    id=1, user_id=1, name="WH", address_line1="1 Main", city="Austin", state="TX",
+    zip_code="78701", country="US", is_default=True
+)
+
+def quote(amount: float) -> dict:
+    return {
+        "carrier": "UPS", "service_code": "03", "service_name": "UPS Ground", "service_level": "GROUND",
+        "amount": amount, "currency": "USD", "transit_days": 4, "rank": 1
+    }
+
+@pytest.fixture(autouse=True)
+def fake_carriers(monkeypatch):
+    """Price rows without carriers: later rows finish first, so results arrive out of order."""
+    async def price_shipment(jobs, origin, shipment_request):
+        await asyncio.sleep(0.05 / shipment_request.package.weight_lb)
+        return [quote(shipment_request.package.weight_lb)], []
+
+    monkeypatch.setattr(bulk_quote_service, "carrier_jobs", lambda credentials, preference=None: [])
+    monkeypatch.setattr(bulk_quote_service, "price_shipment", price_shipment)
+
+async def chunks_of(*parts, error: BaseException = None):
+    for part in parts:
+        await asyncio.sleep(0)
+        yield part.encode()
+    if error is not None:
+        raise error
+
+async def collect(chunks, input_format="ndjson", output_format="ndjson") -> list:
+    stream = stream_bulk_quotes(chunks, 1, {1: ORIGIN}, 1, [], input_format, output_format)
+    output = "".join([text async for text in stream])
+    if output_format == "csv":
+        return output.splitlines()
+    return [json.loads(line) for line in output.splitlines()]
+
+def ndjson(*rows) -> str:
+    return "".join(row if isinstance(row, str) else json.dumps(row) + "\n" for row in rows)
+
+def test_every_row_gets_one_result_even_out_of_order():
+    rows = [{"destination": DESTINATION, "package": {**PACKAGE, "weight_lb": w}, "reference": f"r{w}"} for w in range(1, 8)]
+    results = run(collect(chunks_of(ndjson(*rows))))
+
+    assert sorted(result["row"] for result in results) == list(range(1, 8))
+    assert all(result["success"] and result["shipment_id"] for result in results)
+    assert {result["row"]: result["reference"] for result in results} == {w: f"r{w}" for w in range(1, 8)}
+    assert len({result["shipment_id"] for result in results}) == 7
+
+def test_invalid_json_and_validation_errors_are_reported_per_row():
+    upload = ndjson(
+        {"destination": DESTINATION, "package": PACKAGE},
+        "{not json\n",
+        "\n",
+        {"destination": DESTINATION, "package": {**PACKAGE, "weight_lb": -1}, "reference": "bad-weight"},
+    )
+    results = {result["row"]: result for result in run(collect(chunks_of(upload)))}
+
+    assert results[1]["success"]
+    assert results[2]["status_code"] == 400 and results[2]["error"].startswith("Invalid JSON")
+    assert results[3]["status_code"] == 422 and results[3]["reference"] == "bad-weight"
+    assert results[3]["error"][0]["loc"] == ["package", "weight_lb"]
+
+def test_csv_upload_and_output():
+    upload = (
+        "reference,name,add1,city,state,zip,phone,weight_lb,length_in,width_in,height_in\n"
+        'a,"Bob, Jr.",2 Elm,Denver,CO,80202,555,2,10,8,4\n'
+        "b,Ann,3 Oak,Denver,CO,80202,555,0,10,8,4\n"
+    )
+    lines = run(collect(chunks_of(upload[:40], upload[40:]), "csv", "csv"))
+
+    assert lines[0].startswith("row,reference,success,shipment_id")
+    by_reference = {line.split(",")[1]: line.split(",") for line in lines[1:]}
+    assert by_reference["a"][2] == "True" and by_reference["a"][7] == "2.0"
+    assert by_reference["b"][2] == "False"
+
+async def raw_chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+def test_unreadable_upload_reports_an_error_line():
+    row = ndjson({"destination": DESTINATION, "package": PACKAGE}).encode()
+    results = {result["row"]: result for result in run(collect(raw_chunks(row, b"\xff\xfe\n")))}
+
+    assert results[0]["status_code"] == 400 and results[0]["error"].startswith("Unreadable upload")
+    # Rows read before the bad bytes are still quoted
+    assert results[1]["success"]
+
+def test_client_disconnect_while_uploading_ends_the_stream():
+    row = ndjson({"destination": DESTINATION, "package": PACKAGE})
+    results = run(asyncio.wait_for(collect(chunks_of(row, row, error=ClientDisconnect())), 3))
+    # Rows already started may or may not have finished; none is sent twice
+    assert len({result["row"] for result in results}) == len(results) <= 2
+
+def test_upload_error_ends_the_stream_with_an_error_line():
+    row = ndjson({"destination": DESTINATION, "package": PACKAGE})
+    results = run(asyncio.wait_for(collect(chunks_of(row, error=RuntimeError("boom"))), 3))
+
+    assert results[-1]["row"] == 0 and results[-1]["status_code"] == 500
+    assert all(result["success"] for result in results[:-1])
+
+def test_response_stops_streaming_when_the_client_disconnects():
+    state = {"closed": False}
+
+    async def endless():
+        try:
+            while True:
+                yield "tick\n"
+                await asyncio.sleep(0.01)
+        finally:
+            state["closed"] = True
+
+    async def scenario():
+        upload_read = asyncio.Event()
+        upload_read.set()
+        response = UploadStreamingResponse(endless(), upload_read=upload_read, media_type="application/x-ndjson")
+        sent = []
+
+        async def receive():
+            await asyncio.sleep(0.05)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await asyncio.wait_for(response({"type": "http"}, receive, send), 3)
+        return sent
+
+    sent = run(scenario())
+    assert sent[0]["type"] == "http.response.start"
+    assert state["closed"]
@@ -0,0 +1,65 @@
+"""
+``upgrade_schema`` on an existing database: duplicate credentials are
+resolved before the unique index is created, and the shipment_quotes backfill
+runs once and skips shipments whose stored quotes are malformed.
+"""
+from sqlalchemy import create_engine, func, insert, select, text
+from app.core.database import Base
+from app.core.migrations import schema_migrations, upgrade_schema
+from app.models import CarrierCredentials, OriginLocation, ShipmentQuote, User, UserShipment
+
+DESTINATION = {"name": "Bob", "zip_code": "80202"}
+QUOTE = {"carrier": "UPS", "service_code": "03", "amount": 12.5, "currency": "USD", "transit_days": 4}
+
+def test_backfill_runs_once_and_skips_malformed_shipments(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), {"id": 1, "username": "old", "email": "old@example.com", "hashed_password": "x"})
+        connection.execute(insert(OriginLocation), {
+            "id": 1, "user_id": 1, "name": "WH", "address_line1": "1 Main", "city": "Austin",
+            "state": "TX", "zip_code": "78701", "country": "US"
+        })
+        connection.execute(insert(UserShipment), [
+            {"user_id": 1, "origin_location_id": 1, "status": "QUOTED", "destination_data": DESTINATION, "quotes_data": [QUOTE, QUOTE]},
+            {"user_id": 1, "origin_location_id": 1, "status": "QUOTED", "destination_data": ["not", "a", "dict"], "quotes_data": [QUOTE]},
+            {"user_id": 1, "origin_location_id": 1, "status": "QUOTED", "destination_data": DESTINATION, "quotes_data": [{"amount": 1}]},
+            {"user_id": 1, "origin_location_id": 1, "status": "QUOTED", "destination_data": {"zip_code": "9" * 30}, "quotes_data": [QUOTE]},
+        ])
+
+    changes = upgrade_schema(engine)
+    assert "shipment_quotes backfilled with 2 quotes" in changes
+    assert "3 shipments with malformed quotes not backfilled" in changes
+
+    # Recorded as done: a later startup neither rescans nor re-adds rows
+    with engine.begin() as connection:
+        connection.execute(ShipmentQuote.__table__.delete())
+    assert upgrade_schema(engine) == []
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(ShipmentQuote)).scalar() == 0
+        assert connection.execute(select(schema_migrations.c.name)).scalars().all() == ["backfill_shipment_quotes"]
+    engine.dispose()
+
+def test_duplicate_credentials_keep_the_newest_active_row(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dupes.db'}")
+    Base.metadata.create_all(engine)
+    credential = {"user_id": 1, "client_id": "c", "client_secret": "s", "account_number": "A"}
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX uq_carrier_credentials_user_id_carrier_code"))
+        connection.execute(insert(CarrierCredentials), [
+            {**credential, "id": 1, "carrier_code": "UPS", "is_active": False},
+            {**credential, "id": 2, "carrier_code": "UPS", "is_active": True},
+            {**credential, "id": 3, "carrier_code": "UPS", "is_active": False},
+            {**credential, "id": 4, "carrier_code": "FEDEX", "is_active": False},
+            {**credential, "id": 5, "carrier_code": "FEDEX", "is_active": False},
+            {**credential, "id": 6, "carrier_code": "USPS", "is_active": True},
+        ])
+
+    with caplog.at_level("WARNING", logger="app.core.migrations"):
+        changes = upgrade_schema(engine)
+    assert "3 duplicate carrier_credentials rows deleted" in changes
+    assert "uq_carrier_credentials_user_id_carrier_code" in changes
+    with engine.connect() as connection:
+        assert connection.execute(select(CarrierCredentials.id).order_by(CarrierCredentials.id)).scalars().all() == [2, 5, 6]
+    assert sum("Deleting duplicate carrier_credentials row" in message for message in caplog.messages) == 3
+    engine.dispose()
@@ -0,0 +1,25 @@
+"""
+Pool checkout timeouts are counted; failures to connect are not.
+"""
+import sqlite3
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from app.core.database import timed_pool_class
+
+def test_only_pool_timeouts_are_counted():
+    pool = timed_pool_class(QueuePool, "test")(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.01)
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+    assert pool.stats.timeouts == 1 and pool.stats.checkouts == 1
+
+def test_connection_errors_are_not_timeouts():
+    def refuse():
+        raise sqlite3.OperationalError("connection refused")
+
+    pool = timed_pool_class(QueuePool, "test")(refuse, pool_size=1, max_overflow=0, timeout=0.01)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+    assert pool.stats.timeouts == 0 and pool.stats.checkouts == 0
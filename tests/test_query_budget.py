@@ -0,0 +1,53 @@
+"""
+Query budgets for the busiest endpoints. A budget failure prints every
+statement the request ran; an N+1 pattern shows up as a repeated one.
+"""
+import pytest
+from app.core.query_stats import assert_max_queries
+from app.services import quote_service
+
+LOCATION = {"name": "Warehouse", "address_line1": "1 Main", "city": "Austin", "state": "TX", "zip_code": "78701"}
+CARRIER = {"carrier_code": "UPS", "client_id": "ups-id", "client_secret": "ups-secret", "account_number": "A1"}
+SHIPMENT = {
+    "destination": {"name": "Bob", "add1": "2 Elm", "city": "Denver", "state": "CO", "zip": "80202", "phone": "555"},
+    "package": {"weight_lb": 5, "length_in": 10, "width_in": 8, "height_in": 4},
+}
+
+@pytest.fixture(scope="module")
+def seeded(client, auth_headers):
+    """Several origin locations, so a per-row query would repeat."""
+    for i in range(5):
+        location = {**LOCATION, "name": f"Warehouse {i}", "is_default": i == 0}
+        assert client.post("/user/locations", json=location, headers=auth_headers).status_code == 200
+    client.post("/user/carriers", json=CARRIER, headers=auth_headers)
+
+@pytest.fixture
+def fake_carriers(monkeypatch):
+    async def price_shipment(jobs, origin, shipment_request):
+        quote = {
+            "carrier": "UPS", "service_code": "03", "service_name": "UPS Ground", "service_level": "GROUND",
+            "amount": 12.5, "currency": "USD", "transit_days": 4, "rank": 1
+        }
+        return [quote, {**quote, "service_code": "02", "amount": 20.0, "rank": 2}], []
+
+    monkeypatch.setattr(quote_service, "price_shipment", price_shipment)
+
+def test_profile_query_budget(client, auth_headers):
+    with assert_max_queries(1, allow_repeats=False) as captured:
+        assert client.get("/auth/profile", headers=auth_headers).status_code == 200
+    assert len(captured) == 1
+
+def test_location_list_query_budget(client, auth_headers, seeded):
+    with assert_max_queries(2, allow_repeats=False) as captured:
+        response = client.get("/user/locations", headers=auth_headers)
+    assert response.status_code == 200 and len(response.json()) >= 5
+    assert len(captured) == 1
+
+def test_quote_query_budget(client, auth_headers, seeded, fake_carriers):
+    with assert_max_queries(8) as captured:
+        response = client.post("/shipments/quote", json=SHIPMENT, headers=auth_headers)
+    assert response.status_code == 200 and len(response.json()["quotes"]) == 2
+    # SQLite cannot batch ORM inserts that return ordered ids, so each quote
+    # row is its own INSERT; anything else running twice is an N+1
+    [stats] = captured
+    assert [statement.split("(")[0].strip() for statement, _ in stats.repeated()] == ["INSERT INTO shipment_quotes"]
@@ -0,0 +1,40 @@
+"""
+A carrier's cached OAuth token is dropped only when the rate call rejects it.
+"""
+import pytest
+from app.core.enums import CarrierCode
+from app.core.token_cache import CarrierTokenCache
+from app.services import quote_service
+from tests.conftest import run
+
+ADDRESS = {"country": "US", "zip_code": "78701"}
+PACKAGE = {"weight_lb": 5}
+
+class FakeAdapter:
+    def __init__(self, result):
+        self.result = result
+
+    async def rate(self, access_token, account_num, origin, destination, package):
+        return self.result
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    async def fetch(carrier, client_id, client_secret, account_num):
+        return {"carrier": "UPS", "success": True, "access_token": "tok", "expires_in": 3600}
+
+    cache = CarrierTokenCache(fetch=fetch)
+    monkeypatch.setattr(quote_service, "carrier_token_cache", cache)
+    return cache
+
+def rate_with(monkeypatch, result):
+    monkeypatch.setattr(quote_service, "get_adapter", lambda code: FakeAdapter(result))
+    return run(quote_service.quote_carrier(CarrierCode.UPS, "id", "secret", None, ADDRESS, ADDRESS, PACKAGE))
+
+@pytest.mark.parametrize("status_code,invalidated", [(401, True), (403, True), (500, False), (None, False)])
+def test_token_is_invalidated_only_when_rejected(monkeypatch, token_cache, status_code, invalidated):
+    result = {"carrier": "UPS", "success": False, "error": "failed", "error_type": "request_error"}
+    if status_code is not None:
+        result["status_code"] = status_code
+
+    rate_with(monkeypatch, result)
+    assert token_cache.stats()["entries"] == (0 if invalidated else 1)
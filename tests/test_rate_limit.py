@@ -0,0 +1,35 @@
+"""
+Rate classes of the password routes and the bearer token -> client cache.
+"""
+import time
+from datetime import timedelta
+import pytest
+from app.core import rate_limit
+from app.core.auth import create_access_token
+from app.core.cache import TTLCache
+
+@pytest.mark.parametrize("method,path", [("POST", "/auth/token"), ("POST", "/auth/register"), ("PUT", "/auth/password")])
+def test_bcrypt_routes_share_the_auth_class(method, path):
+    assert rate_limit.rate_class(method, path) == "auth"
+
+@pytest.fixture
+def small_caches(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_token_subjects", TTLCache(maxsize=2, ttl=600))
+    monkeypatch.setattr(rate_limit, "_invalid_tokens", TTLCache(maxsize=2, ttl=600))
+
+def test_cached_subject_expires_with_the_token(small_caches):
+    token = create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=60))
+    assert rate_limit.token_subject(token) == "alice"
+
+    _, expires_at = rate_limit._token_subjects._data[token]
+    assert expires_at - time.monotonic() <= 60
+
+def test_invalid_tokens_do_not_evict_valid_ones(small_caches):
+    token = create_access_token({"sub": "alice"})
+    assert rate_limit.client_id({"headers": [(b"authorization", f"Bearer {token}".encode())]}) == "user:alice"
+
+    for i in range(10):
+        scope = {"headers": [(b"authorization", f"Bearer garbage-{i}".encode())], "client": ("10.0.0.1", 1)}
+        assert rate_limit.client_id(scope) == "ip:10.0.0.1"
+    assert rate_limit._token_subjects.get(token) == "alice"
+    assert len(rate_limit._invalid_tokens) == 2
@@ -0,0 +1,22 @@
+"""
+Read-your-writes stickiness follows the user, not one bearer token.
+"""
+from datetime import timedelta
+from starlette.requests import Request
+from app.core.auth import create_access_token
+from app.core.database import client_key
+
+def request_with(authorization: str = None) -> Request:
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "headers": headers, "client": ("10.0.0.7", 1234)})
+
+def test_every_token_of_a_user_shares_one_key():
+    first = create_access_token({"sub": "alice"})
+    second = create_access_token({"sub": "alice"}, expires_delta=timedelta(hours=1))
+
+    assert client_key(request_with(f"Bearer {first}")) == "user:alice"
+    assert client_key(request_with(f"Bearer {second}")) == "user:alice"
+
+def test_anonymous_and_invalid_tokens_fall_back_to_the_ip():
+    assert client_key(request_with()) == "ip:10.0.0.7"
+    assert client_key(request_with("Bearer not-a-token")) == "ip:10.0.0.7"
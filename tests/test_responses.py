@@ -0,0 +1,49 @@
+"""
+Content negotiation between JSON and MessagePack.
+"""
+import pytest
+from starlette.requests import Request
+from app.core.responses import wants_msgpack
+
+msgpack = pytest.importorskip("msgpack")
+
+def request_accepting(accept: str) -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+@pytest.mark.parametrize("accept,expected", [
+    ("application/msgpack", True),
+    ("application/x-msgpack, application/json;q=0.5", True),
+    ("application/json, application/msgpack", True),
+    ("application/msgpack;q=0", False),
+    ("application/msgpack;q=0.5, application/json", False),
+    ("application/msgpack;q=0.5, */*;q=0.1", True),
+    ("*/*", False),
+    ("application/json", False),
+    ("", False),
+])
+def test_accept_quality_values(accept, expected):
+    assert wants_msgpack(request_accepting(accept)) is expected
+
+def test_model_response_is_packed_like_its_json(client, auth_headers):
+    as_json = client.get("/auth/profile", headers=auth_headers)
+    packed = client.get("/auth/profile", headers={**auth_headers, "Accept": "application/msgpack"})
+
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert "Accept" in packed.headers["vary"] and "Accept" in as_json.headers["vary"]
+    assert msgpack.unpackb(packed.content) == as_json.json()
+
+def test_hand_built_response_is_packed_with_its_headers(client, auth_headers):
+    client.post("/user/locations", json={
+        "name": "Packed", "address_line1": "1 Main", "city": "Austin", "state": "TX", "zip_code": "78701"
+    }, headers=auth_headers)
+    params = {"fields": "id,name,created_at", "limit": 1}
+    as_json = client.get("/user/locations", params=params, headers=auth_headers)
+    packed = client.get("/user/locations", params=params, headers={**auth_headers, "Accept": "application/msgpack"})
+
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(packed.content) == as_json.json()
+    assert packed.headers.get("x-next-cursor") == as_json.headers.get("x-next-cursor")
+
+def test_refused_msgpack_gets_json(client, auth_headers):
+    response = client.get("/auth/profile", headers={**auth_headers, "Accept": "application/msgpack;q=0, application/json"})
+    assert response.headers["content-type"] == "application/json"
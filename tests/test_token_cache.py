@@ -0,0 +1,66 @@
+"""
+Carrier token cache: failed fetches leave nothing behind, the cache is
+bounded, forced refreshes skip cached tokens and writes are batched.
+"""
+import asyncio
+import json
+from app.core.token_cache import CarrierTokenCache
+
+def token_fetcher(calls: list, fail: bool = False):
+    async def fetch(carrier, client_id, client_secret, account_num):
+        calls.append(client_id)
+        await asyncio.sleep(0)
+        if fail:
+            return {"carrier": carrier, "success": False, "error": "invalid_client"}
+        return {"carrier": carrier, "success": True, "access_token": f"tok-{len(calls)}", "expires_in": 3600}
+    return fetch
+
+def test_failed_fetch_does_not_keep_a_lock_or_entry():
+    cache = CarrierTokenCache(fetch=token_fetcher([], fail=True))
+    for i in range(50):
+        result = asyncio.run(cache.get_token("UPS", f"id-{i}", "secret"))
+        assert not result["success"]
+    assert cache.stats() == {"entries": 0}
+    assert cache._key_locks == {}
+
+def test_entries_are_bounded_least_recently_used_first():
+    cache = CarrierTokenCache(fetch=token_fetcher([]), max_entries=2)
+
+    async def scenario():
+        await cache.get_token("UPS", "a", "secret")
+        await cache.get_token("UPS", "b", "secret")
+        await cache.get_token("UPS", "a", "secret")  # a is now the most recent
+        await cache.get_token("UPS", "c", "secret")
+
+    asyncio.run(scenario())
+    assert sorted(key[1] for key in cache._entries) == ["a", "c"]
+    assert len(cache._key_locks) <= 2
+
+def test_force_refresh_skips_the_cached_token():
+    calls = []
+    cache = CarrierTokenCache(fetch=token_fetcher(calls))
+
+    async def scenario():
+        first = await cache.get_token("UPS", "a", "secret")
+        cached = await cache.get_token("UPS", "a", "secret")
+        forced = await cache.get_token("UPS", "a", "secret", force_refresh=True)
+        return first, cached, forced
+
+    first, cached, forced = asyncio.run(scenario())
+    assert cached["cached"] and cached["access_token"] == first["access_token"]
+    assert not forced["cached"] and forced["access_token"] != first["access_token"]
+    assert len(calls) == 2
+
+def test_stores_are_written_on_flush_not_per_token(tmp_path):
+    path = tmp_path / "tokens.json"
+    cache = CarrierTokenCache(fetch=token_fetcher([]), path=str(path))
+
+    async def scenario():
+        await cache.get_token("UPS", "a", "secret")
+        assert not path.exists()
+        await cache.flush()
+
+    asyncio.run(scenario())
+    saved = json.loads(path.read_text())
+    assert [entry["client_id"] for entry in saved] == ["a"]
+    assert "client_secret" not in saved[0]
@@ -0,0 +1,44 @@
+"""
+The authenticated-user cache drops a user when a change to the row
+commits, not when it is flushed.
+"""
+from sqlalchemy import select
+from app.core.auth import AuthenticatedUser, user_cache
+from app.core.cache import TTLCache
+from app.core.database import AsyncSessionLocal
+from app.models.user import User
+from tests.conftest import run
+
+def test_user_is_dropped_from_the_cache_after_commit(client, auth_headers):
+    assert client.get("/auth/profile", headers=auth_headers).status_code == 200
+    assert isinstance(user_cache.get("tester"), AuthenticatedUser)
+
+    async def rename_then(commit: bool):
+        async with AsyncSessionLocal() as db:
+            user = (await db.execute(select(User).where(User.username == "tester"))).scalar_one()
+            user.full_name = "Renamed"
+            await db.flush()
+            # Flushed but not committed: other requests still see the old row
+            assert user_cache.get("tester") is not None
+            if commit:
+                await db.commit()
+            else:
+                await db.rollback()
+
+    run(rename_then(commit=False))
+    assert user_cache.get("tester") is not None
+    run(rename_then(commit=True))
+    assert user_cache.get("tester") is None
+    assert client.get("/auth/profile", headers=auth_headers).json()["full_name"] == "Renamed"
+
+def test_cache_misses_read_the_user_from_the_primary(client, auth_headers, monkeypatch):
+    from app.core import database
+
+    def lagging_replica():
+        raise AssertionError("user loaded from a replica")
+
+    monkeypatch.setattr(database, "ReplicaSessionLocals", [lagging_replica])
+    monkeypatch.setattr(database, "_next_replica", iter([0]))
+    monkeypatch.setattr(database, "_recent_writers", TTLCache())
+    user_cache.clear()
+    assert client.get("/auth/profile", headers=auth_headers).status_code == 200